@@ -0,0 +1,66 @@
+"""
+Parse benchmark for ranking pages: the original BeautifulSoup html.parser scan against the
+streaming table extractor (stdlib tokenizer and lxml backends), on the saved ITU and WTCS fixtures.
+
+Usage:
+    python benchmarks/bench_ranking_parse.py --repeat 200
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tri_analysis'))
+
+from tri_analysis.ranking_tables import extract_ranking_table, detect_schema, etree
+
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures', 'rankings_*.html')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+def parse_bs4(content):
+    """The pre-extractor approach: full html.parser tree, header scan and per-row get_text()."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    for tbl in soup.find_all('table'):
+        header_row = tbl.find('tr')
+        if header_row and detect_schema([c.get_text() for c in header_row.find_all(['th', 'td'])]):
+            return [[c.get_text().strip() for c in row.find_all('td')] for row in tbl.find_all('tr')[1:]]
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ranking page parsing.")
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    parsers = {
+        "bs4_html_parser": parse_bs4,
+        "stream_stdlib": lambda c: extract_ranking_table(c, backend='stdlib'),
+    }
+    if etree is not None:
+        parsers["stream_lxml"] = lambda c: extract_ranking_table(c, backend='lxml')
+
+    results = []
+    for path in sorted(glob.glob(FIXTURES)):
+        content = open(path, 'rb').read()
+        for name, fn in parsers.items():
+            cpu = time.process_time()
+            for _ in range(args.repeat):
+                fn(content)
+            per_page_ms = (time.process_time() - cpu) / args.repeat * 1000
+            results.append({"fixture": os.path.basename(path), "parser": name, "cpu_ms_per_page": round(per_page_ms, 3)})
+            print(f"{os.path.basename(path):<36} {name:<16} {per_page_ms:8.3f} ms/page")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(RESULTS_DIR, f"{stamp}_ranking_parse.json")
+    with open(path, "w") as f:
+        json.dump({"timestamp": stamp, "repeat": args.repeat, "results": results}, f, indent=2)
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Standalone benchmark runner for time parsing, metrics, upserts and reads.
+
+Each stage runs once on synthetic data at every requested scale, timed and memory-profiled
+(tracemalloc peak) in the same call, and the results are written to benchmarks/results/<timestamp>_<commit>.json so runs can be
+compared across commits.
+
+Usage:
+    python benchmarks/run_benchmarks.py --scales 65000,1000000 --stages parse,metrics,upsert,read
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tri_analysis'))
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from tri_analysis.synthetic import generate_warehouse
+from tri_analysis.metrics import parse_times_to_secs, calculate_position_metrics
+from tri_analysis.upsert_tables import upsert_race_results
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+SCALES = {"65K": 65_000, "1M": 1_000_000, "10M": 10_000_000, "50M": 50_000_000}
+SPLIT_COLS = ['swimtime', 't1time', 'biketime', 't2time', 'runtime']
+
+RACE_RESULTS_DDL = """
+    CREATE TABLE IF NOT EXISTS race_results (
+        event_id INTEGER, prog_id INTEGER, athlete_id INTEGER, athlete_full_name VARCHAR,
+        swimtime VARCHAR, t1time VARCHAR, biketime VARCHAR, t2time VARCHAR, runtime VARCHAR,
+        position VARCHAR, total_time VARCHAR, start_num VARCHAR,
+        PRIMARY KEY (athlete_id, prog_id, total_time)
+    )
+"""
+
+def measure(fn, *args, memory=True, **kwargs):
+    """
+    Run fn once, returning (result, stats) with wall and CPU time, and the tracemalloc peak when
+    memory is True. Stages run only once, so the upsert writes each row once and the memory peak
+    has no warm-cache effects. tracemalloc slows allocation-heavy code, so compare timings of
+    runs made with the same memory setting ("traced" in the stats).
+    """
+    if memory:
+        tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        result = fn(*args, **kwargs)
+        stats = {
+            "wall_s": round(time.perf_counter() - wall, 4),
+            "cpu_s": round(time.process_time() - cpu, 4),
+            "peak_mb": round(tracemalloc.get_traced_memory()[1] / 2**20, 2) if memory else None,
+            "traced": memory,
+        }
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return result, stats
+
+def bench_parse(frames, engine):
+    df = frames["race_results"]
+    return {col: parse_times_to_secs(df[col]) for col in SPLIT_COLS}
+
+def bench_metrics(frames, engine):
+    return calculate_position_metrics(frames["race_results"])
+
+def bench_upsert(frames, engine):
+    upsert_race_results(frames["race_results"], engine)
+
+def bench_read(frames, engine):
+    return pd.read_sql_table('race_results', engine)
+
+STAGES = {"parse": bench_parse, "metrics": bench_metrics, "upsert": bench_upsert, "read": bench_read}
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def run(scales, stages, db_uri=None, seed=0, memory=True) -> dict:
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "results": [],
+    }
+    for label in scales:
+        n_rows = SCALES.get(label) or int(label)
+        frames, gen_stats = measure(generate_warehouse, n_rows, seed=seed, memory=False)
+        print(f"[{label}] generated {len(frames['race_results'])} rows in {gen_stats['wall_s']}s")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(db_uri or f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            with engine.begin() as conn:
+                conn.execute(text("DROP TABLE IF EXISTS race_results"))
+                conn.execute(text(RACE_RESULTS_DDL))
+            for stage in stages:
+                _, stats = measure(STAGES[stage], frames, engine, memory=memory)
+                stats.update({
+                    "scale": label,
+                    "rows": len(frames["race_results"]),
+                    "stage": stage,
+                    "rows_per_s": round(len(frames["race_results"]) / stats["wall_s"], 1) if stats["wall_s"] else None,
+                })
+                report["results"].append(stats)
+                print(f"[{label}] {stage:<8} {stats['wall_s']:>9.3f}s  peak {stats['peak_mb']} MB")
+            engine.dispose()
+    return report
+
+def save(report) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = report["timestamp"].replace(":", "").replace("-", "")
+    path = os.path.join(RESULTS_DIR, f"{stamp}_{report['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+def compare(baseline_path, candidate_path):
+    """Print the wall-time ratio (candidate / baseline) for every matching scale and stage."""
+    with open(baseline_path) as f:
+        base = {(r["scale"], r["stage"]): r for r in json.load(f)["results"]}
+    with open(candidate_path) as f:
+        cand = {(r["scale"], r["stage"]): r for r in json.load(f)["results"]}
+    for key in sorted(base.keys() & cand.keys()):
+        b, c = base[key], cand[key]
+        ratio = c["wall_s"] / b["wall_s"] if b["wall_s"] else float("nan")
+        print(f"{key[0]:>5} {key[1]:<8} {b['wall_s']:>9.3f}s -> {c['wall_s']:>9.3f}s  x{ratio:.2f}  "
+              f"peak {b['peak_mb']} -> {c['peak_mb']} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the metrics and upsert stages on synthetic data.")
+    parser.add_argument("--scales", default="65K", help=f"Comma-separated labels {list(SCALES)} or row counts")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {list(STAGES)}")
+    parser.add_argument("--db-uri", default=None, help="Database to benchmark upserts/reads against (default: temp SQLite)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="Do not trace memory (timings without tracemalloc overhead)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="Compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    report = run(args.scales.split(","), args.stages.split(","), db_uri=args.db_uri, seed=args.seed,
+                 memory=not args.no_memory)
+    print(f"Results written to {save(report)}")
+
+if __name__ == "__main__":
+    main()
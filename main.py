@@ -1,59 +1,154 @@
 # main.py (root of Triathlon_Database)
+"""
+Command-line entry point for all database operations.
 
-import sys
+    python main.py full-import [--start 2022-01-01 --end 2022-12-31] [--yes]
+    python main.py sync [--since 2025-01-01]
+    python main.py backfill [--start-year 2009 --workers 8 --rate 20]
+    python main.py metrics
+    python main.py rankings [--historical]
+    python main.py add-athlete "Alex Yee"
+    python main.py head-to-head 123 456 [--update]
+    python main.py export race_results --format parquet
+
+Only the standard library and the stdlib-only profiling helper are imported at startup; each
+command imports the pipeline modules it needs, so --help and light commands start fast. The legacy menu numbers
+(1 = full-import, 2 = sync, 3 = add-athlete) still work as aliases.
+"""
+import argparse
 import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from config.config import DB_URI
-from Data_Import.master_data_import import import_master_data
-from Data_Upload.update_race_results import update_race_results
-
-load_dotenv()
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
-def main():
-    # ---------- NEW: detect CLI arg ----------
-    if len(sys.argv) > 1:
-        choice = sys.argv[1].strip()
-        non_interactive = True
-    else:
-        non_interactive = False
-        print("Select an action:")
-        print("1. Full data import (WARNING: will overwrite existing tables)")
-        print("2. Add data from recent events")
-        print("3. Add a specific athlete by name")
-        choice = input("Enter option number (1-3): ").strip()
-    # -----------------------------------------
-
-    engine = create_engine(DB_URI)
-
-    if choice == '1':
-        # In non-interactive mode, auto-confirm; otherwise ask the user.
-        if non_interactive:
-            confirm = 'y'
-        else:
-            confirm = input("This will DROP and recreate all tables. Proceed? (y/N): ")
-
-        if confirm.lower() == 'y':
-            import_master_data()
-        else:
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'tri_analysis'))
+
+from tri_analysis.profiling import add_profile_arguments, profiled
+
+def cmd_full_import(args):
+    if not args.yes and sys.stdin.isatty():
+        confirm = input("This will DROP and recreate the derived tables. Proceed? (y/N): ")
+        if confirm.lower() != 'y':
             print("Full import cancelled.")
+            return
+    from config import IMPORT_END_DATE, IMPORT_START_DATE
+    from tri_analysis.build_database import build_database
+    build_database(start_date=args.start or IMPORT_START_DATE, end_date=args.end or IMPORT_END_DATE)
+
+def cmd_sync(args):
+    from tri_analysis.build_database import sync
+    sync(since=args.since)
+
+def cmd_backfill(args):
+    from config import API_RATE_LIMIT, BACKFILL_START_YEAR
+    from tri_analysis.backfill import backfill
+    start_year = BACKFILL_START_YEAR if args.start_year is None else args.start_year
+    rate = API_RATE_LIMIT if args.rate is None else args.rate
+    report = backfill(start_year, args.end_year, args.workers, rate)
+    return 1 if report["failed"] else 0
+
+def cmd_metrics(args):
+    from tri_analysis.metrics import main as build_metrics
+    build_metrics()
+
+def cmd_rankings(args):
+    from database import initialize_database
+    initialize_database()
+    if args.historical:
+        from tri_analysis.historical_rankings_scraper import HistoricalRankingsScraper
+        HistoricalRankingsScraper().run_full_pipeline()
+    else:
+        from tri_analysis.ranking_import import import_rankings
+        import_rankings(**({"ranking_ids": args.ids} if args.ids else {}))
 
-    elif choice == '2':
-        print("Fetching and adding recent events...")
-        update_race_results(engine)
+def cmd_add_athlete(args):
+    from tri_analysis.athlete_ingest import ingest_athlete
+    ingest_athlete(" ".join(args.name))
 
-    elif choice == '3':
-        if non_interactive:
-            print("Error: option 3 requires interactive input (athlete name).")
-            sys.exit(1)
-        name = input("Enter athlete full name to add: ")
-        # Placeholder for adding a specific athlete function
-        print(f"Functionality to add athlete '{name}' not yet implemented.")
+def cmd_head_to_head(args):
+    if len(args.athletes) not in (0, 2):
+        print("head-to-head takes two athlete ids.")
+        return 2
+    from tri_analysis.head_to_head import update_head_to_head, head_to_head_record
+    if args.update or args.rebuild:
+        update_head_to_head(full=args.rebuild)
+    if args.athletes:
+        r = head_to_head_record(*args.athletes)
+        print(f"{r['athlete_id']} vs {r['opponent_id']}: {r['wins']}-{r['losses']} in {r['races']} races "
+              f"(mean margin won {r['mean_win_margin_s']}s, lost {r['mean_loss_margin_s']}s)")
 
+def cmd_export(args):
+    from tri_analysis.dtypes import read_table
+    df = read_table(args.table)
+    output = args.output or f"{args.table}.{args.format}"
+    if args.format == "parquet":
+        df.to_parquet(output, index=False)
     else:
-        print("Invalid choice. Please select 1, 2, or 3.")
+        df.to_csv(output, index=False)
+    print(f"Exported {len(df)} rows from {args.table} to {output}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="main.py", description="Triathlon database operations")
+    add_profile_arguments(parser)
+    sub = parser.add_subparsers(dest="command", metavar="command")
+
+    p = sub.add_parser("full-import", aliases=["1"], help="rebuild the database from the API (drops derived tables)")
+    p.add_argument("--start", default=None, help="first event date, YYYY-MM-DD (default: IMPORT_START_DATE)")
+    p.add_argument("--end", default=None, help="last event date, YYYY-MM-DD (default: IMPORT_END_DATE)")
+    p.add_argument("--yes", "-y", action="store_true", help="do not ask for confirmation")
+    p.set_defaults(stage="full-import", func=cmd_full_import, report="build_database")
+
+    p = sub.add_parser("sync", aliases=["2"], help="add events since the latest stored event")
+    p.add_argument("--since", default=None, help="start date (default: latest event_date in the database)")
+    p.set_defaults(stage="sync", func=cmd_sync, report="sync")
+
+    p = sub.add_parser("backfill", help="import every season in parallel worker processes")
+    p.add_argument("--start-year", type=int, default=None, help="first season (default: BACKFILL_START_YEAR)")
+    p.add_argument("--end-year", type=int, default=None, help="last season (default: current year)")
+    p.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    p.add_argument("--rate", type=float, default=None,
+                   help="API requests/second across all workers (default: API_RATE_LIMIT)")
+    p.set_defaults(stage="backfill", func=cmd_backfill, report=None)
+
+    p = sub.add_parser("metrics", help="rebuild position, split-flag and pack metrics")
+    p.set_defaults(stage="metrics", func=cmd_metrics, report="metrics")
+
+    p = sub.add_parser("rankings", help="import live rankings (or --historical ones from old.triathlon.org)")
+    p.add_argument("--historical", action="store_true", help="run the historical rankings pipeline instead")
+    p.add_argument("--ids", type=int, nargs="+", help="ranking category ids (default: RANKING_CATEGORY_IDS)")
+    p.set_defaults(stage="rankings", func=cmd_rankings, report="rankings")
+
+    p = sub.add_parser("add-athlete", aliases=["3"], help="add one athlete and their results by name")
+    p.add_argument("name", nargs="+", help="athlete full name")
+    p.set_defaults(stage="add-athlete", func=cmd_add_athlete, report=None)
+
+    p = sub.add_parser("head-to-head", help="head-to-head record of two athletes (and/or update the matrices)")
+    p.add_argument("athletes", type=int, nargs="*", metavar="athlete_id", help="two athlete ids")
+    p.add_argument("--update", action="store_true", help="first add programs not counted yet")
+    p.add_argument("--rebuild", action="store_true", help="first rebuild the matrices from every program")
+    p.set_defaults(stage="head-to-head", func=cmd_head_to_head, report=None)
+
+    p = sub.add_parser("export", help="export a table to CSV or Parquet")
+    p.add_argument("table", help="table name, e.g. race_results")
+    p.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    p.add_argument("--output", "-o", default=None, help="output path (default: <table>.<format>)")
+    p.set_defaults(stage="export", func=cmd_export, report=None)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.command:
+        parser.print_help()
+        return 2
+
+    with profiled(args, args.stage):
+        status = args.func(args)
 
+    if args.report:
+        from tri_analysis.instrumentation import export_run_report
+        export_run_report(args.report)
+    return status or 0
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+import requests
+
+import tri_analysis.api_handling as api_handling
+
+def _response(status=200, body=None):
+    response = mock.Mock(status_code=status, url="http://example")
+    response.json.return_value = body if body is not None else {"data": {"athlete_id": 1}}
+    return response
+
+def test_concurrent_identical_requests_share_one_call():
+    api_handling.clear_api_cache()
+    calls = []
+    def slow_get(url, **kwargs):
+        calls.append(url)
+        time.sleep(0.1)
+        return _response()
+    with mock.patch.object(requests, "get", side_effect=slow_get), api_handling.api_run():
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(executor.map(lambda _: api_handling._get("athlete_info", "http://example/athletes/1"), range(8)))
+        # Served from the LRU afterwards, with the parsed body shared
+        again = api_handling._get("athlete_info", "http://example/athletes/1")
+        stats = api_handling._flights.stats()
+    assert len(calls) == 1
+    assert all(r is again for r in responses)
+    assert again.json() is responses[0].json()
+    assert stats["coalesced"] + stats["hits"] == 8
+
+def test_failures_are_shared_but_not_cached(monkeypatch):
+    api_handling.clear_api_cache()
+    monkeypatch.setattr(api_handling, "API_RETRIES", 0)
+    with mock.patch.object(requests, "get", side_effect=[_response(404), _response(200)]) as get:
+        assert api_handling._get("athlete_info", "http://example/athletes/2").status_code == 404
+        assert api_handling._get("athlete_info", "http://example/athletes/2").status_code == 200
+        assert get.call_count == 2
+
+    release = threading.Event()
+    def failing_get(url, **kwargs):
+        release.wait()
+        raise requests.exceptions.ConnectionError("down")
+    with mock.patch.object(requests, "get", side_effect=failing_get) as get:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(api_handling._get, "athlete_info", "http://example/athletes/3") for _ in range(4)]
+            time.sleep(0.05)
+            release.set()
+        for future in futures:
+            with pytest.raises(requests.exceptions.ConnectionError):
+                future.result()
+        assert get.call_count == 1
+
+def test_lru_is_bounded_and_keyed_by_params():
+    flights = api_handling.SingleFlight(maxsize=2)
+    fetched = []
+    def fetch(key):
+        fetched.append(key)
+        return _response()
+    with flights.run():
+        for key in ["a", "b", "a", "c", "b"]:
+            flights.get(key, lambda key=key: fetch(key))
+    # "b" was evicted when "c" arrived (LRU order a, c) and had to be fetched again
+    assert fetched == ["a", "b", "c", "b"]
+    with mock.patch.object(requests, "get", return_value=_response()) as get, api_handling.api_run():
+        api_handling._get("ranking_page", "http://example/rankings/13", params={"offset": 0})
+        api_handling._get("ranking_page", "http://example/rankings/13", params={"offset": 200})
+        api_handling._get("ranking_page", "http://example/rankings/13", params={"offset": 0})
+        assert get.call_count == 2
+
+def test_responses_keep_only_status_url_and_json():
+    raw = _response(503, body={"error": "busy"})
+    raw.reason = "Service Unavailable"
+    response = api_handling.ApiResponse(raw)
+    assert not hasattr(response, "_response")
+    assert response.json() == {"error": "busy"}
+    with pytest.raises(requests.exceptions.HTTPError, match="503"):
+        response.raise_for_status()
+    api_handling.ApiResponse(_response(200)).raise_for_status()
+
+def test_api_run_scopes_the_cache_to_one_run():
+    with mock.patch.object(requests, "get", return_value=_response()) as get:
+        with api_handling.api_run():
+            api_handling._get("athlete_info", "http://example/athletes/4")
+            with api_handling.api_run():   # nested runs share the outer cache
+                api_handling._get("athlete_info", "http://example/athletes/4")
+            api_handling._get("athlete_info", "http://example/athletes/4")
+            assert get.call_count == 1
+        assert api_handling._flights.stats()["cached"] == 0
+        with api_handling.api_run():
+            api_handling._get("athlete_info", "http://example/athletes/4")
+        assert get.call_count == 2
+        # Outside a run nothing is cached
+        api_handling._get("athlete_info", "http://example/athletes/4")
+        api_handling._get("athlete_info", "http://example/athletes/4")
+        assert get.call_count == 4 and api_handling._flights.stats()["cached"] == 0
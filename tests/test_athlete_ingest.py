@@ -0,0 +1,77 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+import functools
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+import database
+import tri_analysis.athlete_ingest as athlete_ingest
+from tri_analysis import head_to_head
+
+def _result(event_id, prog_id, athlete_id, name, total, splits=("00:18:00", "00:00:40", "00:55:00", "00:00:25", "00:31:00")):
+    return {"event_id": event_id, "prog_id": prog_id, "athlete_id": athlete_id, "athlete_full_name": name,
+            "swimtime": splits[0], "t1time": splits[1], "biketime": splits[2], "t2time": splits[3],
+            "runtime": splits[4], "position": "1", "total_time": total, "start_num": "1"}
+
+def _engine(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    monkeypatch.setattr(database, "get_engine", lambda *a, **k: engine)
+    database.initialize_database()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO athlete (athlete_id, full_name) VALUES (1, 'Alex Yee')"))
+        conn.execute(text("INSERT INTO event (event_id, event_name) VALUES (100, 'Leeds'), (300, 'Hamburg')"))
+        conn.execute(text("INSERT INTO program (event_id, prog_id, swim_distance, bike_distance, run_distance) "
+                          "VALUES (100, 10, 1.5, 40, 10), (300, 30, 0.75, 20, 5)"))
+    pd.DataFrame([
+        _result(100, 10, 2, "Hayden Wilde", "01:46:00"),
+        _result(300, 30, 3, "Leo Bergere", "00:52:00"),
+    ]).to_sql("race_results", engine, if_exists="append", index=False)
+    pd.DataFrame({"athlete_id": [3], "event_id": [300], "prog_id": [30]}).to_sql(
+        "position_metrics", engine, if_exists="append", index=False)
+    return engine
+
+def test_ingest_fetches_only_missing_programs_and_scopes_metrics(monkeypatch, tmp_path):
+    engine = _engine(monkeypatch)
+    fetched = []
+
+    def fake_process_pair(pair):
+        fetched.append(pair)
+        event_id, prog_id = pair
+        event = pd.DataFrame([{"event_id": event_id, "prog_id": prog_id, "prog_name": "Elite Men", "event_name": "Yokohama",
+                               "swim_distance": 1.5, "bike_distance": 40, "run_distance": 10}])
+        field = pd.DataFrame([_result(event_id, prog_id, 1, "Alex Yee", "01:45:00"),
+                              _result(event_id, prog_id, 4, "Vasco Vilaca", "01:45:30")])
+        return event, field
+
+    monkeypatch.setattr(athlete_ingest, "fetch_athlete_id_search", lambda name: (_ for _ in ()).throw(AssertionError))
+    monkeypatch.setattr(athlete_ingest, "fetch_athlete_info",
+                        lambda aid: pd.DataFrame([{"athlete_id": aid, "full_name": "Alex Yee", "noc": "GBR"}]))
+    monkeypatch.setattr(athlete_ingest, "fetch_race_results", lambda aid: [
+        {"event_id": 100, "prog_id": 10, "splits": ["00:17:50", "00:00:40", "00:55:00", "00:00:25", "00:30:05"],
+         "position": "1", "total_time": "01:44:00", "start_num": "1"},
+        {"event_id": 200, "prog_id": 20, "splits": ["00:18:00", "00:00:40", "00:55:00", "00:00:25", "00:31:00"],
+         "position": "1", "total_time": "01:45:00", "start_num": "1"},
+    ])
+    monkeypatch.setattr(athlete_ingest, "process_pair", fake_process_pair)
+    h2h_path = str(tmp_path / "h2h.npz")
+    monkeypatch.setattr(athlete_ingest, "update_head_to_head",
+                        functools.partial(head_to_head.update_head_to_head, path=h2h_path))
+
+    summary = athlete_ingest.ingest_athlete("alex yee", engine=engine, max_workers=2)
+
+    assert summary["athlete_id"] == 1 and summary["new_programs"] == 1
+    assert fetched == [(200, 20)]
+    results = pd.read_sql("SELECT prog_id, athlete_id FROM race_results ORDER BY prog_id, athlete_id", engine)
+    assert results.values.tolist() == [[10, 1], [10, 2], [20, 1], [20, 4], [30, 3]]
+    metrics = pd.read_sql("SELECT prog_id, athlete_id, position_at_run FROM position_metrics "
+                          "ORDER BY prog_id, athlete_id", engine)
+    assert metrics[["prog_id", "athlete_id"]].values.tolist() == [[10, 1], [10, 2], [20, 1], [20, 4], [30, 3]]
+    assert metrics.loc[(metrics.prog_id == 10) & (metrics.athlete_id == 1), "position_at_run"].item() == 1
+    # The unrelated race keeps its existing row untouched
+    assert pd.isna(metrics.loc[metrics.prog_id == 30, "position_at_run"].item())
+    assert set(pd.read_sql("SELECT DISTINCT prog_id FROM pace_metrics", engine)["prog_id"]) >= {10, 20}
+    assert head_to_head.HeadToHead.load(h2h_path).record(1, 4)["wins"] == 1
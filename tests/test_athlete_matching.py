@@ -0,0 +1,33 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from tri_analysis.athlete_matching import AthleteNameIndex, normalize_name
+
+def _engine(rows):
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE athlete (athlete_id INTEGER PRIMARY KEY, full_name TEXT)"))
+        conn.execute(text("INSERT INTO athlete VALUES (:id, :name)"), [{"id": i, "name": n} for i, n in rows])
+    return engine
+
+def test_normalize_name_ignores_case_accents_spacing_and_order():
+    assert normalize_name("Alex  Yee") == normalize_name("YEE alex") == "alex yee"
+    assert normalize_name("Léo Bergère") == normalize_name("Leo BERGERE")
+    assert normalize_name("Kristian Blummenfelt") == normalize_name("Blummenfelt, Kristian")
+    assert normalize_name(None) is None
+
+def test_match_many_exact_normalized_ambiguous_and_refresh():
+    engine = _engine([(1, "Alex Yee"), (2, "Léo Bergère"), (3, "Sam Smith"), (4, "Smith Sam")])
+    index = AthleteNameIndex(engine, check_interval=0)
+
+    ids = index.match_many(["Alex Yee", "leo bergere", "Yee Alex", "Nobody", "Sam Smith", "sam smith"])
+    # Exact names win, normalized duplicates (Sam Smith / Smith Sam) are not guessed
+    assert ids.tolist() == [1, 2, 1, pd.NA, 3, pd.NA]
+
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO athlete VALUES (5, 'Beth Potter')"))
+    assert index.match("beth potter") == 5
@@ -0,0 +1,64 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+import datetime
+import multiprocessing
+import time
+
+import pandas as pd
+
+import tri_analysis.backfill as backfill
+from tri_analysis.backfill import season_shards, merge_reports
+from tri_analysis.throttle import SharedRateLimiter
+
+def test_season_shards_end_today():
+    shards = season_shards(2023, today=datetime.date(2025, 3, 14))
+    assert shards == [
+        ("2023", "2023-01-01", "2023-12-31"),
+        ("2024", "2024-01-01", "2024-12-31"),
+        ("2025", "2025-01-01", "2025-03-14"),
+    ]
+
+def _spend(limiter, n):
+    for _ in range(n):
+        limiter.acquire()
+
+def test_shared_rate_limiter_spans_processes():
+    limiter = SharedRateLimiter(rate=50, burst=1)
+    procs = [multiprocessing.Process(target=_spend, args=(limiter, 10)) for _ in range(3)]
+    started = time.perf_counter()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    # 30 acquisitions at 50/s across all processes take at least ~29 intervals
+    assert time.perf_counter() - started >= 29 / 50
+
+def test_merge_reports_sums_shards_and_lists_failures():
+    ep = {"count": 2, "total_s": 1.0, "errors": 1, "retries": 1, "max_s": 0.7}
+    shards = [
+        {"shard": "2010", "programs": 3, "results": 90, "athletes": 40, "error": None, "endpoints": {"program_results": ep}},
+        {"shard": "2009", "programs": 0, "results": 0, "athletes": 0, "error": "HTTPError: 500", "endpoints": {"program_results": ep}},
+    ]
+    report = merge_reports(shards)
+    assert report["totals"] == {"programs": 3, "results": 90, "athletes": 40}
+    assert report["failed"] == ["2009"]
+    assert report["endpoints"]["program_results"]["count"] == 4
+    assert report["endpoints"]["program_results"]["mean_s"] == 0.5
+    assert [s["shard"] for s in report["shards"]] == ["2009", "2010"]
+
+def test_shards_leave_athletes_to_the_coordinator(monkeypatch):
+    written = []
+    results = pd.DataFrame({"athlete_id": [7, 3, 7], "prog_id": [1, 1, 2], "total_time": ["01:50:00"] * 3})
+    monkeypatch.setattr(backfill, "get_engine", lambda: None)
+    monkeypatch.setattr(backfill, "fetch_programs", lambda start, end: (pd.DataFrame({"prog_id": [1, 2]}), results))
+    monkeypatch.setattr(backfill, "fetch_athletes", lambda *a, **k: (_ for _ in ()).throw(AssertionError))
+    monkeypatch.setattr(backfill, "write_frames", lambda engine, athletes, events, res: written.append(athletes))
+
+    shard = backfill.run_shard(("2024", "2024-01-01", "2024-12-31"))
+
+    assert shard["error"] is None
+    assert sorted(shard["athlete_ids"]) == [3, 7] and shard["athletes"] == 2
+    assert sorted(shard["prog_ids"]) == [1, 2]
+    assert len(written) == 1 and written[0].empty
@@ -0,0 +1,81 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+import datetime
+import functools
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+import database
+import tri_analysis.build_database as build_database
+import tri_analysis.head_to_head as head_to_head
+from tri_analysis.upsert_tables import upsert_athlete
+
+def _engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE athlete (athlete_id INTEGER PRIMARY KEY, full_name TEXT, "
+                          "noc TEXT, last_fetched_at TIMESTAMP)"))
+    now = datetime.datetime.now()
+    pd.DataFrame({
+        "athlete_id": [1, 2, 3],
+        "full_name": ["Fresh", "Stale", "Never fetched"],
+        "last_fetched_at": [now - datetime.timedelta(days=1), now - datetime.timedelta(days=90), None],
+    }).to_sql("athlete", engine, if_exists="append", index=False)
+    return engine
+
+def test_athletes_to_fetch_skips_fresh_profiles():
+    engine = _engine()
+    assert build_database.athletes_to_fetch([1, 2, 3, 4, 4, None], engine, ttl_days=30) == [2, 3, 4]
+    assert build_database.athletes_to_fetch([1, 2], engine, ttl_days=365) == []
+    assert build_database.athletes_to_fetch([1], engine, ttl_days=0) == [1]
+
+def test_fetch_athletes_only_calls_api_for_new_or_stale(monkeypatch):
+    engine = _engine()
+    calls = []
+    def fake_info(athlete_id):
+        calls.append(athlete_id)
+        return pd.DataFrame([{"athlete_id": athlete_id, "full_name": f"A{athlete_id}",
+                              "last_fetched_at": datetime.datetime.now()}])
+    monkeypatch.setattr(build_database, "fetch_athlete_info", fake_info)
+
+    athletes = build_database.fetch_athletes([1, 2, 4], engine)
+    assert sorted(calls) == [2, 4]
+    upsert_athlete(athletes, engine)
+
+    calls.clear()
+    assert build_database.fetch_athletes([1, 2, 4], engine).empty
+    assert calls == []
+    # Columns missing from the frame are left alone on conflict
+    names = pd.read_sql("SELECT athlete_id, full_name, noc FROM athlete ORDER BY athlete_id", engine)
+    assert names["full_name"].tolist() == ["Fresh", "A2", "Never fetched", "A4"]
+
+def test_resync_recomputes_paces_of_rewritten_programs(monkeypatch, tmp_path):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    monkeypatch.setattr(database, "get_engine", lambda *a, **k: engine)
+    monkeypatch.setattr(build_database, "update_head_to_head",
+                        functools.partial(head_to_head.update_head_to_head, path=str(tmp_path / "h2h.npz")))
+    events = pd.DataFrame({
+        "prog_id": [10], "event_id": [1], "prog_name": ["Elite Men"], "prog_distance_category": ["sprint"],
+        "swim_distance": [0.75], "bike_distance": [20.0], "run_distance": [5.0],
+        "event_name": ["Hamburg"], "event_date": pd.to_datetime(["2024-07-13"]),
+    })
+    def results(biketime):
+        return pd.DataFrame([{
+            "event_id": 1, "prog_id": 10, "athlete_id": aid, "athlete_full_name": f"A{aid}",
+            "swimtime": "00:09:00", "t1time": "00:00:40", "biketime": biketime, "t2time": "00:00:25",
+            "runtime": "00:15:00", "position": str(aid), "total_time": "00:55:00", "start_num": str(aid),
+        } for aid in (1, 2)])
+    fetched = [results("00:30:00")]
+    monkeypatch.setattr(build_database, "fetch_programs", lambda start, end: (events.copy(), fetched[0].copy()))
+    monkeypatch.setattr(build_database, "fetch_athletes", lambda ids, engine: pd.DataFrame())
+
+    build_database.build_database(engine=engine, reset=False)
+    fetched[0] = results("00:24:00")
+    build_database.sync(engine=engine, since="2024-01-01")
+
+    paces = pd.read_sql("SELECT athlete_id, bike_kmh FROM pace_metrics ORDER BY athlete_id", engine)
+    assert paces["bike_kmh"].tolist() == [50.0, 50.0]
@@ -0,0 +1,53 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+import pandas as pd
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.pool import StaticPool
+
+import database
+from tri_analysis.upsert_tables import upsert_events
+
+def _engine(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    monkeypatch.setattr(database, "get_engine", lambda *a, **k: engine)
+    return engine
+
+def _programs():
+    return pd.DataFrame({
+        "prog_id": [11, 12, 21], "event_id": [1, 1, 2],
+        "prog_name": ["Elite Men", "Elite Women", "Elite Men"], "prog_distance_category": ["Standard"] * 3,
+        "swim_distance": [1.5, 1.5, 0.75], "bike_distance": [40.0, 40.0, 20.0], "run_distance": [10.0, 10.0, 5.0],
+        "event_name": ["Leeds", "Leeds", "Hamburg"], "event_venue": ["Roundhay", "Roundhay", "Alster"],
+        "event_date": ["2024-06-08", "2024-06-08", "2024-07-13"], "event_country": ["GBR", "GBR", "GER"],
+        "cat_name": ["WTCS", "WTCS", "WTCS"], "temperature_water": [17.0, 18.0, 21.0], "wetsuit": ["Y", "Y", "N"],
+    })
+
+def test_legacy_events_table_is_migrated_behind_a_view(monkeypatch):
+    engine = _engine(monkeypatch)
+    _programs().to_sql("events", engine, index=False)
+
+    database.initialize_database()
+
+    assert "events" in inspect(engine).get_view_names()
+    assert pd.read_sql("SELECT event_id, event_name FROM event ORDER BY event_id", engine).values.tolist() == \
+        [[1, "Leeds"], [2, "Hamburg"]]
+    view = pd.read_sql("SELECT * FROM events ORDER BY prog_id", engine)
+    assert list(view.columns) == [c for _, c in database.EVENTS_VIEW_COLUMNS]
+    assert view["prog_id"].tolist() == [11, 12, 21]
+    assert view["temperature_water"].tolist() == [17.0, 18.0, 21.0]
+    assert view["event_venue"].tolist() == ["Roundhay", "Roundhay", "Alster"]
+
+    # A second run finds the view and leaves it alone
+    database.initialize_database()
+    assert len(pd.read_sql("SELECT * FROM events", engine)) == 3
+
+def test_upsert_events_writes_each_event_once(monkeypatch):
+    engine = _engine(monkeypatch)
+    database.initialize_database()
+    upsert_events(_programs(), engine)
+    upsert_events(_programs().assign(event_name="Leeds WTCS"), engine)
+    assert pd.read_sql("SELECT COUNT(*) AS n FROM event", engine)["n"].item() == 2
+    assert pd.read_sql("SELECT COUNT(*) AS n FROM program", engine)["n"].item() == 3
+    assert set(pd.read_sql("SELECT event_name FROM events", engine)["event_name"]) == {"Leeds WTCS"}
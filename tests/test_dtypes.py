@@ -0,0 +1,19 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+import pandas as pd
+from tri_analysis.dtypes import apply_dtypes
+
+def test_integer_columns_use_nullable_type_only_when_needed():
+    df = pd.DataFrame({"athlete_id": [1, 2], "position_at_swim": [1.0, None]})
+    out = apply_dtypes(df, "position_metrics")
+    assert str(out["athlete_id"].dtype) == "int32"
+    assert str(out["position_at_swim"].dtype) == "Int16"
+
+def test_low_cardinality_text_is_categorical_and_blanks_are_missing():
+    df = pd.DataFrame({"event_id": ["1", "1"], "prog_id": [2, 3], "swim_laps": ["", "2"], "weather": ["Sunny", ""]})
+    out = apply_dtypes(df, "events")
+    assert isinstance(out["weather"].dtype, pd.CategoricalDtype)
+    assert out["weather"].isna().tolist() == [False, True]
+    assert out["swim_laps"].isna().tolist() == [True, False]
+    assert str(out["event_id"].dtype) == "int32"
@@ -0,0 +1,70 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from tri_analysis.head_to_head import HeadToHead, race_pairs, update_head_to_head
+from tri_analysis.synthetic import generate_warehouse
+
+def _results(prog_id, finishers):
+    return pd.DataFrame({
+        "event_id": prog_id // 10, "prog_id": prog_id,
+        "athlete_id": [a for a, _, _ in finishers], "position": [p for _, p, _ in finishers],
+        "total_time": [t for _, _, t in finishers],
+    })
+
+def test_race_pairs_expands_every_finisher_pair():
+    results = pd.concat([
+        _results(10, [(1, "1", "01:45:00"), (2, "2", "01:45:20"), (3, "3", "01:46:00"), (4, "DNF", "")]),
+        _results(20, [(2, "1", "00:52:00"), (1, "2", "00:52:00")]),
+    ])
+    progs, winners, losers, margins = race_pairs(results)
+    assert sorted(zip(progs.tolist(), winners.tolist(), losers.tolist(), margins.tolist())) == \
+        [(10, 1, 2, 20), (10, 1, 3, 60), (10, 2, 3, 40)]
+
+def test_race_pairs_matches_naive_self_join():
+    frames = generate_warehouse(2000, seed=5)
+    results = frames["race_results"]
+    _, winners, losers, _ = race_pairs(results)
+    h2h = HeadToHead()
+    h2h.add(results)
+    a, b = int(winners[0]), int(losers[0])
+    secs = pd.to_timedelta(results["total_time"], errors="coerce").dt.total_seconds()
+    finished = results.assign(secs=secs)[pd.to_numeric(results["position"], errors="coerce").notna() & (secs > 0)]
+    both = finished[finished["athlete_id"] == a].merge(finished[finished["athlete_id"] == b], on=["event_id", "prog_id"])
+    assert h2h.record(a, b)["wins"] == int((both["secs_x"] < both["secs_y"]).sum())
+    assert h2h.record(a, b)["losses"] == int((both["secs_x"] > both["secs_y"]).sum())
+
+def test_update_is_incremental_and_persisted(tmp_path):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    path = str(tmp_path / "h2h.npz")
+    _results(10, [(1, "1", "01:45:00"), (2, "2", "01:45:30")]).to_sql("race_results", engine, index=False)
+    assert update_head_to_head(engine, path) == 1
+    assert update_head_to_head(engine, path) == 0
+
+    _results(20, [(2, "1", "00:52:00"), (1, "2", "00:52:10"), (7, "3", "00:53:00")]).to_sql(
+        "race_results", engine, index=False, if_exists="append")
+    assert update_head_to_head(engine, path) == 3
+    record = HeadToHead.load(path).record(1, 2)
+    assert (record["wins"], record["losses"], record["races"]) == (1, 1, 2)
+    assert (record["mean_win_margin_s"], record["mean_loss_margin_s"]) == (30.0, 10.0)
+    assert HeadToHead.load(path).record(1, 99)["races"] == 0
+    assert update_head_to_head(engine, path, full=True) == 4
+
+def test_rewritten_programs_replace_their_old_pairs(tmp_path):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    path = str(tmp_path / "h2h.npz")
+    _results(10, [(1, "1", "01:45:00"), (2, "2", "01:45:30")]).to_sql("race_results", engine, index=False)
+    update_head_to_head(engine, path)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE race_results SET total_time = '01:44:00' WHERE athlete_id = 2"))
+
+    assert update_head_to_head(engine, path) == 0
+    assert update_head_to_head(engine, path, prog_ids=[10]) == 1
+    h2h = HeadToHead.load(path)
+    assert (h2h.record(2, 1)["wins"], h2h.record(2, 1)["losses"]) == (1, 0)
+    assert h2h.record(2, 1)["mean_win_margin_s"] == 60.0
+    assert h2h.wins.nnz == 1 and len(h2h.pairs[0]) == 1
@@ -0,0 +1,122 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import StaticPool
+
+import database
+import tri_analysis.athlete_matching as athlete_matching
+import tri_analysis.historical_rankings_scraper as scraper_module
+from tri_analysis.historical_rankings_scraper import HistoricalRankingsScraper
+from tri_analysis.ranking_archive import RankingArchive
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    monkeypatch.setattr(database, "get_engine", lambda *a, **k: engine)
+    monkeypatch.setattr(scraper_module, "get_engine", lambda *a, **k: engine)
+    database.initialize_database()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO athlete (athlete_id, full_name) VALUES (1, 'Alex Yee')"))
+    monkeypatch.setattr(athlete_matching, "_index", athlete_matching.AthleteNameIndex(engine))
+    return engine
+
+@pytest.fixture
+def scraper(engine, tmp_path):
+    return HistoricalRankingsScraper(archive=RankingArchive(str(tmp_path / "archive")))
+
+def test_frontier_switches_url_pattern_around_the_2020_gap():
+    frontier = HistoricalRankingsScraper.build_frontier(range(2018, 2023))
+    assert sorted({year for _, _, year, _ in frontier}) == [2018, 2019, 2021, 2022]
+    assert {series for _, series, _, _ in frontier} == {"world_triathlon_championship_series"}
+    assert len(frontier) == 8 and {gender for *_, gender in frontier} == {"male", "female"}
+    itu = [url for url, _, year, _ in frontier if year <= 2019]
+    wtcs = [url for url, _, year, _ in frontier if year >= 2021]
+    assert all(url.startswith(scraper_module.ITU_WTCS_URL_PATTERN.split("{")[0]) for url in itu)
+    assert all(url.startswith(scraper_module.WTCS_URL_PATTERN.split("{")[0]) for url in wtcs)
+
+    with_rankings = HistoricalRankingsScraper.build_frontier(
+        range(2018, 2023), series=("world_triathlon_championship_series", "world_rankings"))
+    assert len([page for page in with_rankings if page[1] == "world_rankings"]) == 10
+
+def test_discovery_skips_world_rankings_by_default(scraper, monkeypatch):
+    checked = []
+    def check(url, series, year, gender):
+        checked.append(series)
+        return {"url": url, "series": series, "year": year, "gender": gender, "athlete_count": 1}
+    monkeypatch.setattr(scraper, "_check_ranking_availability", check)
+    found = scraper.discover_available_rankings(years=range(2019, 2022))
+    assert set(checked) == {"world_triathlon_championship_series"}
+    assert [(r["year"], r["gender"]) for r in found] == [(2019, "male"), (2019, "female"), (2021, "male"), (2021, "female")]
+
+def _stage(engine, names):
+    rows = pd.DataFrame({
+        "athlete_name": names, "ranking_cat_name": "World Triathlon Championship Series", "ranking_cat_id": 15,
+        "rank_position": range(1, len(names) + 1), "total_points": 100.0, "year": 2019, "retrieved_at": date.today(),
+    })
+    rows.to_sql("staging_rankings", engine, if_exists="append", index=False)
+
+def test_resolve_athlete_ids_batches_writes_after_lookups(engine, scraper, monkeypatch):
+    names = ["Alex Yee", "Hayden Wilde", "Leo Bergere", "Vasco Vilaca", "Ghost Runner", "Matt Hauser"]
+    _stage(engine, names)
+    ids = {"Hayden Wilde": 2, "Leo Bergere": 3, "Vasco Vilaca": 4, "Matt Hauser": 5}
+
+    in_transaction = []
+    statements = []
+    event.listen(engine, "begin", lambda conn: in_transaction.append(True))
+    event.listen(engine, "commit", lambda conn: in_transaction.clear())
+    event.listen(engine, "rollback", lambda conn: in_transaction.clear())
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, params, context, many: statements.append((statement, params, many)))
+
+    looked_up = []
+    def search(name):
+        assert not in_transaction, "API lookup ran inside a database transaction"
+        looked_up.append(name)
+        if name not in ids:
+            raise ValueError(f"Athlete '{name}' not found.")
+        return ids[name]
+
+    monkeypatch.setattr(scraper_module, "WRITE_BATCH_SIZE", 2)
+    monkeypatch.setattr(scraper_module, "fetch_athlete_id_search", search)
+    monkeypatch.setattr(scraper_module, "fetch_athlete_info",
+                        lambda aid: pd.DataFrame([{"athlete_id": aid, "full_name": {v: k for k, v in ids.items()}[aid]}]))
+    monkeypatch.setattr(scraper_module, "fetch_race_results", lambda aid: [
+        {"event_id": 100, "prog_id": 10, "splits": [], "position": str(aid), "total_time": f"01:4{aid}:00", "start_num": "1"}
+    ])
+
+    scraper.resolve_athlete_ids(max_workers=4)
+
+    # Only names missing from the local index go to the API, and the failed one does not stop the rest
+    assert sorted(looked_up) == ["Ghost Runner", "Hayden Wilde", "Leo Bergere", "Matt Hauser", "Vasco Vilaca"]
+    staged = pd.read_sql("SELECT athlete_name, athlete_id FROM staging_rankings", engine)
+    resolved = dict(zip(staged["athlete_name"], staged["athlete_id"]))
+    assert resolved["Alex Yee"] == 1 and resolved["Matt Hauser"] == 5
+    assert pd.isna(resolved["Ghost Runner"])
+
+    # Five resolved names are written as executemany batches of at most WRITE_BATCH_SIZE rows
+    batches = [len(params) if many else 1 for sql, params, many in statements
+               if sql.lstrip().startswith("UPDATE staging_rankings") and "retrieved_at" in sql]
+    assert sorted(batches) == [1, 2, 2]
+    assert pd.read_sql("SELECT COUNT(*) AS n FROM athlete", engine)["n"].item() == 5
+    assert pd.read_sql("SELECT COUNT(*) AS n FROM race_results", engine)["n"].item() == 4
+    assert athlete_matching._index.match("Matt Hauser") == 5
+
+def test_staged_rankings_feed_upsert_rankings(engine, scraper):
+    _stage(engine, ["Hayden Wilde", "Alex Yee"])
+    staged = scraper.get_staged_rankings(retrieved_at=date.today())
+    assert staged.columns.tolist() == ["athlete_id", "athlete_name", "ranking_cat_name", "ranking_cat_id",
+                                       "rank_position", "total_points", "year", "retrieved_at", "noc", "yob"]
+    assert staged["athlete_name"].tolist() == ["Hayden Wilde", "Alex Yee"]
+    assert scraper.get_staged_rankings(retrieved_at=date(2000, 1, 1)).empty
+
+    scraper.upsert_rankings(staged)
+    stored = pd.read_sql("SELECT athlete_id, rank_position FROM athlete_rankings ORDER BY rank_position", engine)
+    # Alex Yee is matched through the name index; Hayden Wilde is unknown locally
+    assert stored["rank_position"].tolist() == [1, 2]
+    assert pd.isna(stored["athlete_id"][0]) and stored["athlete_id"][1] == 1
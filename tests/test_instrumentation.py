@@ -0,0 +1,35 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+import json
+from unittest import mock
+
+import requests
+
+import tri_analysis.api_handling as api_handling
+from tri_analysis.instrumentation import METRICS, Histogram, stage, export_run_report
+
+def test_histogram_buckets_and_quantiles():
+    hist = Histogram(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.05, 0.5, 3.0):
+        hist.observe(seconds)
+    assert hist.counts == [2, 1, 1]
+    assert hist.quantile(0.5) == 0.1 and hist.quantile(1.0) == 3.0
+
+def test_get_retries_and_run_report(tmp_path, monkeypatch):
+    METRICS.reset()
+    monkeypatch.setattr(api_handling, "API_RETRY_BACKOFF", 0)
+    responses = [requests.exceptions.ConnectionError(), mock.Mock(status_code=503), mock.Mock(status_code=200)]
+    with mock.patch.object(requests, "get", side_effect=responses):
+        assert api_handling._get("athlete_info", "http://example/athletes/1").status_code == 200
+    with stage("position_metrics") as st:
+        st.rows = 1000
+
+    path = export_run_report("test", str(tmp_path))
+    report = json.load(open(path))
+    endpoint = report["endpoints"]["athlete_info"]
+    assert (endpoint["count"], endpoint["errors"], endpoint["retries"]) == (3, 2, 2)
+    assert report["stages"]["position_metrics"]["rows"] == 1000
+    prom = (tmp_path / "test.prom").read_text()
+    assert 'tri_api_retries_total{run="test",endpoint="athlete_info"} 2' in prom
@@ -0,0 +1,85 @@
+import subprocess
+import sys
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..')))
+sys.path.insert(0, abspath(join(dirname(__file__), '..', 'tri_analysis')))
+
+import main
+
+ROOT = abspath(join(dirname(__file__), '..'))
+
+def test_help_does_not_import_pipeline_modules():
+    code = (
+        "import sys, main\n"
+        "try:\n"
+        "    main.main(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "heavy = {'pandas', 'sqlalchemy', 'requests', 'tri_analysis.build_database'} & set(sys.modules)\n"
+        "print(sorted(heavy))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().endswith("[]")
+
+def test_legacy_menu_numbers_map_to_subcommands():
+    parser = main.build_parser()
+    assert parser.parse_args(["1", "--yes"]).func is main.cmd_full_import
+    assert parser.parse_args(["2"]).func is main.cmd_sync
+    args = parser.parse_args(["3", "Alex", "Yee"])
+    assert args.func is main.cmd_add_athlete and args.name == ["Alex", "Yee"]
+    assert args.stage == "add-athlete"
+
+def test_export_writes_table(monkeypatch, tmp_path):
+    import pandas as pd
+    import tri_analysis.dtypes as dtypes
+    monkeypatch.setattr(dtypes, "read_table", lambda table: pd.DataFrame({"athlete_id": [1, 2]}))
+    out = tmp_path / "athlete.csv"
+    assert main.main(["export", "athlete", "-o", str(out)]) == 0
+    assert pd.read_csv(out)["athlete_id"].tolist() == [1, 2]
+
+def test_build_database_import_has_no_side_effects(monkeypatch):
+    import database
+    monkeypatch.setattr(database, "get_engine", lambda *a, **k: (_ for _ in ()).throw(AssertionError("engine created")))
+    sys.modules.pop("tri_analysis.build_database", None)
+    import tri_analysis.build_database as build
+    assert callable(build.build_database) and callable(build.sync)
+
+def test_backfill_defaults_come_from_config(monkeypatch):
+    import config
+    import tri_analysis.backfill as backfill
+    calls = []
+    monkeypatch.setattr(config, "BACKFILL_START_YEAR", 2012)
+    monkeypatch.setattr(config, "API_RATE_LIMIT", 7.5)
+    monkeypatch.setattr(backfill, "backfill", lambda *a: calls.append(a) or {"failed": []})
+    assert main.main(["backfill", "--end-year", "2013"]) == 0
+    assert main.main(["backfill", "--start-year", "2020", "--rate", "3"]) == 0
+    assert calls == [(2012, 2013, None, 7.5), (2020, None, None, 3.0)]
+
+def test_profile_flag_before_subcommand():
+    args = main.build_parser().parse_args(["--profile", "sync"])
+    assert args.profile and args.profile_mode == "cprofile" and args.func is main.cmd_sync
+    args = main.build_parser().parse_args(["--profile", "--profile-mode", "sample", "sync"])
+    assert args.profile_mode == "sample"
+
+def test_rankings_initializes_the_schema_first(monkeypatch):
+    import database
+    import tri_analysis.ranking_import as ranking_import
+    calls = []
+    monkeypatch.setattr(database, "initialize_database", lambda: calls.append("init"))
+    monkeypatch.setattr(ranking_import, "import_rankings", lambda **kw: calls.append(("import", kw)))
+    main.cmd_rankings(main.build_parser().parse_args(["rankings", "--ids", "13"]))
+    assert calls == ["init", ("import", {"ranking_ids": [13]})]
+
+def test_full_import_defaults_come_from_config(monkeypatch):
+    import config
+    import tri_analysis.build_database as build
+    calls = []
+    monkeypatch.setattr(config, "IMPORT_START_DATE", "2023-01-01")
+    monkeypatch.setattr(config, "IMPORT_END_DATE", "2023-12-31")
+    monkeypatch.setattr(build, "build_database", lambda **kw: calls.append(kw))
+    monkeypatch.setattr("tri_analysis.instrumentation.export_run_report", lambda name: None)
+    main.main(["full-import", "--yes"])
+    main.main(["full-import", "--yes", "--start", "2024-05-01"])
+    assert calls == [{"start_date": "2023-01-01", "end_date": "2023-12-31"},
+                     {"start_date": "2024-05-01", "end_date": "2023-12-31"}]
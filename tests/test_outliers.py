@@ -0,0 +1,41 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+import pandas as pd
+from tri_analysis.outliers import detect_split_outliers
+from tri_analysis.metrics import parse_time_to_secs, parse_times_to_secs
+
+def _race(n=20):
+    return pd.DataFrame({
+        "event_id": 1, "prog_id": 2, "athlete_id": range(1, n + 1),
+        "swimsecs": [1100 + i for i in range(n)], "t1secs": [45] * n, "bikesecs": [3360 + i for i in range(n)],
+        "t2secs": [28] * n, "runsecs": [1860 + 3 * i for i in range(n)],
+    })
+
+def test_clean_race_has_no_flags():
+    assert detect_split_outliers(_race()).empty
+
+def test_flags_mistimed_impossible_and_swapped_splits():
+    df = _race()
+    df.loc[0, "swimsecs"] = 400          # mis-timed chip: plausible in range but far off the field
+    df.loc[1, "runsecs"] = 30            # impossible run split
+    df.loc[2, ["t1secs", "bikesecs"]] = [3365, 44]  # t1 and bike fields swapped
+    flags = detect_split_outliers(df).set_index(["athlete_id", "segment"])["flag"]
+    assert flags[(1, "swim")] == "outlier"
+    assert flags[(2, "run")] == "impossible"
+    assert flags[(3, "t1")] == "swapped" and flags[(3, "bike")] == "swapped"
+    assert len(flags) == 4
+
+def test_relay_leg_splits_are_not_impossible():
+    # Mixed Relay leg: 300 m swim, ~6 km bike, ~1.6 km run
+    n = 16
+    df = pd.DataFrame({
+        "event_id": 1, "prog_id": 3, "athlete_id": range(1, n + 1),
+        "swimsecs": [205 + i for i in range(n)], "t1secs": [30] * n, "bikesecs": [450 + 2 * i for i in range(n)],
+        "t2secs": [20] * n, "runsecs": [265 + i for i in range(n)],
+    })
+    assert detect_split_outliers(df).empty
+
+def test_vectorized_time_parsing_matches_scalar():
+    values = pd.Series(["01:02:03", "2:03", "", None, "DNF", " 00:00:05", "1:2:3.5"])
+    assert list(parse_times_to_secs(values)) == [parse_time_to_secs(v) for v in values]
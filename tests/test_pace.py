@@ -0,0 +1,51 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+import pandas as pd
+from sqlalchemy import create_engine, text
+from tri_analysis.pace import compute_paces, update_pace_metrics
+from tri_analysis.synthetic import generate_warehouse
+
+def test_compute_paces_normalizes_by_distance():
+    results = pd.DataFrame({
+        "event_id": [1, 1], "prog_id": [2, 2], "athlete_id": [10, 11],
+        "swimtime": ["00:18:00", "00:19:00"], "t1time": ["00:00:45", "00:00:45"],
+        "biketime": ["01:00:00", "00:58:00"], "t2time": ["00:00:30", "00:00:30"],
+        "runtime": ["00:30:00", "00:31:00"],
+    })
+    events = pd.DataFrame({"event_id": [1], "prog_id": [2], "swim_distance": [1500.0],
+                           "bike_distance": [40.0], "run_distance": [10.0]})
+    paces = compute_paces(results, events).set_index("athlete_id")
+    assert paces.loc[10, "swim_sec_per_100m"] == 72.0
+    assert paces.loc[10, "bike_kmh"] == 40.0
+    assert paces.loc[10, "run_sec_per_km"] == 180.0
+    assert paces.loc[10, "swim_pct"] == 1.0 and paces.loc[11, "bike_pct"] == 1.0
+
+def test_update_pace_metrics_is_incremental():
+    frames = generate_warehouse(300, seed=3)
+    engine = create_engine("sqlite://")
+    frames["race_results"].to_sql("race_results", engine, index=False)
+    frames["events"].to_sql("events", engine, index=False)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE pace_metrics (athlete_id INT, event_id INT, prog_id INT, swim_sec_per_100m REAL, "
+                          "bike_kmh REAL, run_sec_per_km REAL, swim_pct REAL, bike_pct REAL, run_pct REAL)"))
+    assert update_pace_metrics(engine) == 300
+    assert update_pace_metrics(engine) == 0
+
+def test_update_pace_metrics_recomputes_rewritten_programs():
+    frames = generate_warehouse(300, seed=3)
+    engine = create_engine("sqlite://")
+    frames["race_results"].to_sql("race_results", engine, index=False)
+    frames["events"].to_sql("events", engine, index=False)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE pace_metrics (athlete_id INT, event_id INT, prog_id INT, swim_sec_per_100m REAL, "
+                          "bike_kmh REAL, run_sec_per_km REAL, swim_pct REAL, bike_pct REAL, run_pct REAL)"))
+    update_pace_metrics(engine)
+    prog_id = int(frames["race_results"]["prog_id"].iloc[0])
+    rows = int((frames["race_results"]["prog_id"] == prog_id).sum())
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE race_results SET runtime = '00:40:00' WHERE prog_id = :p"), {"p": prog_id})
+    assert update_pace_metrics(engine, prog_ids=[prog_id]) == rows
+    paces = pd.read_sql(text("SELECT run_sec_per_km FROM pace_metrics WHERE prog_id = :p"), engine, params={"p": prog_id})
+    assert len(paces) == rows and paces["run_sec_per_km"].nunique() <= 1
+    assert pd.read_sql("SELECT COUNT(*) AS n FROM pace_metrics", engine)["n"].item() == 300
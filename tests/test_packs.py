@@ -0,0 +1,54 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+import pandas as pd
+from sqlalchemy import create_engine, text
+from tri_analysis.packs import detect_packs, update_pack_metrics, CHECKPOINTS
+
+def _position_metrics(event_id, prog_id, bike_elapsed):
+    rows = []
+    for i, t in enumerate(bike_elapsed):
+        row = {"athlete_id": i + 1, "event_id": event_id, "prog_id": prog_id}
+        for cp in CHECKPOINTS:
+            row[f"elapsed{cp}"] = t if cp == "bike" else 0
+            row[f"position_at_{cp}"] = i + 1 if cp == "bike" else None
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def test_detect_packs_splits_on_gap_threshold():
+    df = _position_metrics(1, 10, [3600, 3602, 3605, 3640, 3641, 3700])
+    packs = detect_packs(df).sort_values("athlete_id")
+    assert packs["pack_id"].tolist() == [1, 1, 1, 2, 2, 3]
+    assert packs["pack_size"].tolist() == [3, 3, 3, 2, 2, 1]
+    assert packs["gap_to_pack_ahead"].tolist()[:3] == [pd.NA] * 3
+    assert packs["gap_to_pack_ahead"].tolist()[3:] == [35, 35, 59]
+
+def test_update_pack_metrics_only_processes_new_races():
+    engine = create_engine("sqlite://")
+    _position_metrics(1, 10, [3600, 3602]).to_sql("position_metrics", engine, index=False)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE pack_metrics (athlete_id INT, event_id INT, prog_id INT, checkpoint TEXT, "
+                          "pack_id INT, pack_size INT, gap_to_pack_ahead INT)"))
+    assert update_pack_metrics(engine) == 2
+    assert update_pack_metrics(engine) == 0
+    _position_metrics(2, 20, [3500]).to_sql("position_metrics", engine, index=False, if_exists="append")
+    assert update_pack_metrics(engine) == 1
+
+def test_metrics_rebuild_replaces_packs_of_existing_races(monkeypatch):
+    import tri_analysis.metrics as metrics
+    engine = create_engine("sqlite://")
+    _position_metrics(1, 10, [3600, 3602]).to_sql("position_metrics", engine, index=False)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE pack_metrics (athlete_id INT, event_id INT, prog_id INT, checkpoint TEXT, "
+                          "pack_id INT, pack_size INT, gap_to_pack_ahead INT)"))
+    update_pack_metrics(engine)
+
+    # The rebuilt positions split the old pack in two
+    rebuilt = _position_metrics(1, 10, [3600, 3700])
+    flags = pd.DataFrame({"athlete_id": [], "event_id": [], "prog_id": [], "segment": [], "flag": []})
+    monkeypatch.setattr(metrics, "calculate_position_metrics", lambda return_flags: (rebuilt, flags))
+    monkeypatch.setattr(metrics, "get_engine", lambda: engine)
+    monkeypatch.setattr(metrics, "create_query_indexes", lambda engine: None)
+    metrics.main()
+    packs = pd.read_sql("SELECT athlete_id, pack_id FROM pack_metrics WHERE checkpoint = 'bike' ORDER BY athlete_id", engine)
+    assert packs["pack_id"].tolist() == [1, 2]
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+from os.path import abspath, dirname, join
+import argparse
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..')))
+sys.path.insert(0, abspath(join(dirname(__file__), '..', 'tri_analysis')))
+
+import pytest
+from tri_analysis.profiling import profile_stage, add_profile_arguments, profiled
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(100))
+    return total
+
+def test_cprofile_writes_pstats_and_hotpaths(tmp_path):
+    with profile_stage("unit", "cprofile", memory=True, directory=str(tmp_path)) as run_dir:
+        _busy(0.05)
+    files = set(os.listdir(run_dir))
+    assert {"profile.pstats", "hotpaths.txt", "allocations.txt"} <= files
+    assert "_busy" in open(os.path.join(run_dir, "hotpaths.txt")).read()
+
+def test_sampler_writes_folded_stacks(tmp_path):
+    with profile_stage("unit", "sample", directory=str(tmp_path)) as run_dir:
+        _busy(0.2)
+    folded = open(os.path.join(run_dir, "stacks.folded")).read().splitlines()
+    assert folded
+    stack, count = folded[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert any("test_profiling.py:_busy" in line for line in folded)
+
+def test_profiled_is_noop_without_flag(tmp_path):
+    parser = add_profile_arguments(argparse.ArgumentParser())
+    with profiled(parser.parse_args([]), "unit"):
+        pass
+    args = parser.parse_args(["--profile", "--profile-dir", str(tmp_path)])
+    assert args.profile and args.profile_mode == "cprofile"
+    with profiled(args, "unit"):
+        pass
+    assert len(os.listdir(tmp_path)) == 1
+
+def test_unknown_mode_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        with profile_stage("unit", "perf", directory=str(tmp_path)):
+            pass
@@ -0,0 +1,106 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.pool import StaticPool
+
+import database
+from tri_analysis import queries
+from tri_analysis.upsert_tables import upsert_events, upsert_race_results, upsert_athlete
+
+def _result(prog_id, athlete_id, position, total, bike="00:55:00"):
+    return {"event_id": prog_id // 10, "prog_id": prog_id, "athlete_id": athlete_id, "athlete_full_name": f"A{athlete_id}",
+            "swimtime": "00:18:00", "t1time": "00:00:40", "biketime": bike, "t2time": "00:00:25",
+            "runtime": "00:31:00", "position": position, "total_time": total, "start_num": str(athlete_id)}
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    monkeypatch.setattr(database, "get_engine", lambda *a, **k: engine)
+    database.initialize_database()
+    queries.CACHE.clear()
+    upsert_athlete(pd.DataFrame({"athlete_id": [1, 2, 3], "full_name": ["Alex Yee", "Hayden Wilde", "Leo Bergere"],
+                                 "noc": ["GBR", "NZL", "FRA"]}), engine)
+    upsert_events(pd.DataFrame({
+        "prog_id": [10, 20], "event_id": [1, 2], "prog_name": ["Elite Men"] * 2,
+        "prog_distance_category": ["Standard ", "sprint"], "swim_distance": [1.5, 0.75],
+        "bike_distance": [40.0, 20.0], "run_distance": [10.0, 5.0],
+        "event_name": ["Leeds", "Hamburg"], "event_date": pd.to_datetime(["2024-06-08", "2024-07-13"]),
+    }), engine)
+    upsert_race_results(pd.DataFrame([
+        _result(10, 1, "2", "01:45:10", bike="00:54:00"), _result(10, 2, "1", "01:45:00"), _result(10, 3, "DNF", "00:00:00"),
+        _result(20, 1, "1", "00:52:00"), _result(20, 2, "2", "00:52:30"),
+    ]), engine)
+    return engine
+
+def test_query_indexes_exist(engine):
+    names = {ix["name"] for ix in inspect(engine).get_indexes("race_results")}
+    assert "idx_race_results_prog" in names
+    assert "idx_program_distance" in {ix["name"] for ix in inspect(engine).get_indexes("program")}
+
+def test_program_results_and_history(engine):
+    results = queries.program_results(1, 10, engine=engine)
+    assert results["athlete_id"].tolist() == [2, 1, 3]
+    assert results["finish"].isna().tolist() == [False, False, True]
+    history = queries.athlete_history(1, engine=engine)
+    assert history["event_name"].tolist() == ["Leeds", "Hamburg"]
+    assert history["finish"].tolist() == [2, 1]
+
+def test_head_to_head_winner(engine):
+    h2h = queries.head_to_head(1, 2, engine=engine)
+    assert h2h["winner"].tolist() == [2, 1]
+    # A non-finisher is not beaten, as in the head-to-head matrix
+    assert queries.head_to_head(1, 3, engine=engine)["winner"].isna().tolist() == [True]
+
+def test_head_to_head_agrees_with_the_matrix(engine):
+    from tri_analysis.head_to_head import HeadToHead
+    h2h = HeadToHead()
+    h2h.add(pd.read_sql("SELECT * FROM race_results", engine))
+    for a, b in [(1, 2), (1, 3), (2, 3)]:
+        winners = queries.head_to_head(a, b, engine=engine)["winner"]
+        record = h2h.record(a, b)
+        assert ((winners == a).sum(), (winners == b).sum()) == (record["wins"], record["losses"])
+
+def test_leaderboard_orders_by_segment(engine):
+    from tri_analysis.pace import update_pace_metrics
+    update_pace_metrics(engine)
+    board = queries.leaderboard("Standard", "bike", engine=engine)
+    assert board["athlete_id"].tolist()[:2] == [1, 2]
+    assert board["rank"].tolist()[:2] == [1, 2]
+    assert queries.leaderboard("standard", "bike", year=2024, engine=engine)["athlete_id"].tolist()[:2] == [1, 2]
+    assert queries.leaderboard("standard", "bike", year=2023, engine=engine).empty
+    with pytest.raises(ValueError):
+        queries.leaderboard("standard", "t1", engine=engine)
+
+def test_distance_categories_are_stored_lower_case_and_indexed(engine):
+    assert pd.read_sql("SELECT prog_distance_category FROM program ORDER BY prog_id", engine)[
+        "prog_distance_category"].tolist() == ["standard", "sprint"]
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT prog_id FROM program WHERE prog_distance_category = 'standard'").fetchall()
+    assert "idx_program_distance" in " ".join(str(row) for row in plan)
+
+def test_cached_until_a_write_invalidates(engine):
+    first = queries.program_results(2, 20, engine=engine)
+    assert queries.program_results(2, 20, engine=engine) is first
+    upsert_race_results(pd.DataFrame([_result(20, 3, "3", "00:53:00")]), engine)
+    refreshed = queries.program_results(2, 20, engine=engine)
+    assert refreshed is not first
+    assert refreshed["athlete_id"].tolist() == [1, 2, 3]
+
+def test_cache_is_lru_with_ttl(monkeypatch):
+    cache = queries.QueryCache(maxsize=2, ttl=10)
+    now = [0.0]
+    monkeypatch.setattr(queries.time, "monotonic", lambda: now[0])
+    cache.put("a", ["race_results"], 1)
+    cache.put("b", ["pace_metrics"], 2)
+    cache.get("a")
+    cache.put("c", ["race_results"], 3)
+    assert cache.get("b") is None and cache.get("a") == 1
+    assert cache.invalidate(["race_results"]) == 2
+    cache.put("d", [], 4)
+    now[0] = 11.0
+    assert cache.get("d") is None
@@ -0,0 +1,27 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+from tri_analysis.ranking_archive import RankingArchive
+
+def test_archive_dedupes_pages_and_tracks_staging(tmp_path):
+    archive = RankingArchive(str(tmp_path))
+    sha = archive.put("wtcs", 2018, "male", "http://x/2018/male", b"<table></table>", 0)
+    assert archive.put("wtcs", 2018, "female", "http://x/2018/female", b"<table></table>", 0) == sha
+    assert len(os.listdir(tmp_path / "pages")) == 1
+    assert archive.read(sha) == b"<table></table>"
+
+    assert archive.needs_staging("wtcs", 2018, "male")
+    archive.mark_staged("wtcs", 2018, "male")
+    assert not archive.needs_staging("wtcs", 2018, "male")
+
+    # A reopened archive keeps the manifest; changed content needs staging again
+    reopened = RankingArchive(str(tmp_path))
+    assert not reopened.needs_staging("wtcs", 2018, "male")
+    reopened.put("wtcs", 2018, "male", "http://x/2018/male", b"<table>new</table>", 0)
+    assert reopened.needs_staging("wtcs", 2018, "male")
+
+def test_archive_remembers_missing_pages(tmp_path):
+    archive = RankingArchive(str(tmp_path))
+    archive.put_missing("wtcs", 2020, "male", "http://x/2020/male", 404)
+    assert archive.get("wtcs", 2020, "male")["status"] == "missing"
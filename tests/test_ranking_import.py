@@ -0,0 +1,81 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+import tri_analysis.ranking_import as ranking_import
+
+def _engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE athlete (athlete_id INTEGER PRIMARY KEY, full_name TEXT)"))
+        conn.execute(text("""
+            CREATE TABLE staging_rankings (athlete_id INTEGER, athlete_name TEXT, ranking_cat_name TEXT,
+                ranking_cat_id INTEGER, rank_position INTEGER, total_points REAL, year INTEGER, retrieved_at DATE,
+                noc TEXT, yob INTEGER)
+        """))
+        conn.execute(text("""
+            CREATE TABLE athlete_rankings (athlete_id INTEGER, athlete_name TEXT, ranking_cat_name TEXT,
+                ranking_cat_id INTEGER, rank_position INTEGER, total_points REAL, year INTEGER, retrieved_at DATE,
+                PRIMARY KEY (athlete_name, ranking_cat_name, year, retrieved_at))
+        """))
+        conn.execute(text("""
+            CREATE TABLE ranking_snapshots (ranking_cat_id INTEGER, published DATE, athletes INTEGER,
+                imported_at TIMESTAMP, PRIMARY KEY (ranking_cat_id, published))
+        """))
+    return engine
+
+def test_import_pages_full_list_and_skips_known_snapshots(monkeypatch):
+    engine = _engine()
+    calls = []
+    published = {13: "2024-06-03T10:00:00", 14: "2024-06-03T10:00:00"}
+
+    def fake_page(cat, offset=0, limit=200):
+        calls.append((cat, offset))
+        total = 450 if cat == 13 else 30
+        rows = [{'athlete_id': cat * 1000 + i, 'athlete_full_name': f"Athlete {cat}-{i}", 'rank': i + 1, 'total': 100.0 - i}
+                for i in range(offset, min(offset + limit, total))]
+        return {'ranking_cat_name': f"Cat {cat}", 'ranking_id': cat, 'published': published[cat], 'rankings': rows}
+
+    monkeypatch.setattr(ranking_import, "fetch_ranking_page", fake_page)
+    monkeypatch.setattr(ranking_import, "get_engine", lambda: engine)
+
+    assert ranking_import.import_rankings([13, 14]) == 480
+    assert sorted(calls) == [(13, 0), (13, 200), (13, 400), (14, 0)]
+    years = pd.read_sql("SELECT DISTINCT year, retrieved_at FROM athlete_rankings", engine)
+    assert years.values.tolist() == [[2024, "2024-06-03"]]
+
+    # Unchanged publish dates cost one request per category and write nothing
+    calls.clear()
+    assert ranking_import.import_rankings([13, 14]) == 0
+    assert sorted(calls) == [(13, 0), (14, 0)]
+
+    published[14] = "2024-06-10T10:00:00"
+    assert ranking_import.import_rankings([13, 14]) == 30
+
+def test_import_with_no_categories_is_a_no_op(monkeypatch):
+    monkeypatch.setattr(ranking_import, "get_engine", lambda: (_ for _ in ()).throw(AssertionError("engine created")))
+    assert ranking_import.import_rankings([]) == 0
+
+def test_historical_rows_do_not_hide_live_snapshots(monkeypatch):
+    engine = _engine()
+    # A historical scrape promoted today, later than the live snapshot below
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO athlete_rankings VALUES (1, 'Old Champion', 'Cat 15', 15, 1, 900.0, 2019, '2099-01-01')
+        """))
+
+    def fake_page(cat, offset=0, limit=200):
+        rows = [{'athlete_id': 7, 'athlete_full_name': "Live Athlete", 'rank': 1, 'total': 50.0}]
+        return {'ranking_cat_name': "Cat 15", 'ranking_id': cat, 'published': "2024-06-03T10:00:00", 'rankings': rows}
+
+    monkeypatch.setattr(ranking_import, "fetch_ranking_page", fake_page)
+    monkeypatch.setattr(ranking_import, "get_engine", lambda: engine)
+
+    assert ranking_import.latest_snapshots(engine, [15]) == {15: None}
+    assert ranking_import.import_rankings([15]) == 1
+    assert str(ranking_import.latest_snapshots(engine, [15])[15]) == "2024-06-03"
+    assert ranking_import.import_rankings([15]) == 0
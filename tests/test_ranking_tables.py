@@ -0,0 +1,37 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+import pytest
+from tri_analysis.ranking_tables import extract_ranking_table, columns_to_records, etree
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+BACKENDS = ['stdlib'] + (['lxml'] if etree is not None else [])
+
+def _load(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_itu_layout(backend):
+    table = extract_ranking_table(_load('rankings_itu_2018_male.html'), backend=backend)
+    assert table['schema'] == 'itu'
+    cols = table['columns']
+    # Spacer row and the non-numeric DNS row are skipped
+    assert cols['rank'] == list(range(1, 41))
+    assert cols['given_name'][0] == 'Alex' and cols['family_name'][0] == 'Yee'
+    assert all(isinstance(p, float) for p in cols['total_points'])
+    assert 'events' not in cols
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_wtcs_layout(backend):
+    table = extract_ranking_table(_load('rankings_wtcs_2023_female.html'), backend=backend)
+    assert table['schema'] == 'wtcs'
+    records = columns_to_records(table['columns'])
+    assert len(records) == 40
+    assert records[9]['family_name'] == 'Gómez'
+    assert isinstance(records[0]['events'], int) and records[0]['noc'] == 'CAN'
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_page_without_ranking_table(backend):
+    html = b"<html><body><table><tr><th>Menu</th></tr><tr><td>Home</td></tr></table></body></html>"
+    assert extract_ranking_table(html, backend=backend) is None
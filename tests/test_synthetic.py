@@ -0,0 +1,21 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+from tri_analysis.synthetic import generate_warehouse, format_seconds
+
+def test_generate_warehouse_is_deterministic():
+    a = generate_warehouse(2000, seed=7)
+    b = generate_warehouse(2000, seed=7)
+    assert a["race_results"].equals(b["race_results"])
+    assert a["events"].equals(b["events"])
+
+def test_generate_warehouse_shape_and_keys():
+    frames = generate_warehouse(5000, seed=1)
+    results = frames["race_results"]
+    assert len(results) == 5000
+    assert not results.duplicated(subset=["athlete_id", "prog_id", "total_time"]).any()
+    assert set(results["prog_id"]) <= set(frames["events"]["prog_id"])
+    assert (results["position"] == "DNF").any()
+
+def test_format_seconds():
+    assert list(format_seconds([0, 61, 3725])) == ["00:00:00", "00:01:01", "01:02:05"]
@@ -0,0 +1,69 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import tri_analysis.throttle as throttle
+from tri_analysis.throttle import HostThrottle, RateLimiter
+
+def _fake_clock(monkeypatch):
+    """Replace the throttle module's clock: sleep() advances monotonic() instantly."""
+    now = [100.0]
+    def sleep(seconds):
+        now[0] += seconds
+    monkeypatch.setattr(throttle, "time", SimpleNamespace(monotonic=lambda: now[0], sleep=sleep))
+    return now
+
+def test_rate_limiter_paces_after_the_burst(monkeypatch):
+    now = _fake_clock(monkeypatch)
+    limiter = RateLimiter(rate=2.0, burst=3)
+    taken = []
+    for _ in range(7):
+        limiter.acquire()
+        taken.append(now[0] - 100.0)
+    # Three tokens at once, then one every 1/rate seconds
+    assert taken == [0.0, 0.0, 0.0, 0.5, 1.0, 1.5, 2.0]
+
+def test_rate_limiter_refills_while_idle_up_to_the_burst(monkeypatch):
+    now = _fake_clock(monkeypatch)
+    limiter = RateLimiter(rate=1.0, burst=2)
+    limiter.acquire()
+    limiter.acquire()
+    now[0] += 10.0
+    start = now[0]
+    for _ in range(3):
+        limiter.acquire()
+    assert now[0] - start == 1.0
+
+def test_host_throttle_caps_concurrency_per_host():
+    host_throttle = HostThrottle(rate_per_host=1000.0, concurrency_per_host=2, burst=100)
+    lock = threading.Lock()
+    active, peak = {}, {}
+
+    def request(url):
+        host = url.split("/")[2]
+        with host_throttle.slot(url):
+            with lock:
+                active[host] = active.get(host, 0) + 1
+                peak[host] = max(peak.get(host, 0), active[host])
+            time.sleep(0.02)
+            with lock:
+                active[host] -= 1
+
+    urls = [f"https://a.example/{i}" for i in range(8)] + [f"https://b.example/{i}" for i in range(8)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(request, urls))
+    assert peak == {"a.example": 2, "b.example": 2}
+
+def test_host_throttle_keeps_one_budget_per_host(monkeypatch):
+    now = _fake_clock(monkeypatch)
+    host_throttle = HostThrottle(rate_per_host=1.0, concurrency_per_host=1)
+    for url in ("https://a.example/1", "https://b.example/1", "https://a.example/2"):
+        with host_throttle.slot(url):
+            pass
+    # The second request to a.example waits for a token; b.example has its own bucket
+    assert now[0] == 101.0
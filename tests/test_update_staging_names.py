@@ -0,0 +1,28 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+from tri_analysis.update_staging_names import load_name_mappings, DEFAULT_MAPPING_PATH
+
+def test_load_name_mappings_validates_and_dedupes(tmp_path):
+    path = tmp_path / "names.csv"
+    path.write_text(
+        "old_name, athlete_name, athlete_id\n"
+        "Summer Cook, Summer Rappaport, 83096\n"
+        "Summer Cook,Summer Rappaport,83096\n"
+        "Chris Deegan,Christopher Deegan,\n"
+        "Ai Ueda,Ai Ueda,abc\n"
+        ",Nobody,12\n"
+        "Sam Smith,Samuel Smith,1\n"
+        "Sam Smith,Sam Smyth,2\n"
+    )
+    mappings, rejected = load_name_mappings(path)
+    assert mappings.values.tolist() == [["Summer Cook", "Summer Rappaport", 83096]]
+    assert sorted(rejected['reason']) == [
+        "invalid athlete_id", "missing athlete_id", "missing name",
+        "old_name mapped to several targets", "old_name mapped to several targets",
+    ]
+
+def test_default_mapping_file_is_valid():
+    mappings, rejected = load_name_mappings(DEFAULT_MAPPING_PATH)
+    assert len(mappings) == 4 and rejected.empty
@@ -0,0 +1,48 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tri_analysis')))
+
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from tri_analysis.upsert_tables import copy_dataframe, promote_rankings
+
+def _engine():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE athlete (athlete_id INTEGER PRIMARY KEY, full_name TEXT)"))
+        conn.execute(text("""
+            CREATE TABLE staging_rankings (athlete_id INTEGER, athlete_name TEXT, ranking_cat_name TEXT,
+                ranking_cat_id INTEGER, rank_position INTEGER, total_points REAL, year INTEGER, retrieved_at DATE)
+        """))
+        conn.execute(text("""
+            CREATE TABLE athlete_rankings (athlete_id INTEGER, athlete_name TEXT, ranking_cat_name TEXT,
+                ranking_cat_id INTEGER, rank_position INTEGER, total_points REAL, year INTEGER, retrieved_at DATE,
+                PRIMARY KEY (athlete_name, ranking_cat_name, year, retrieved_at))
+        """))
+        conn.execute(text("INSERT INTO athlete VALUES (1, 'Alex Yee'), (2, 'Sam Smith'), (3, 'Sam Smith')"))
+    return engine
+
+def _staged(points):
+    return pd.DataFrame({
+        'athlete_id': pd.array([pd.NA, pd.NA, 7], dtype='Int64'),
+        'athlete_name': ["Alex Yee", "Sam Smith", "Léo Bergère"],
+        'ranking_cat_name': "WTCS", 'ranking_cat_id': 15,
+        'rank_position': [1, 2, 3], 'total_points': points, 'year': 2023, 'retrieved_at': date(2024, 1, 1),
+    })
+
+def test_promote_rankings_joins_ids_and_upserts():
+    engine = _engine()
+    with engine.begin() as conn:
+        assert copy_dataframe(_staged([4000.0, 3000.0, 2000.0]), 'staging_rankings', conn) == 3
+        promote_rankings(conn)
+        conn.execute(text("DELETE FROM staging_rankings"))
+        copy_dataframe(_staged([4100.0, 3100.0, 2100.0]), 'staging_rankings', conn)
+        promote_rankings(conn, retrieved_at=date(2024, 1, 1))
+
+    out = pd.read_sql("SELECT athlete_name, athlete_id, total_points FROM athlete_rankings ORDER BY rank_position", engine)
+    # Exact-name IDs are joined in, shared names stay unresolved, staged IDs are kept
+    assert out['athlete_id'].tolist()[0] == 1 and pd.isna(out['athlete_id'][1]) and out['athlete_id'][2] == 7
+    assert out['total_points'].tolist() == [4100.0, 3100.0, 2100.0]
@@ -1,17 +1,190 @@
+import contextlib
 import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
 import requests
 import pandas as pd
 from config import (
     HEADERS, ATHLETE_RESULTS_URL, ATHLETE_DATA_URL, ATHLETE_SEARCH_URL, RANKING_URL, EVENT_LISTING_URL,
     PROGRAM_LISTING_URL, PROGRAM_RESULTS_URL, PROGRAM_DETAILS_URL, BASE_URL, SPEC_IDS, CATEGORY_IDS
 )
+from tri_analysis.instrumentation import METRICS
+
+API_TIMEOUT = 30            # seconds per request
+API_RETRIES = 2             # extra attempts for connection errors, 429 and 5xx responses
+API_RETRY_BACKOFF = 0.5     # seconds, doubled per attempt
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+API_CACHE_SIZE = 1024       # recent successful responses kept in memory (only inside api_run)
+
+# Optional process-wide request budget; every attempt in _get spends one token
+_rate_limiter = None
+
+def set_rate_limiter(limiter):
+    """Make every API request wait on limiter.acquire() (None removes the limit)."""
+    global _rate_limiter
+    _rate_limiter = limiter
+
+class ApiResponse:
+    """
+    A finished API response shared by every caller that asked for the same URL. Only the status,
+    URL and parsed JSON body are kept (not the raw body). The same object is handed to every
+    caller, so treat it as read-only.
+    """
+
+    def __init__(self, response: requests.Response):
+        self.status_code = response.status_code
+        self.url = response.url
+        self.reason = response.reason
+        self._json = self._error = None
+        try:
+            self._json = response.json()
+        except ValueError as e:   # not JSON, e.g. an HTML error page
+            self._error = e
+
+    def json(self):
+        if self._error is not None:
+            raise self._error
+        return self._json
+
+    def raise_for_status(self):
+        kind = "Client" if 400 <= self.status_code < 500 else "Server"
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} {kind} Error: {self.reason} for url: {self.url}")
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent requests into one call whose result every waiter shares. Inside
+    run() it also keeps an LRU of the last `maxsize` successful (200) responses so repeats within
+    the run are free; outside any run nothing is cached, so long-lived processes never serve
+    stale API data.
+    """
+
+    def __init__(self, maxsize: int = API_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._runs = 0
+        self.hits = self.coalesced = self.misses = 0
+
+    @contextlib.contextmanager
+    def run(self):
+        """Cache responses for the duration of the block; the outermost block clears on entry and exit."""
+        with self._lock:
+            self._runs += 1
+            outermost = self._runs == 1
+        if outermost:
+            self.clear()
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._runs -= 1
+                outermost = self._runs == 0
+            if outermost:
+                self.clear()
+
+    def get(self, key, fetch):
+        with self._lock:
+            if self._runs and key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            flight.response = fetch()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if (self._runs and self.maxsize and flight.response is not None
+                        and flight.response.status_code == 200):
+                    self._cache[key] = flight.response
+                    if len(self._cache) > self.maxsize:
+                        self._cache.popitem(last=False)
+            flight.done.set()
+        return flight.response
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.coalesced = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "coalesced": self.coalesced, "misses": self.misses, "cached": len(self._cache)}
+
+_flights = SingleFlight()
+
+def clear_api_cache():
+    """Forget cached responses, e.g. between runs in a long-lived process."""
+    _flights.clear()
+
+def api_run():
+    """Context manager scoping the response cache to one run (import, sync, shard, ...)."""
+    return _flights.run()
+
+def _fetch(endpoint: str, url: str, params=None) -> requests.Response:
+    """
+    GET an API URL, recording its latency, status and retries under `endpoint` (a fixed name,
+    not the URL). Connection errors and 429/5xx responses are retried with exponential backoff;
+    the final response is returned as-is for the caller to check.
+    """
+    for attempt in range(API_RETRIES + 1):
+        if _rate_limiter is not None:
+            _rate_limiter.acquire()
+        started = time.perf_counter()
+        try:
+            response = requests.get(url, headers=HEADERS, params=params, timeout=API_TIMEOUT)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            METRICS.observe_request(endpoint, time.perf_counter() - started, error=True)
+            if attempt == API_RETRIES:
+                raise
+        else:
+            METRICS.observe_request(endpoint, time.perf_counter() - started, response.status_code,
+                                    error=response.status_code >= 400)
+            if response.status_code not in RETRY_STATUS or attempt == API_RETRIES:
+                return response
+        METRICS.count_retry(endpoint)
+        time.sleep(API_RETRY_BACKOFF * 2 ** attempt)
+
+def _get(endpoint: str, url: str, params=None) -> ApiResponse:
+    """
+    GET an API URL through the single-flight layer: identical requests in flight at the same time
+    share one network call, and recent successful responses are served from memory.
+    """
+    key = requests.Request("GET", url, params=params).prepare().url
+    return _flights.get(key, lambda: ApiResponse(_fetch(endpoint, url, params)))
 
 def fetch_athlete_id_search(athlete_name: str) -> int:
     """
     Fetch athlete ID based on a user-provided name.
     """
     params = {"query": athlete_name}
-    response = requests.get(ATHLETE_SEARCH_URL, params=params, headers=HEADERS)
+    response = _get("athlete_search", ATHLETE_SEARCH_URL, params=params)
     if response.status_code == 200:
         data = response.json().get("data", [])
         if data:
@@ -25,7 +198,7 @@ def fetch_athlete_id_ranking(ranking_id: int) -> list:
     """
     Fetch athlete IDs from a ranking category ID. Return a list of athlete IDs.
     """
-    response = requests.get(RANKING_URL.format(ranking_id=ranking_id), headers=HEADERS)
+    response = _get("ranking", RANKING_URL.format(ranking_id=ranking_id))
     response.raise_for_status()
     rankings = response.json().get("data", {}).get("rankings", [])
     return [entry["athlete_id"] for entry in rankings]
@@ -35,7 +208,7 @@ def fetch_athlete_info(athlete_id: int) -> pd.DataFrame:
     Fetch basic athlete details from the API, given an athlete ID. Return a DataFrame with information.
     """
     url = ATHLETE_DATA_URL.format(athlete_id=athlete_id)
-    response = requests.get(url, headers=HEADERS)
+    response = _get("athlete_info", url)
     response.raise_for_status()
     data = response.json().get("data", {})
 
@@ -51,11 +224,14 @@ def fetch_athlete_info(athlete_id: int) -> pd.DataFrame:
         "gender": data.get("athlete_gender"),
         "country": data.get("athlete_country_name"),
         "age": data.get("athlete_age"),
+        "noc": data.get("athlete_noc"),
+        "yob": int(data["athlete_yob"]) if str(data.get("athlete_yob") or "").isdigit() else None,
         "category_to": categories.get("to", False),
         "category_coach": categories.get("coach", False),
         "category_athlete": categories.get("athlete", False),
         "category_medical": categories.get("medical", False),
         "category_paratriathlete": categories.get("paratriathlete", False),
+        "last_fetched_at": datetime.now(),
     }
     return pd.DataFrame([info]) if info else pd.DataFrame()
 
@@ -66,13 +242,41 @@ def fetch_race_results(athlete_id: int) -> list:
     url = ATHLETE_RESULTS_URL.format(athlete_id=athlete_id)
     results = []
     while url:
-        response = requests.get(url, headers=HEADERS)
+        response = _get("athlete_results", url)
         response.raise_for_status()
         page = response.json()
         results.extend(page.get("data", []))
         url = page.get("next_page_url")
     return results
 
+def athlete_results_to_frame(athlete_id: int, athlete_full_name: str, results: list) -> pd.DataFrame:
+    """
+    Convert fetch_race_results output for one athlete into race_results rows
+    (same columns as the table). Rows without a program or total time are dropped.
+    """
+    rows = []
+    for r in results:
+        splits = r.get("splits") or []
+        rows.append({
+            "event_id": r.get("event_id"),
+            "prog_id": r.get("prog_id"),
+            "athlete_id": athlete_id,
+            "athlete_full_name": athlete_full_name,
+            "swimtime": splits[0] if len(splits) > 0 else None,
+            "t1time": splits[1] if len(splits) > 1 else None,
+            "biketime": splits[2] if len(splits) > 2 else None,
+            "t2time": splits[3] if len(splits) > 3 else None,
+            "runtime": splits[4] if len(splits) > 4 else None,
+            "position": r.get("position"),
+            "total_time": r.get("total_time"),
+            "start_num": r.get("start_num"),
+        })
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    df = df.dropna(subset=["prog_id", "total_time"])
+    return df.drop_duplicates(subset=["athlete_id", "prog_id", "total_time"])
+
 def fetch_events_ids(start_date, end_date, per_page=500, spec_ids=SPEC_IDS, category_ids=CATEGORY_IDS) -> list:
     """
     Fetch events from the API since a given date. Returns a list of event ids.
@@ -88,7 +292,7 @@ def fetch_events_ids(start_date, end_date, per_page=500, spec_ids=SPEC_IDS, cate
         "end_date": end_date
     }
     while True:
-        resp = requests.get(EVENT_LISTING_URL, headers=HEADERS, params=params)
+        resp = _get("event_listing", EVENT_LISTING_URL, params=params)
         resp.raise_for_status()
         payload = resp.json().get("data") or []
         if not payload:
@@ -110,7 +314,7 @@ def fetch_program_ids(event_id) -> list:
         "Junior Men", "Junior Women", "Mixed Relay"
     }
     params = {"is_race": "true"}
-    resp = requests.get(PROGRAM_LISTING_URL.format(event_id=event_id), headers=HEADERS, params=params)
+    resp = _get("program_listing", PROGRAM_LISTING_URL.format(event_id=event_id), params=params)
     resp.raise_for_status()
     data = resp.json().get("data")
     if not data:
@@ -128,7 +332,7 @@ def process_program_data(event_id, program_id) -> pd.DataFrame:
     Returns a DataFrame with selected program, event, and meta details in a single row.
     """
     url = PROGRAM_DETAILS_URL.format(event_id=event_id, program_id=program_id)
-    resp = requests.get(url, headers=HEADERS)
+    resp = _get("program_details", url)
     resp.raise_for_status()
     data = resp.json().get("data", {})
 
@@ -184,7 +388,7 @@ def fetch_and_process_program_results(event_id, program_id, limit=50) -> pd.Data
     Stores all splits as available, filling missing with None.
     """
     url = PROGRAM_RESULTS_URL.format(event_id=event_id, program_id=program_id)
-    resp = requests.get(url, headers=HEADERS, params={"limit": limit})
+    resp = _get("program_results", url, params={"limit": limit})
     resp.raise_for_status()
     data = resp.json().get("data", {})
     results = data.get("results")
@@ -214,28 +418,3 @@ def fetch_and_process_program_results(event_id, program_id, limit=50) -> pd.Data
     df = pd.DataFrame(rows)
     df = df.drop_duplicates(subset=["athlete_id"])
     return df
-
-def fetch_rankings(ranking_cat_id: int, limit: int = 200) -> pd.DataFrame:
-    """
-    Pulls the ranking snapshot for a given category, returns a normalized DataFrame.
-    """
-    url = f"{BASE_URL}/rankings/{ranking_cat_id}"
-    resp = requests.get(url, headers=HEADERS, params={'limit': limit})
-    resp.raise_for_status()
-    js = resp.json()['data']
-
-    # build records list
-    records = []
-    for r in js.get('rankings', []):
-        records.append({
-            'athlete_id':     r['athlete_id'],
-            'athlete_name':   r['athlete_full_name'],
-            'ranking_cat_name': js['ranking_cat_name'],
-            'ranking_cat_id': js['ranking_id'],
-            'rank_position':  r['rank'],
-            'total_points':   r['total'],
-            'year':           2025,  # Assuming all rankings are for the year 2025
-            'retrieved_at':   pd.to_datetime(js['published']).date()
-        })
-    return pd.DataFrame(records)
-
@@ -0,0 +1,115 @@
+"""
+Targeted ingest of a single athlete (main.py add-athlete).
+
+The name is resolved through the local athlete index, falling back to the search API. Then the
+athlete's profile and race history are fetched. Only programs missing from `events` are fetched,
+with their details and full result lists, so that positions within those races are complete.
+Metrics and head-to-head pairs are recomputed only for the athlete's races.
+"""
+import concurrent.futures
+import time
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from database import get_engine
+from tri_analysis.api_handling import (
+    fetch_athlete_id_search,
+    fetch_athlete_info,
+    fetch_race_results,
+    athlete_results_to_frame,
+    api_run,
+)
+from tri_analysis.athlete_matching import AthleteNameIndex, get_name_index
+from tri_analysis.build_database import process_pair, is_valid_df, write_frames
+from tri_analysis.dtypes import apply_dtypes
+from tri_analysis.head_to_head import update_head_to_head
+from tri_analysis.instrumentation import stage
+from tri_analysis.metrics import update_race_metrics
+
+API_WORKERS = 8
+
+def resolve_athlete(name: str, engine=None) -> int:
+    """athlete_id for name from the local index, or from the search API if it is not known."""
+    index = AthleteNameIndex(engine) if engine is not None else get_name_index()
+    athlete_id = index.match(name)
+    return athlete_id if athlete_id is not None else fetch_athlete_id_search(name)
+
+def missing_programs(races: pd.DataFrame, engine) -> list:
+    """(event_id, prog_id) pairs of races that have no row in program yet."""
+    races = races[["event_id", "prog_id"]].dropna().drop_duplicates().astype("int64")
+    if races.empty:
+        return []
+    with engine.connect() as conn:
+        known = pd.read_sql(
+            text("SELECT event_id, prog_id FROM program WHERE prog_id IN :prog_ids")
+            .bindparams(bindparam("prog_ids", expanding=True)),
+            conn, params={"prog_ids": races["prog_id"].tolist()},
+        )
+    merged = races.merge(known.astype("int64"), on=["event_id", "prog_id"], how="left", indicator=True)
+    missing = merged[merged["_merge"] == "left_only"]
+    return list(zip(missing["event_id"].tolist(), missing["prog_id"].tolist()))
+
+def fetch_missing_programs(pairs: list, max_workers: int = API_WORKERS):
+    """Fetch program details and full result lists for (event_id, prog_id) pairs concurrently."""
+    events, results = [], []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for event_data, result_data in executor.map(process_pair, pairs):
+            if is_valid_df(event_data):
+                events.append(event_data)
+            if is_valid_df(result_data):
+                results.append(result_data)
+    events = pd.concat(events, ignore_index=True) if events else pd.DataFrame()
+    results = pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+    if not results.empty:
+        results.columns = [c.lower() for c in results.columns]
+    return events, results
+
+def ingest_athlete(name: str, engine=None, max_workers: int = API_WORKERS) -> dict:
+    """
+    Add one athlete, their race results and any races missing from events, then recompute
+    metrics for those races. Returns a summary dict.
+    """
+    engine = engine or get_engine()
+    started = time.perf_counter()
+    with api_run():
+        athlete_id = int(resolve_athlete(name, engine))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            info_future = executor.submit(fetch_athlete_info, athlete_id)
+            results_future = executor.submit(fetch_race_results, athlete_id)
+            athlete_df = apply_dtypes(info_future.result(), "athlete")
+            history = results_future.result()
+        full_name = athlete_df["full_name"].iloc[0] if not athlete_df.empty else name
+        results_df = athlete_results_to_frame(athlete_id, full_name, history)
+
+        pairs = missing_programs(results_df, engine) if not results_df.empty else []
+        with stage("athlete_ingest_programs") as st:
+            events_df, field_df = fetch_missing_programs(pairs, max_workers)
+            st.rows = len(field_df)
+    if not field_df.empty:
+        results_df = pd.concat([results_df, field_df], ignore_index=True)
+        results_df = results_df.drop_duplicates(subset=["athlete_id", "prog_id", "total_time"])
+
+    write_frames(engine, athlete_df, events_df, results_df)
+    prog_ids = results_df["prog_id"].dropna().unique() if not results_df.empty else []
+    with stage("athlete_ingest_metrics") as st:
+        st.rows = update_race_metrics(prog_ids, engine)
+    update_head_to_head(engine, prog_ids=prog_ids)
+
+    summary = {
+        "athlete_id": athlete_id,
+        "full_name": full_name,
+        "races": len(history),
+        "new_programs": len(pairs),
+        "result_rows": len(results_df),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    print(f"Added '{full_name}' (ID: {athlete_id}): {summary['races']} races, "
+          f"{summary['new_programs']} new programs, {summary['result_rows']} result rows "
+          f"in {summary['seconds']}s.")
+    return summary
+
+if __name__ == "__main__":
+    import sys
+    ingest_athlete(" ".join(sys.argv[1:]))
@@ -1,22 +1,144 @@
 import logging
-from typing import Optional
+import threading
+import time
+import unicodedata
+from typing import Iterable, Optional
+import pandas as pd
 from sqlalchemy import text
-from Data_Import.database import get_engine
+from database import get_engine
 
 logger = logging.getLogger(__name__)
 
+# Letters that NFKD does not decompose into an ASCII base letter
+_FOLD = str.maketrans({'ø': 'o', 'ß': 'ss', 'æ': 'ae', 'œ': 'oe', 'đ': 'd', 'ł': 'l', 'ı': 'i', 'þ': 'th'})
+
+def normalize_name(name) -> Optional[str]:
+    """
+    Normalize an athlete name for matching: lowercase, accents stripped, punctuation and
+    repeated whitespace collapsed, and tokens sorted so "Yee Alex" matches "Alex Yee".
+    """
+    if name is None or name != name:
+        return None
+    folded = unicodedata.normalize('NFKD', str(name).lower().translate(_FOLD))
+    ascii_name = ''.join(c if c.isalnum() else ' ' for c in folded if not unicodedata.combining(c))
+    tokens = sorted(ascii_name.split())
+    return ' '.join(tokens) or None
+
+def normalize_names(names: pd.Series) -> pd.Series:
+    """Vectorized normalize_name: each distinct name is normalized once and broadcast back."""
+    codes, uniques = pd.factorize(names, use_na_sentinel=True)
+    keys = pd.Series([normalize_name(n) for n in uniques], dtype=object)
+    out = keys.reindex(codes).to_numpy()
+    return pd.Series(out, index=names.index, dtype=object)
+
+class AthleteNameIndex:
+    """
+    In-memory map from athlete names to athlete_id, loaded from the athlete table in one query.
+
+    Exact full_name matches win; otherwise the normalized name is used when it identifies a
+    single athlete (normalized names shared by several athletes are left unmatched). The index
+    reloads itself when the table's (row count, max athlete_id) signature changes, checked at
+    most every `check_interval` seconds.
+    """
+
+    def __init__(self, engine=None, check_interval: float = 30.0):
+        self.engine = engine or get_engine()
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+        self._exact = pd.Series(dtype='Int64')
+        self._normalized = pd.Series(dtype='Int64')
+        self._ambiguous = set()
+
+    def _fetch_signature(self, conn):
+        return tuple(conn.execute(text("SELECT COUNT(*), MAX(athlete_id) FROM athlete")).one())
+
+    def load(self):
+        """(Re)build the index from the athlete table."""
+        with self.engine.connect() as conn:
+            signature = self._fetch_signature(conn)
+            athletes = pd.read_sql(
+                text("SELECT athlete_id, full_name FROM athlete WHERE full_name IS NOT NULL ORDER BY athlete_id"),
+                conn
+            )
+        self._build(athletes)
+        self._signature = signature
+        self._checked_at = time.monotonic()
+        logger.info(f"Loaded athlete name index ({len(athletes)} athletes)")
+
+    def _build(self, athletes: pd.DataFrame):
+        ids = athletes['athlete_id'].astype('Int64')
+        exact = pd.Series(ids.to_numpy(), index=athletes['full_name'].to_numpy())
+        self._exact = exact[~exact.index.duplicated(keep='first')]
+
+        keys = normalize_names(athletes['full_name'])
+        normalized = pd.Series(ids.to_numpy(), index=keys.to_numpy())
+        normalized = normalized[normalized.index.notna()]
+        shared = normalized.index.duplicated(keep=False)
+        self._ambiguous = set(normalized.index[shared])
+        self._normalized = normalized[~shared]
+
+    def refresh(self, force: bool = False):
+        """Reload if the athlete table changed since the last load."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._signature is not None and now - self._checked_at < self.check_interval:
+                return
+            with self.engine.connect() as conn:
+                signature = self._fetch_signature(conn)
+            self._checked_at = now
+            if force or signature != self._signature:
+                self.load()
+
+    def add(self, athlete_id: int, full_name: str):
+        """Register an athlete inserted by the caller, without reloading the whole table."""
+        with self._lock:
+            if full_name not in self._exact.index:
+                self._exact.loc[full_name] = athlete_id
+            key = normalize_name(full_name)
+            if key is None or key in self._ambiguous:
+                return
+            if key in self._normalized.index and self._normalized.loc[key] != athlete_id:
+                self._ambiguous.add(key)
+                self._normalized = self._normalized.drop(key)
+            else:
+                self._normalized.loc[key] = athlete_id
+
+    def match_many(self, names: Iterable[str]) -> pd.Series:
+        """
+        Match many names at once. Returns a nullable Int64 Series of athlete_ids aligned with
+        `names` (positional index when a plain iterable is passed), <NA> where nothing matched.
+        """
+        self.refresh()
+        names = names if isinstance(names, pd.Series) else pd.Series(list(names), dtype=object)
+        ids = names.map(self._exact).astype('Int64')
+        missing = ids.isna()
+        if missing.any():
+            ids[missing] = normalize_names(names[missing]).map(self._normalized).astype('Int64')
+        return ids
+
+    def match(self, name: str) -> Optional[int]:
+        aid = self.match_many([name]).iloc[0]
+        return None if pd.isna(aid) else int(aid)
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_name_index() -> AthleteNameIndex:
+    """Process-wide athlete name index, built on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = AthleteNameIndex()
+        return _index
+
 def match_athlete_id(athlete_name: str) -> Optional[int]:
     """
     Match the given athlete_name to an existing athlete_id in the athlete table.
     Returns the athlete_id if found, otherwise None.
     """
-    engine = get_engine()
-    query = text("SELECT athlete_id FROM athlete WHERE full_name = :name")
-    with engine.connect() as conn:
-        result = conn.execute(query, {"name": athlete_name}).fetchone()
-        if result:
-            return result[0]
-        else:
-            logger.warning(f"No athlete_id found for name '{athlete_name}'")
-            return None
-
+    aid = get_name_index().match(athlete_name)
+    if aid is None:
+        logger.warning(f"No athlete_id found for name '{athlete_name}'")
+    return aid
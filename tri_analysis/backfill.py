@@ -0,0 +1,155 @@
+"""
+Year-sharded backfill of the full event history.
+
+The date range is split into one shard per season (calendar year). Shards run in a pool of
+worker processes that share one API budget (a SharedRateLimiter installed in api_handling).
+Each shard runs the build_database fetch and upsert steps for its season's programs and
+results, so a failed or repeated shard can simply be re-run. Athletes appear in many seasons,
+so shards only return the athlete ids they saw. The coordinator fetches each profile once after
+the pool finishes and upserts all of them in one athlete_id-ordered statement. That way no
+concurrent shards upsert overlapping athlete rows (which can deadlock on PostgreSQL). The
+coordinator prints progress as shards finish and writes one merged JSON report. Pace metrics
+and head-to-head pairs are derived once at the end.
+"""
+import concurrent.futures
+import datetime
+import json
+import os
+import time
+
+import pandas as pd
+
+from config import API_RATE_LIMIT, BACKFILL_START_YEAR, RUN_REPORT_DIR
+from database import get_engine, initialize_database
+from tri_analysis.api_handling import api_run, set_rate_limiter
+from tri_analysis.build_database import fetch_programs, fetch_athletes, write_frames
+from tri_analysis.instrumentation import METRICS, _atomic_write
+from tri_analysis.head_to_head import update_head_to_head
+from tri_analysis.pace import update_pace_metrics
+from tri_analysis.throttle import SharedRateLimiter
+from tri_analysis.upsert_tables import upsert_athlete
+
+def season_shards(start_year: int = BACKFILL_START_YEAR, end_year: int = None, today: datetime.date = None) -> list:
+    """(label, start_date, end_date) per calendar year; the current season ends today."""
+    today = today or datetime.date.today()
+    end_year = end_year or today.year
+    shards = []
+    for year in range(start_year, end_year + 1):
+        start = datetime.date(year, 1, 1)
+        end = min(datetime.date(year, 12, 31), today)
+        if start <= end:
+            shards.append((str(year), start.isoformat(), end.isoformat()))
+    return shards
+
+def _init_worker(limiter):
+    set_rate_limiter(limiter)
+
+def run_shard(shard) -> dict:
+    """
+    Fetch and upsert one season's programs and results (runs in a worker process). The athlete
+    and program ids written are returned in "athlete_ids" and "prog_ids" for the coordinator.
+    Errors are reported, not raised.
+    """
+    label, start, end = shard
+    METRICS.reset()
+    started = time.perf_counter()
+    result = {"shard": label, "start": start, "end": end, "programs": 0, "results": 0, "athletes": 0,
+              "athlete_ids": [], "prog_ids": [], "error": None}
+    try:
+        with api_run():
+            engine = get_engine()
+            event_df, results_df = fetch_programs(start, end)
+            athlete_ids = results_df["athlete_id"].dropna().unique().tolist() if not results_df.empty else []
+            write_frames(engine, pd.DataFrame(), event_df, results_df)
+            prog_ids = results_df["prog_id"].dropna().unique().tolist() if not results_df.empty else []
+            result.update(programs=len(event_df), results=len(results_df), athletes=len(athlete_ids),
+                          athlete_ids=[int(a) for a in athlete_ids], prog_ids=[int(p) for p in prog_ids])
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - started, 1)
+    result["endpoints"] = METRICS.report(f"backfill_{label}")["endpoints"]
+    return result
+
+def merge_reports(shards: list) -> dict:
+    """Combine per-shard results into totals and per-endpoint request counts."""
+    endpoints = {}
+    for shard in shards:
+        for name, ep in shard.get("endpoints", {}).items():
+            merged = endpoints.setdefault(name, {"count": 0, "total_s": 0.0, "errors": 0, "retries": 0, "max_s": 0.0})
+            merged["count"] += ep["count"]
+            merged["total_s"] = round(merged["total_s"] + ep["total_s"], 4)
+            merged["errors"] += ep["errors"]
+            merged["retries"] += ep["retries"]
+            merged["max_s"] = max(merged["max_s"], ep["max_s"])
+    for ep in endpoints.values():
+        ep["mean_s"] = round(ep["total_s"] / ep["count"], 4) if ep["count"] else 0.0
+    return {
+        "totals": {key: sum(s[key] for s in shards) for key in ("programs", "results", "athletes")},
+        "failed": sorted(s["shard"] for s in shards if s["error"]),
+        "endpoints": endpoints,
+        "shards": sorted(shards, key=lambda s: s["shard"]),
+    }
+
+def backfill(start_year: int = BACKFILL_START_YEAR, end_year: int = None, workers: int = None,
+             rate: float = API_RATE_LIMIT, directory: str = RUN_REPORT_DIR) -> dict:
+    """
+    Backfill every season from start_year to end_year with one worker process per shard
+    (up to `workers`, default all cores) and `rate` API requests/second in total.
+    Returns the merged report, which is also written to <directory>/backfill_<stamp>.json.
+    """
+    shards = season_shards(start_year, end_year)
+    workers = min(workers or os.cpu_count() or 1, len(shards)) or 1
+    started_at = datetime.datetime.now()
+    started = time.perf_counter()
+    initialize_database()
+    print(f"Backfilling {len(shards)} seasons with {workers} workers at {rate:g} requests/s...")
+
+    limiter = SharedRateLimiter(rate, burst=max(1, int(rate)))
+    results = []
+    athlete_ids, prog_ids = set(), set()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                initargs=(limiter,)) as executor:
+        futures = [executor.submit(run_shard, shard) for shard in shards]
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            shard = future.result()
+            athlete_ids.update(shard.pop("athlete_ids"))
+            prog_ids.update(shard.pop("prog_ids"))
+            results.append(shard)
+            status = f"FAILED ({shard['error']})" if shard["error"] else (
+                f"{shard['programs']} programs, {shard['results']} results, {shard['athletes']} athletes")
+            print(f"[{done}/{len(shards)}] {shard['shard']}: {status} in {shard['seconds']}s")
+
+    engine = get_engine()
+    set_rate_limiter(limiter)
+    try:
+        with api_run():
+            athletes_df = fetch_athletes(sorted(athlete_ids), engine)
+    finally:
+        set_rate_limiter(None)
+    if not athletes_df.empty:
+        upsert_athlete(athletes_df.sort_values("athlete_id"), engine)
+    print(f"Upserted {len(athletes_df)} of {len(athlete_ids)} athletes seen across all seasons.")
+
+    update_pace_metrics(engine, prog_ids=prog_ids)
+    update_head_to_head(engine, full=True)
+
+    report = {"run": "backfill", "started_at": started_at.isoformat(timespec="seconds"),
+              "wall_s": round(time.perf_counter() - started, 1), "workers": workers, "rate": rate,
+              "athletes_seen": len(athlete_ids), "athletes_fetched": len(athletes_df),
+              **merge_reports(results)}
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"backfill_{started_at:%Y%m%dT%H%M%S}.json")
+    _atomic_write(path, json.dumps(report, indent=2))
+    print(f"Backfill finished in {report['wall_s']}s: {report['totals']}; "
+          f"failed shards: {report['failed'] or 'none'}. Report written to {path}")
+    return report
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Backfill event history in parallel season shards.")
+    parser.add_argument("--start-year", type=int, default=BACKFILL_START_YEAR)
+    parser.add_argument("--end-year", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--rate", type=float, default=API_RATE_LIMIT, help="API requests/second across all workers")
+    args = parser.parse_args()
+    backfill(args.start_year, args.end_year, args.workers, args.rate)
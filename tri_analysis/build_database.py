@@ -7,7 +7,10 @@ import pandas as pd
 from dotenv import load_dotenv
 from sqlalchemy import text
 from database import get_engine, initialize_database
-from config import ATHLETE_TABLE_NAME, RACE_RESULTS_TABLE_NAME, EVENTS_TABLE_NAME, RANKINGS_RESULTS_TABLE_NAME, METRICS_TABLE_NAME
+from config import (
+    ATHLETE_TABLE_NAME, RACE_RESULTS_TABLE_NAME, EVENTS_TABLE_NAME, RANKINGS_RESULTS_TABLE_NAME, METRICS_TABLE_NAME,
+    EVENT_TABLE_NAME, ATHLETE_REFRESH_TTL_DAYS, IMPORT_START_DATE, IMPORT_END_DATE,
+)
 from tri_analysis.api_handling import (
     fetch_athlete_id_search,
     fetch_athlete_id_ranking,
@@ -17,8 +20,13 @@ from tri_analysis.api_handling import (
     fetch_program_ids,
     process_program_data,
     fetch_and_process_program_results,
+    api_run,
 )
 from tri_analysis.upsert_tables import upsert_athlete, upsert_events, upsert_race_results
+from tri_analysis.dtypes import apply_dtypes
+from tri_analysis.pace import update_pace_metrics
+from tri_analysis.head_to_head import update_head_to_head
+from tri_analysis.instrumentation import export_run_report
 load_dotenv()
 
 def is_valid_df(df):
@@ -39,101 +47,167 @@ def fetch_and_validate_athlete_info(athlete_id):
         return None
 
 
-# Get database engine, drop existing tables, and initialize the database
-engine = get_engine()
-with engine.begin() as conn:
-    #conn.execute(text(f'DROP TABLE IF EXISTS "{RACE_RESULTS_TABLE_NAME}" CASCADE'))
-    #conn.execute(text(f'DROP TABLE IF EXISTS "{ATHLETE_TABLE_NAME}" CASCADE'))
-    #conn.execute(text(f'DROP TABLE IF EXISTS "{EVENTS_TABLE_NAME}" CASCADE'))
-    #conn.execute(text(f'DROP TABLE IF EXISTS "{RANKINGS_RESULTS_TABLE_NAME}" CASCADE'))
-    conn.execute(text(f'DROP TABLE IF EXISTS "{METRICS_TABLE_NAME}" CASCADE'))
-    print("Dropped existing tables")
-initialize_database()
-
-    
-start_date = datetime.date(2022, 1, 1).strftime("%Y-%m-%d")
-end_date = datetime.date(2022, 12, 31).strftime("%Y-%m-%d")
-
-# Initialize as an empty list to collect DataFrames from each process_program_data call
-event_df = []
-race_results_df = []
-athletes_df = []
-
-
-print("Fetching event IDs...")    # Fetch event IDs since the specified start date
-events_id = fetch_events_ids(start_date=start_date, end_date=end_date)  
-print(f"Found {len(events_id)} events from {start_date} to {end_date}.")
-
-print("Fetching program IDs for each event concurrently...")
-with concurrent.futures.ThreadPoolExecutor(max_workers=500) as executor:
-    program_id_lists = list(executor.map(fetch_program_ids, events_id))
-
-# Flatten the list of lists and keep track of (event_id, program_id) pairs
-event_program_pairs = [
-    (event_id, prog_id)
-    for event_id, prog_ids in zip(events_id, program_id_lists)
-    for prog_id in prog_ids
-]
-
-print("Processing program data and race results concurrently...") # Process each event
-with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-    for event_data, result_data in executor.map(process_pair, event_program_pairs):
-        if is_valid_df(event_data):
-            event_df.append(event_data)
-        if is_valid_df(result_data):
-            race_results_df.append(result_data)
-
-event_df = pd.concat(event_df, ignore_index=True) if event_df else pd.DataFrame()
-race_results_df = pd.concat(race_results_df, ignore_index=True) if race_results_df else pd.DataFrame()
-print(f"Processed {len(event_df)} programs and {len(race_results_df)} race results.")
-
-race_results_df = race_results_df.drop_duplicates(subset=["athlete_id", "prog_id", "total_time"]).copy()
-
-
-print("Fetching athlete information concurrently...")
-unique_athlete_ids = race_results_df["athlete_id"].dropna().unique().tolist()
-athletes_df_list = []
-with concurrent.futures.ThreadPoolExecutor(max_workers=100) as executor:
-    for df in executor.map(fetch_and_validate_athlete_info, unique_athlete_ids):
-        if df is not None:
-            athletes_df_list.append(df)
-athletes_df = pd.concat(athletes_df_list, ignore_index=True) if athletes_df_list else pd.DataFrame()
-
-# Remove rows with null athlete_id before writing to race_results
-race_results_df = race_results_df.dropna(subset=["athlete_id"])
-
-# Remove rows with null total_time before writing to race_results
-before = len(race_results_df)
-race_results_df = race_results_df.dropna(subset=["total_time"])
-after = len(race_results_df)
-if before != after:
-    print(f"Warning: Dropped {before - after} rows from race_results_df due to null total_time.")
-
-# Write DataFrames to database
-print("Writing DataFrames to database...")
-
-# Write athletes_df
-if not athletes_df.empty:
-    upsert_athlete(athletes_df, engine)
-    print(f"Wrote {len(athletes_df)} rows to {ATHLETE_TABLE_NAME}")
-
-# Write event_df
-if not event_df.empty:
-    event_df.columns = [c.lower() for c in event_df.columns]
-    # Replace empty strings with None in numeric columns
-    numeric_cols = [
-        "prog_id", "event_id", "swim_laps", "swim_distance", "bike_laps", "bike_distance",
-        "run_laps", "run_distance", "event_latitude", "event_longitude",
-        "temperature_water", "temperature_air", "humidity", "wbgt", "wind"
+DEFAULT_START_DATE = datetime.date.fromisoformat(IMPORT_START_DATE)
+DEFAULT_END_DATE = datetime.date.fromisoformat(IMPORT_END_DATE)
+
+def reset_tables(engine):
+    """Drop the derived tables and (re)create the schema."""
+    with engine.begin() as conn:
+        #conn.execute(text(f'DROP TABLE IF EXISTS "{RACE_RESULTS_TABLE_NAME}" CASCADE'))
+        #conn.execute(text(f'DROP TABLE IF EXISTS "{ATHLETE_TABLE_NAME}" CASCADE'))
+        #conn.execute(text(f'DROP TABLE IF EXISTS "{EVENTS_TABLE_NAME}" CASCADE'))
+        #conn.execute(text(f'DROP TABLE IF EXISTS "{RANKINGS_RESULTS_TABLE_NAME}" CASCADE'))
+        conn.execute(text(f'DROP TABLE IF EXISTS "{METRICS_TABLE_NAME}" CASCADE'))
+        print("Dropped existing tables")
+    initialize_database()
+
+def fetch_programs(start_date, end_date):
+    """Fetch every program and its results for events between start_date and end_date."""
+    event_df = []
+    race_results_df = []
+
+    print("Fetching event IDs...")    # Fetch event IDs since the specified start date
+    events_id = fetch_events_ids(start_date=start_date, end_date=end_date)
+    print(f"Found {len(events_id)} events from {start_date} to {end_date}.")
+
+    print("Fetching program IDs for each event concurrently...")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=500) as executor:
+        program_id_lists = list(executor.map(fetch_program_ids, events_id))
+
+    # Flatten the list of lists and keep track of (event_id, program_id) pairs
+    event_program_pairs = [
+        (event_id, prog_id)
+        for event_id, prog_ids in zip(events_id, program_id_lists)
+        for prog_id in prog_ids
     ]
-    for col in numeric_cols:
-        if col in event_df.columns:
-            event_df[col] = event_df[col].replace("", None)
-    upsert_events(event_df, engine)
-    print(f"Wrote {len(event_df)} rows to {EVENTS_TABLE_NAME}")
-
-# Write race_results_df
-if not race_results_df.empty:
-    race_results_df.columns = [c.lower() for c in race_results_df.columns]
-    upsert_race_results(race_results_df, engine)
-    print(f"Wrote {len(race_results_df)} rows to {RACE_RESULTS_TABLE_NAME}")
\ No newline at end of file
+
+    print("Processing program data and race results concurrently...") # Process each event
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        for event_data, result_data in executor.map(process_pair, event_program_pairs):
+            if is_valid_df(event_data):
+                event_df.append(event_data)
+            if is_valid_df(result_data):
+                race_results_df.append(result_data)
+
+    event_df = pd.concat(event_df, ignore_index=True) if event_df else pd.DataFrame()
+    race_results_df = pd.concat(race_results_df, ignore_index=True) if race_results_df else pd.DataFrame()
+    print(f"Processed {len(event_df)} programs and {len(race_results_df)} race results.")
+
+    if not race_results_df.empty:
+        race_results_df = race_results_df.drop_duplicates(subset=["athlete_id", "prog_id", "total_time"]).copy()
+    return event_df, race_results_df
+
+def athletes_to_fetch(athlete_ids, engine, ttl_days=ATHLETE_REFRESH_TTL_DAYS):
+    """
+    The subset of athlete_ids that are not in the athlete table or were last fetched more than
+    ttl_days ago. One query reads the ids fetched within the TTL; the diff is done in memory.
+    """
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=ttl_days)
+    with engine.connect() as conn:
+        fresh = conn.execute(
+            text(f'SELECT athlete_id FROM "{ATHLETE_TABLE_NAME}" WHERE last_fetched_at >= :cutoff'),
+            {"cutoff": cutoff},
+        ).scalars().all()
+    requested = pd.Index(pd.unique(pd.Series(athlete_ids, dtype="Int64").dropna()))
+    return requested.difference(pd.Index(fresh, dtype="Int64")).astype("int64").tolist()
+
+def fetch_athletes(athlete_ids, engine=None, ttl_days=ATHLETE_REFRESH_TTL_DAYS):
+    """
+    Fetch athlete profiles concurrently; athletes that fail or come back empty are skipped.
+    With an engine, athletes fetched within ttl_days are skipped too.
+    """
+    if engine is not None:
+        requested = len(athlete_ids)
+        athlete_ids = athletes_to_fetch(athlete_ids, engine, ttl_days)
+        print(f"{requested - len(athlete_ids)} of {requested} athletes are fresh (TTL {ttl_days} days).")
+    print(f"Fetching information for {len(athlete_ids)} athletes concurrently...")
+    athletes_df_list = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=100) as executor:
+        for df in executor.map(fetch_and_validate_athlete_info, athlete_ids):
+            if df is not None:
+                athletes_df_list.append(df)
+    athletes_df = pd.concat(athletes_df_list, ignore_index=True) if athletes_df_list else pd.DataFrame()
+    return apply_dtypes(athletes_df, "athlete")
+
+def write_frames(engine, athletes_df, event_df, race_results_df):
+    """Clean and upsert the athlete, events and race_results frames."""
+    if not race_results_df.empty:
+        # Remove rows with null athlete_id before writing to race_results
+        race_results_df = race_results_df.dropna(subset=["athlete_id"])
+
+        # Remove rows with null total_time before writing to race_results
+        before = len(race_results_df)
+        race_results_df = race_results_df.dropna(subset=["total_time"])
+        after = len(race_results_df)
+        if before != after:
+            print(f"Warning: Dropped {before - after} rows from race_results_df due to null total_time.")
+
+    # Write DataFrames to database
+    print("Writing DataFrames to database...")
+
+    # Write athletes_df, in key order so concurrent writers lock rows in the same order
+    if not athletes_df.empty:
+        upsert_athlete(athletes_df.sort_values("athlete_id"), engine)
+        print(f"Wrote {len(athletes_df)} rows to {ATHLETE_TABLE_NAME}")
+
+    # Write event_df
+    if not event_df.empty:
+        event_df.columns = [c.lower() for c in event_df.columns]
+        # Replace empty strings with None in numeric columns
+        numeric_cols = [
+            "prog_id", "event_id", "swim_laps", "swim_distance", "bike_laps", "bike_distance",
+            "run_laps", "run_distance", "event_latitude", "event_longitude",
+            "temperature_water", "temperature_air", "humidity", "wbgt", "wind"
+        ]
+        for col in numeric_cols:
+            if col in event_df.columns:
+                event_df[col] = event_df[col].replace("", None)
+        event_df = apply_dtypes(event_df, "events")
+        upsert_events(event_df, engine)
+        print(f"Wrote {event_df['event_id'].nunique()} events and {len(event_df)} programs")
+
+    # Write race_results_df
+    if not race_results_df.empty:
+        race_results_df.columns = [c.lower() for c in race_results_df.columns]
+        race_results_df = apply_dtypes(race_results_df, "race_results")
+        upsert_race_results(race_results_df, engine)
+        print(f"Wrote {len(race_results_df)} rows to {RACE_RESULTS_TABLE_NAME}")
+
+def build_database(start_date=DEFAULT_START_DATE, end_date=DEFAULT_END_DATE, engine=None, reset=True):
+    """
+    Import events, programs, race results and athletes between start_date and end_date.
+    With reset=True the derived tables are dropped and the schema recreated first.
+    """
+    engine = engine or get_engine()
+    if reset:
+        reset_tables(engine)
+    else:
+        initialize_database()
+
+    with api_run():
+        event_df, race_results_df = fetch_programs(str(start_date), str(end_date))
+        athlete_ids = race_results_df["athlete_id"].dropna().unique().tolist() if not race_results_df.empty else []
+        athletes_df = fetch_athletes(athlete_ids, engine)
+    write_frames(engine, athletes_df, event_df, race_results_df)
+
+    # Derive paces and head-to-head pairs for the programs that just landed. Programs already
+    # counted are re-counted, since their results may have changed; a reset rebuilds everything.
+    prog_ids = race_results_df["prog_id"].dropna().unique() if not race_results_df.empty else []
+    update_pace_metrics(engine, full=reset, prog_ids=prog_ids)
+    update_head_to_head(engine, full=reset, prog_ids=prog_ids)
+
+def sync(engine=None, since=None):
+    """
+    Import events from `since` (default: the latest event_date already stored) up to today,
+    without dropping anything.
+    """
+    engine = engine or get_engine()
+    if since is None:
+        with engine.connect() as conn:
+            since = conn.execute(text(f'SELECT MAX(event_date) FROM "{EVENT_TABLE_NAME}"')).scalar()
+    since = since or DEFAULT_START_DATE
+    build_database(start_date=since, end_date=datetime.date.today(), engine=engine, reset=False)
+
+if __name__ == "__main__":
+    build_database()
+    export_run_report("build_database")
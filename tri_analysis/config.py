@@ -15,6 +15,9 @@ ATHLETE_DATA_URL     = f"{BASE_URL}/athletes/{{athlete_id}}?ouput=basic"
 
 # Ranking endpoint
 RANKING_URL          = f"{BASE_URL}/rankings/{{ranking_id}}?limit={NUMBER_OF_ATHLETES}"
+# Live ranking categories imported by ranking_import, and athletes requested per page
+RANKING_CATEGORY_IDS = [13, 14, 15, 16]
+RANKING_PAGE_SIZE    = 200
 
 # Event & Program endpoints
 EVENT_LISTING_URL  = f"{BASE_URL}/events"    
@@ -31,11 +34,50 @@ DB_URI = os.environ.get(
 
 # Table name overrides (via env vars for testing)
 ATHLETE_TABLE_NAME       = os.getenv('ATHLETE_TABLE_NAME', 'athlete')
-EVENTS_TABLE_NAME        = os.getenv('EVENTS_TABLE_NAME', 'events')
+EVENTS_TABLE_NAME        = os.getenv('EVENTS_TABLE_NAME', 'events')   # compatibility view over event + program
+EVENT_TABLE_NAME         = os.getenv('EVENT_TABLE_NAME', 'event')
+PROGRAM_TABLE_NAME       = os.getenv('PROGRAM_TABLE_NAME', 'program')
 RACE_RESULTS_TABLE_NAME  = os.getenv('RACE_RESULTS_TABLE_NAME', 'race_results')
 RANKINGS_RESULTS_TABLE_NAME  = os.getenv('RANKINGS_RESULTS_TABLE_NAME', 'rankings')
 METRICS_TABLE_NAME        = os.getenv('METRICS_TABLE_NAME', 'metrics')
 
+# Athlete profiles fetched more recently than this are not re-fetched by imports
+ATHLETE_REFRESH_TTL_DAYS = int(os.getenv('ATHLETE_REFRESH_TTL_DAYS', '30'))
+
+# In-process result cache of the read-side queries (queries.py): entries and seconds to live
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '256'))
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', '300'))
+
 # ID for filtering events
 CATEGORY_IDS = "340|341|342|623|343|352|347|640|624|351|348|349" #Add Para afterwards
-SPEC_IDS = "356|357"
\ No newline at end of file
+SPEC_IDS = "356|357"
+
+# Default event date window of a full import (build_database.py, main.py full-import)
+IMPORT_START_DATE = os.getenv("IMPORT_START_DATE", "2022-01-01")
+IMPORT_END_DATE = os.getenv("IMPORT_END_DATE", "2022-12-31")
+# Year-sharded backfill (backfill.py): first season and total API requests/second across all workers
+BACKFILL_START_YEAR = int(os.getenv("BACKFILL_START_YEAR", "2009"))
+API_RATE_LIMIT = float(os.getenv("API_RATE_LIMIT", "20"))
+# Local archive of fetched historical ranking pages
+RANKINGS_ARCHIVE_DIR = os.getenv(
+    "RANKINGS_ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "rankings_archive")
+)
+
+# Run reports (JSON per run) and Prometheus textfiles written by instrumentation.export_run_report
+RUN_REPORT_DIR = os.getenv(
+    "RUN_REPORT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "run_reports")
+)
+
+# Run directories written by profiling.profile_stage (--profile)
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "profiles")
+)
+
+# Sparse athlete x athlete win/margin matrices maintained by head_to_head.update_head_to_head
+HEAD_TO_HEAD_PATH = os.getenv(
+    "HEAD_TO_HEAD_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "head_to_head.npz")
+)
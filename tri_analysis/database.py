@@ -9,13 +9,15 @@ if project_root not in sys.path:
 from config import (
     ATHLETE_TABLE_NAME,
     EVENTS_TABLE_NAME,
+    EVENT_TABLE_NAME,
+    PROGRAM_TABLE_NAME,
     RACE_RESULTS_TABLE_NAME,
     DB_URI as DEFAULT_DB_URI 
 )
 
 from sqlalchemy import (
     create_engine, MetaData, Table, Column,
-    Integer, String, Date, Boolean, PrimaryKeyConstraint, Float, BigInteger, text
+    Integer, String, Date, DateTime, Boolean, PrimaryKeyConstraint, ForeignKey, Float, BigInteger, text, inspect
 )
 
 def create_test_tables():
@@ -58,15 +60,106 @@ def get_engine(echo: bool = False):
     uri = os.environ.get('DB_URI', DEFAULT_DB_URI)
     return create_engine(uri, echo=echo)
 
+def add_missing_columns(engine, metadata, table_names):
+    """Add columns defined in metadata but missing from existing tables (create_all skips existing tables)."""
+    existing = inspect(engine)
+    with engine.begin() as conn:
+        for name in table_names:
+            present = {c['name'] for c in existing.get_columns(name)}
+            for column in metadata.tables[name].columns:
+                if column.name not in present:
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE "{name}" ADD COLUMN "{column.name}" {col_type}'))
+                    print(f"Added column {name}.{column.name}")
+
+# Columns of the `events` compatibility view, in the order of the old events table
+EVENTS_VIEW_COLUMNS = [
+    ('p', 'prog_id'), ('p', 'event_id'), ('p', 'prog_name'), ('p', 'prog_distance_category'),
+    ('p', 'swim_laps'), ('p', 'swim_distance'), ('p', 'bike_laps'), ('p', 'bike_distance'),
+    ('p', 'run_laps'), ('p', 'run_distance'),
+    ('e', 'event_name'), ('e', 'event_venue'), ('e', 'event_date'), ('e', 'event_country'),
+    ('e', 'event_latitude'), ('e', 'event_longitude'), ('e', 'cat_name'),
+    ('p', 'temperature_water'), ('p', 'temperature_air'), ('p', 'humidity'), ('p', 'wbgt'),
+    ('p', 'wind'), ('p', 'weather'), ('p', 'wetsuit'),
+]
+
+def create_events_view(engine):
+    """
+    Keep the old one-row-per-program `events` shape as a view over event and program (for Power BI
+    and existing queries). A legacy events table is migrated into the two dimensions first.
+    """
+    existing = inspect(engine)
+    legacy_table = EVENTS_TABLE_NAME in existing.get_table_names()
+    has_view = EVENTS_TABLE_NAME in existing.get_view_names()
+    legacy = {c['name'] for c in existing.get_columns(EVENTS_TABLE_NAME)} if legacy_table else set()
+    event_cols = [c for t, c in EVENTS_VIEW_COLUMNS if t == 'e' and c != 'event_id']
+    program_cols = [c for t, c in EVENTS_VIEW_COLUMNS if t == 'p']
+    with engine.begin() as conn:
+        if legacy_table:
+            # Event fields are repeated on every program row; keep one value per event
+            event_select = ", ".join(f"MAX({c})" if c in legacy else "NULL" for c in event_cols)
+            program_select = ", ".join(c if c in legacy else "NULL" for c in program_cols)
+            conn.execute(text(
+                f'INSERT INTO "{EVENT_TABLE_NAME}" (event_id, {", ".join(event_cols)}) '
+                f'SELECT event_id, {event_select} FROM "{EVENTS_TABLE_NAME}" GROUP BY event_id'
+            ))
+            conn.execute(text(
+                f'INSERT INTO "{PROGRAM_TABLE_NAME}" ({", ".join(program_cols)}) '
+                f'SELECT {program_select} FROM "{EVENTS_TABLE_NAME}"'
+            ))
+            conn.execute(text(f'DROP TABLE "{EVENTS_TABLE_NAME}"'))
+            print(f"Migrated table {EVENTS_TABLE_NAME} into {EVENT_TABLE_NAME} and {PROGRAM_TABLE_NAME}")
+        if not has_view:
+            select = ", ".join(f"{t}.{c}" for t, c in EVENTS_VIEW_COLUMNS)
+            conn.execute(text(
+                f'CREATE VIEW "{EVENTS_TABLE_NAME}" AS SELECT {select} '
+                f'FROM "{PROGRAM_TABLE_NAME}" p JOIN "{EVENT_TABLE_NAME}" e ON e.event_id = p.event_id'
+            ))
+
+# Secondary indexes behind the read-side queries (queries.py)
+QUERY_INDEXES = [
+    ("idx_race_results_prog", RACE_RESULTS_TABLE_NAME, "prog_id, athlete_id"),
+    ("idx_position_metrics_prog", "position_metrics", "prog_id, athlete_id"),
+    ("idx_pace_metrics_prog", "pace_metrics", "prog_id, athlete_id"),
+    ("idx_program_distance", PROGRAM_TABLE_NAME, "prog_distance_category"),
+    ("idx_event_date", EVENT_TABLE_NAME, "event_date"),
+]
+
+def create_query_indexes(engine):
+    """
+    Create the QUERY_INDEXES that are missing (tables rewritten with to_sql lose theirs) and
+    lower-case distance categories written before upserts normalized them.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            f'UPDATE "{PROGRAM_TABLE_NAME}" SET prog_distance_category = LOWER(TRIM(prog_distance_category)) '
+            f'WHERE prog_distance_category <> LOWER(TRIM(prog_distance_category))'
+        ))
+        for name, table, columns in QUERY_INDEXES:
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({columns})'))
+
 def initialize_database():
     engine = get_engine()
     metadata = MetaData()
 
-    # Event dimension table
+    # Event dimension table: one row per event
     Table(
-        EVENTS_TABLE_NAME, metadata,
+        EVENT_TABLE_NAME, metadata,
+        Column('event_id',          Integer, primary_key=True),
+        Column('event_name',        String),
+        Column('event_venue',       String),
+        Column('event_date',        Date),
+        Column('event_country',     String),
+        Column('event_latitude',    Float),
+        Column('event_longitude',   Float),
+        Column('cat_name',          String),
+    )
+
+    # Program dimension table: one row per race (program) of an event, with its distances and conditions
+    Table(
+        PROGRAM_TABLE_NAME, metadata,
         Column('prog_id',            Integer, primary_key=True),
-        Column('event_id',           Integer, primary_key=True),
+        Column('event_id',           Integer, ForeignKey(f'{EVENT_TABLE_NAME}.event_id'), primary_key=True),
         Column('prog_name',         String),
         Column('prog_distance_category',String),
         Column('swim_laps',         Integer),
@@ -75,13 +168,6 @@ def initialize_database():
         Column('bike_distance',     Float),
         Column('run_laps',          Integer),
         Column('run_distance',      Float),
-        Column('event_name',        String),
-        Column('event_venue',       String),
-        Column('event_date',        Date),
-        Column('event_country',     String),
-        Column('event_latitude',    Float),
-        Column('event_longitude',   Float),
-        Column('cat_name',          String),
         Column('temperature_water', Float),
         Column('temperature_air',   Float),
         Column('humidity',          Float),
@@ -89,7 +175,7 @@ def initialize_database():
         Column('wind',              Float),
         Column('weather',           String),
         Column('wetsuit',           String),
-        PrimaryKeyConstraint('event_id', 'prog_id', name='pk_events')
+        PrimaryKeyConstraint('event_id', 'prog_id', name='pk_program')
     )
 
     # Athlete dimension table
@@ -105,6 +191,9 @@ def initialize_database():
         Column('category_athlete',   Boolean),
         Column('category_medical',   Boolean),
         Column('category_paratriathlete', Boolean),
+        Column('noc',                String),   # three-letter country code, used to block fuzzy name matches
+        Column('yob',                Integer),  # year of birth
+        Column('last_fetched_at',    DateTime), # when the profile was last fetched from the API
     )
 
     # Race‐results fact table with composite PK (athlete_id, prog_id, total_time)
@@ -139,6 +228,16 @@ def initialize_database():
         PrimaryKeyConstraint('athlete_name','ranking_cat_name', 'year', 'retrieved_at', name='pk_athlete_rankings')
     )
 
+    # Live ranking snapshots imported from the API, by publish date (historical scrapes are not recorded)
+    Table(
+        'ranking_snapshots', metadata,
+        Column('ranking_cat_id',  Integer),
+        Column('published',       Date),
+        Column('athletes',        Integer),
+        Column('imported_at',     DateTime),
+        PrimaryKeyConstraint('ranking_cat_id', 'published', name='pk_ranking_snapshots')
+    )
+
     Table(
         'position_metrics', metadata,
         # keys
@@ -175,6 +274,58 @@ def initialize_database():
         Column('runrank',      Integer),
     )
        
+    # Packs at each checkpoint, derived from position_metrics elapsed times
+    Table(
+        'pack_metrics', metadata,
+        Column('athlete_id',        Integer),
+        Column('event_id',          Integer),
+        Column('prog_id',           Integer),
+        Column('checkpoint',        String),   # swim, t1, bike, t2, run
+        Column('pack_id',           Integer),  # 1 = front pack
+        Column('pack_size',         Integer),
+        Column('gap_to_pack_ahead', Integer),  # seconds, NULL for the front pack
+        PrimaryKeyConstraint('event_id', 'prog_id', 'checkpoint', 'athlete_id', name='pk_pack_metrics')
+    )
+
+    # Distance-normalized paces with within-race percentiles (1.0 = fastest)
+    Table(
+        'pace_metrics', metadata,
+        Column('athlete_id',        Integer),
+        Column('event_id',          Integer),
+        Column('prog_id',           Integer),
+        Column('swim_sec_per_100m', Float),
+        Column('bike_kmh',          Float),
+        Column('run_sec_per_km',    Float),
+        Column('swim_pct',          Float),
+        Column('bike_pct',          Float),
+        Column('run_pct',           Float),
+    )
+
+    # Split times flagged as impossible, mis-timed or swapped (rewritten by metrics.py)
+    Table(
+        'split_flags', metadata,
+        Column('athlete_id',  Integer),
+        Column('event_id',    Integer),
+        Column('prog_id',     Integer),
+        Column('segment',     String),   # swim, t1, bike, t2, run
+        Column('seconds',     Integer),
+        Column('flag',        String),   # impossible, outlier, swapped
+        Column('robust_z',    Float),
+    )
+
+    # Scraped names the fuzzy matcher could not decide on, with their best candidates
+    Table(
+        'athlete_match_review', metadata,
+        Column('athlete_name',   String),
+        Column('noc',            String),
+        Column('yob',            Integer),
+        Column('candidate_id',   Integer),
+        Column('candidate_name', String),
+        Column('score',          Float),    # char n-gram cosine similarity, 0-1
+        Column('created_at',     Date),
+        PrimaryKeyConstraint('athlete_name', 'candidate_id', name='pk_athlete_match_review')
+    )
+
     # Staging table for historical rankings (no constraints)
     Table(
         'staging_rankings', metadata,
@@ -185,10 +336,14 @@ def initialize_database():
         Column('rank_position',   Integer, nullable=False),
         Column('total_points',    Float,   nullable=False),
         Column('year',            Integer, nullable=False),  # year of the ranking
-        Column('retrieved_at',    Date,    nullable=False)
+        Column('retrieved_at',    Date,    nullable=False),
+        Column('noc',             String,  nullable=True),
+        Column('yob',             Integer, nullable=True)
     )
 
     metadata.create_all(engine)
+    add_missing_columns(engine, metadata, [ATHLETE_TABLE_NAME, 'staging_rankings'])
+    create_events_view(engine)
     # Ensure unique index for upsert ON CONFLICT target on race_results
     with engine.begin() as conn:
         conn.execute(
@@ -197,6 +352,7 @@ def initialize_database():
                 f'ON "{RACE_RESULTS_TABLE_NAME}" (athlete_id, "prog_id", "total_time")'
             )
         )
+    create_query_indexes(engine)
     print("Database tables and conflict index ensured.")
 
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+"""
+Dtype policy for the warehouse frames.
+
+Every frame that is fetched, read back or derived in metrics goes through apply_dtypes so the
+same column always has the same compact dtype: dictionary-encoded categoricals for low-cardinality
+text, pyarrow-backed strings for free text, and int32/int16 for ids, positions and ranks.
+Run this module directly to print a per-table memory profile of the live warehouse.
+"""
+import pandas as pd
+from database import get_engine
+
+try:
+    import pyarrow  # noqa: F401
+    STRING = "string[pyarrow]"
+except ImportError:  # pyarrow is optional; fall back to the pandas default
+    STRING = "object"
+
+CATEGORY = "category"
+
+# Integer columns are stored as numpy ints when they have no nulls and as the matching nullable
+# pandas type ("Int32", "Int16") otherwise.
+TABLE_DTYPES = {
+    "race_results": {
+        "event_id": "int32", "prog_id": "int32", "athlete_id": "int32",
+        "athlete_full_name": CATEGORY,
+        "swimtime": STRING, "t1time": STRING, "biketime": STRING, "t2time": STRING, "runtime": STRING,
+        "position": CATEGORY, "total_time": STRING, "start_num": CATEGORY,
+    },
+    "events": {
+        "prog_id": "int32", "event_id": "int32",
+        "prog_name": CATEGORY, "prog_distance_category": CATEGORY,
+        "swim_laps": "int16", "swim_distance": "float32",
+        "bike_laps": "int16", "bike_distance": "float32",
+        "run_laps": "int16", "run_distance": "float32",
+        "event_name": CATEGORY, "event_venue": CATEGORY, "event_country": CATEGORY,
+        "event_latitude": "float64", "event_longitude": "float64",
+        "cat_name": CATEGORY,
+        "temperature_water": "float32", "temperature_air": "float32", "humidity": "float32",
+        "wbgt": "float32", "wind": "float32",
+        "weather": CATEGORY, "wetsuit": CATEGORY,
+    },
+    "athlete": {
+        "athlete_id": "int32", "full_name": STRING, "gender": CATEGORY, "country": CATEGORY,
+        "age": "int16", "noc": CATEGORY, "yob": "int16",
+    },
+    "athlete_rankings": {
+        "athlete_id": "int32", "athlete_name": STRING, "ranking_cat_name": CATEGORY,
+        "ranking_cat_id": "int16", "rank_position": "int16", "total_points": "float32", "year": "int16",
+    },
+    "position_metrics": {
+        "athlete_id": "int32", "event_id": "int32", "prog_id": "int32",
+        **{f"elapsed{s}": "int32" for s in ("swim", "t1", "bike", "t2", "run")},
+        **{f"behind{s}": "int32" for s in ("swim", "t1", "bike", "t2", "run")},
+        **{f"position_at_{s}": "int16" for s in ("swim", "t1", "bike", "t2", "run")},
+        **{c: "int16" for c in ("swim_to_t1_pos_change", "t1_to_bike_pos_change",
+                                "bike_to_t2_pos_change", "t2_to_run_pos_change")},
+        **{f"{s}rank": "int16" for s in ("swim", "t1", "bike", "t2", "run")},
+    },
+}
+# event and program are the two halves of the events view
+TABLE_DTYPES["event"] = {c: TABLE_DTYPES["events"][c] for c in (
+    "event_id", "event_name", "event_venue", "event_country", "event_latitude", "event_longitude", "cat_name")}
+TABLE_DTYPES["program"] = {c: t for c, t in TABLE_DTYPES["events"].items() if c not in TABLE_DTYPES["event"] or c == "event_id"}
+TABLE_DTYPES["staging_rankings"] = {**TABLE_DTYPES["athlete_rankings"], "noc": CATEGORY, "yob": "int16"}
+TABLE_DTYPES["ranking_snapshots"] = {"ranking_cat_id": "int16", "athletes": "int32"}
+TABLE_DTYPES["athlete_match_review"] = {
+    "athlete_name": STRING, "noc": CATEGORY, "yob": "int16", "candidate_id": "int32",
+    "candidate_name": STRING, "score": "float32",
+}
+TABLE_DTYPES["pack_metrics"] = {
+    "athlete_id": "int32", "event_id": "int32", "prog_id": "int32", "checkpoint": CATEGORY,
+    "pack_id": "int16", "pack_size": "int16", "gap_to_pack_ahead": "int32",
+}
+TABLE_DTYPES["pace_metrics"] = {
+    "athlete_id": "int32", "event_id": "int32", "prog_id": "int32",
+    **{c: "float32" for c in ("swim_sec_per_100m", "bike_kmh", "run_sec_per_km", "swim_pct", "bike_pct", "run_pct")},
+}
+TABLE_DTYPES["split_flags"] = {
+    "athlete_id": "int32", "event_id": "int32", "prog_id": "int32", "segment": CATEGORY,
+    "seconds": "int32", "flag": CATEGORY, "robust_z": "float32",
+}
+
+def _cast(series: pd.Series, dtype: str) -> pd.Series:
+    if dtype in ("int32", "int16"):
+        values = pd.to_numeric(series, errors="coerce")
+        if values.isna().any():
+            return values.astype(dtype.capitalize())
+        return values.astype(dtype)
+    if dtype.startswith("float"):
+        return pd.to_numeric(series, errors="coerce").astype(dtype)
+    if dtype == CATEGORY:
+        # Empty strings are missing values, not a category of their own
+        return series.replace("", None).astype(CATEGORY)
+    return series.astype(dtype)
+
+def apply_dtypes(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """
+    Cast the columns of df that appear in the policy for table to their compact dtypes.
+    Columns the policy does not know about are left untouched.
+    """
+    policy = TABLE_DTYPES.get(table, {})
+    for col, dtype in policy.items():
+        if col in df.columns and str(df[col].dtype) != dtype:
+            df[col] = _cast(df[col], dtype)
+    return df
+
+def read_table(table: str, engine=None, columns=None) -> pd.DataFrame:
+    """Read a whole warehouse table and apply its dtype policy."""
+    engine = engine or get_engine()
+    return apply_dtypes(pd.read_sql_table(table, engine, schema='public', columns=columns), table)
+
+def memory_profile(frames: dict) -> pd.DataFrame:
+    """Return rows, columns and deep in-memory size (MB) for each named frame, largest first."""
+    rows = [
+        {
+            "table": name,
+            "rows": len(df),
+            "columns": df.shape[1],
+            "memory_mb": round(df.memory_usage(deep=True).sum() / 2**20, 2),
+        }
+        for name, df in frames.items()
+    ]
+    return pd.DataFrame(rows).sort_values("memory_mb", ascending=False, ignore_index=True)
+
+def main():
+    """Print the memory footprint of every warehouse table with default and policy dtypes."""
+    engine = get_engine()
+    raw, compact = {}, {}
+    for table in TABLE_DTYPES:
+        try:
+            raw[table] = pd.read_sql_table(table, engine, schema='public')
+        except ValueError:
+            print(f"Skipping {table}: table not found")
+            continue
+        compact[table] = apply_dtypes(raw[table].copy(), table)
+
+    profile = memory_profile(raw).merge(
+        memory_profile(compact)[["table", "memory_mb"]], on="table", suffixes=("_default", "_policy")
+    )
+    profile["ratio"] = (profile["memory_mb_default"] / profile["memory_mb_policy"]).round(1)
+    print(profile.to_string(index=False))
+    print(f"Total: {profile['memory_mb_default'].sum():.1f} MB -> {profile['memory_mb_policy'].sum():.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Local fuzzy resolution of scraped ranking names to athlete IDs.
+
+Scraped names are only compared with athletes from the same block: same NOC and year of
+birth, falling back to same NOC with a missing or off-by-one year of birth. Within a block,
+names are scored by cosine similarity of TF-IDF character n-grams of the normalized names.
+A clear best candidate above AUTO_ACCEPT is accepted; close calls are written to the
+athlete_match_review table; everything else is left for the World Triathlon search API.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sqlalchemy import text
+
+from database import get_engine
+from tri_analysis.athlete_matching import normalize_names
+from tri_analysis.dtypes import apply_dtypes
+
+AUTO_ACCEPT = 0.75        # minimum similarity to accept a match without review
+MIN_MARGIN = 0.10         # best candidate must beat the runner-up by this much
+REVIEW_MIN = 0.50         # candidates below this are not worth a human look
+MAX_REVIEW_CANDIDATES = 3
+NGRAM_RANGE = (2, 3)
+
+def _blocks(athletes: pd.DataFrame):
+    """Athlete row positions per (noc, yob) and per noc."""
+    by_noc_yob = athletes.groupby(['noc', 'yob'], observed=True, dropna=True).indices
+    by_noc = athletes.groupby('noc', observed=True, dropna=True).indices
+    return by_noc_yob, by_noc
+
+def _candidates(noc, yob, athletes, by_noc_yob, by_noc):
+    exact = by_noc_yob.get((noc, yob)) if pd.notna(yob) else None
+    if exact is not None and len(exact):
+        return exact
+    pool = by_noc.get(noc)
+    if pool is None:
+        return np.array([], dtype=int)
+    pool_yob = athletes['yob'].to_numpy(dtype=float, na_value=np.nan)[pool]
+    if pd.isna(yob):
+        return pool[np.isnan(pool_yob)]
+    return pool[np.isnan(pool_yob) | (np.abs(pool_yob - yob) <= 1)]
+
+def match_names(names: pd.DataFrame, athletes: pd.DataFrame):
+    """
+    Fuzzy-match scraped names against known athletes.
+
+    names has athlete_name, noc, yob; athletes has athlete_id, full_name, noc, yob.
+    Returns (accepted, review): accepted has athlete_name, noc, yob, athlete_id, score;
+    review has athlete_name, noc, yob, candidate_id, candidate_name, score.
+    """
+    accepted_cols = ['athlete_name', 'noc', 'yob', 'athlete_id', 'score']
+    review_cols = ['athlete_name', 'noc', 'yob', 'candidate_id', 'candidate_name', 'score']
+    names = names[names['noc'].notna()].reset_index(drop=True)
+    # Athletes from countries with no scraped names can never be candidates
+    athletes = athletes[athletes['noc'].isin(names['noc'].unique()) & athletes['full_name'].notna()]
+    athletes = athletes.reset_index(drop=True)
+    if names.empty or athletes.empty:
+        return pd.DataFrame(columns=accepted_cols), pd.DataFrame(columns=review_cols)
+
+    name_keys = normalize_names(names['athlete_name']).fillna('')
+    athlete_keys = normalize_names(athletes['full_name']).fillna('')
+    vectors = TfidfVectorizer(analyzer='char_wb', ngram_range=NGRAM_RANGE).fit_transform(
+        pd.concat([name_keys, athlete_keys], ignore_index=True)
+    ).tocsr()
+    name_vecs, athlete_vecs = vectors[:len(names)], vectors[len(names):]
+
+    by_noc_yob, by_noc = _blocks(athletes)
+    athlete_ids = athletes['athlete_id'].to_numpy()
+    athlete_names = athletes['full_name'].to_numpy()
+    scraped = names['athlete_name'].to_numpy()
+    accepted, review = [], []
+    for (noc, yob), rows in names.groupby(['noc', 'yob'], dropna=False, sort=False).indices.items():
+        cands = _candidates(noc, yob, athletes, by_noc_yob, by_noc)
+        if not len(cands):
+            continue
+        # Rows are L2-normalized, so the dot product is the cosine similarity
+        scores = (name_vecs[rows] @ athlete_vecs[cands].T).toarray()
+        best_idx = scores.argmax(axis=1)
+        best = scores[np.arange(len(rows)), best_idx]
+        runner_up = np.sort(scores, axis=1)[:, -2] if len(cands) > 1 else np.zeros(len(rows))
+        sure = (best >= AUTO_ACCEPT) & (best - runner_up >= MIN_MARGIN)
+        accepted.extend(zip(scraped[rows[sure]], [noc] * sure.sum(), [yob] * sure.sum(),
+                            athlete_ids[cands[best_idx[sure]]], best[sure]))
+        for i in np.flatnonzero(~sure & (best >= REVIEW_MIN)):
+            for j in np.argsort(-scores[i])[:MAX_REVIEW_CANDIDATES]:
+                if scores[i, j] >= REVIEW_MIN:
+                    review.append((scraped[rows[i]], noc, yob, athlete_ids[cands[j]],
+                                   athlete_names[cands[j]], scores[i, j]))
+    return pd.DataFrame(accepted, columns=accepted_cols), pd.DataFrame(review, columns=review_cols)
+
+def resolve_staged_names(engine=None):
+    """
+    Fill staging_rankings.athlete_id for unresolved names the fuzzy matcher is confident about
+    and replace their rows in athlete_match_review for the ambiguous ones. Review rows of names
+    that are now fully resolved (here or by an earlier API lookup) are dropped.
+    Returns (accepted, queued_for_review) name counts.
+    """
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        names = pd.read_sql(text(
+            "SELECT DISTINCT athlete_name, noc, yob FROM staging_rankings WHERE athlete_id IS NULL"
+        ), conn)
+        athletes = pd.read_sql(text("SELECT athlete_id, full_name, noc, yob FROM athlete"), conn)
+    accepted, review = match_names(names, athletes)
+
+    with engine.begin() as conn:
+        if not accepted.empty:
+            conn.execute(
+                text("""
+                    UPDATE staging_rankings SET athlete_id = :athlete_id
+                    WHERE athlete_id IS NULL AND athlete_name = :athlete_name AND noc = :noc
+                """),
+                [{'athlete_id': int(r.athlete_id), 'athlete_name': r.athlete_name, 'noc': r.noc}
+                 for r in accepted.itertuples()]
+            )
+        conn.execute(text("""
+            DELETE FROM athlete_match_review
+            WHERE athlete_name IN (SELECT athlete_name FROM staging_rankings WHERE athlete_id IS NOT NULL)
+              AND athlete_name NOT IN (SELECT athlete_name FROM staging_rankings WHERE athlete_id IS NULL)
+        """))
+        if not review.empty:
+            conn.execute(
+                text("DELETE FROM athlete_match_review WHERE athlete_name = :name"),
+                [{'name': n} for n in review['athlete_name'].unique()]
+            )
+            # A name staged under several NOC/YOB blocks can propose the same candidate more than once
+            review = review.sort_values('score', ascending=False).drop_duplicates(['athlete_name', 'candidate_id'])
+            review = apply_dtypes(review.assign(created_at=date.today()), 'athlete_match_review')
+            review.to_sql('athlete_match_review', conn, if_exists='append', index=False, method='multi')
+
+    n_review = review['athlete_name'].nunique() if not review.empty else 0
+    print(f"Fuzzy matching: {len(accepted)} names resolved, {n_review} queued for review, "
+          f"{len(names) - len(accepted) - n_review} left unmatched")
+    return len(accepted), n_review
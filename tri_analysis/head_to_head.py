@@ -0,0 +1,206 @@
+"""
+Head-to-head records across all athletes as sparse athlete x athlete matrices.
+
+Within each race ((event_id, prog_id) group), every finisher is paired with every finisher
+behind them. The pairs of all races are generated at once with numpy, with no Python loop per
+race or per pair. They are summed into two CSR matrices indexed by athlete_id:
+
+    wins[a, b]     races in which a finished ahead of b
+    margins[a, b]  total seconds by which a finished ahead of b in those races
+
+Losses are the transpose. Only finishers are compared (finish_seconds): a numeric position and
+a total time. Non-finishers (DNF, DSQ, no time) and equal times produce no pair.
+queries.head_to_head uses the same rule.
+
+The matrices, the counted programs and the pairs of each program are saved to one compressed
+.npz file. update_head_to_head() expands the programs that are not counted yet. Programs
+passed as rewritten have their old pairs subtracted before they are expanded again.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sqlalchemy import bindparam, text
+
+from config import HEAD_TO_HEAD_PATH
+from database import get_engine
+from tri_analysis.metrics import parse_times_to_secs
+
+READ_CHUNK = 5000   # prog_ids per IN (...) when reading programs
+
+def finish_seconds(position: pd.Series, total_time: pd.Series) -> pd.Series:
+    """Total time in seconds of finishers (numeric position and a time), NA for everyone else."""
+    secs = parse_times_to_secs(total_time).astype("Int64")
+    finished = pd.to_numeric(position.astype("object"), errors="coerce").notna() & (secs > 0)
+    return secs.where(finished)
+
+def race_pairs(results: pd.DataFrame):
+    """
+    (prog_ids, winner_ids, loser_ids, margins) for every ordered pair of finishers of the same
+    race. `results` needs event_id, prog_id, athlete_id, position and total_time.
+    """
+    secs = finish_seconds(results["position"], results["total_time"])
+    df = pd.DataFrame({
+        "event_id": results["event_id"], "prog_id": results["prog_id"],
+        "athlete_id": results["athlete_id"], "secs": secs,
+    }).dropna().sort_values(["event_id", "prog_id", "secs"], kind="stable")
+    if df.empty:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+
+    # Position of each finisher within its race and how many finished behind them
+    race = df.groupby(["event_id", "prog_id"], sort=False).ngroup().to_numpy()
+    starts = np.flatnonzero(np.r_[True, race[1:] != race[:-1]])
+    sizes = np.diff(np.r_[starts, len(race)])
+    rank = np.arange(len(race)) - np.repeat(starts, sizes)
+    behind = np.repeat(sizes, sizes) - 1 - rank
+
+    # Row i is paired with rows i+1 .. i+behind[i]
+    winners = np.repeat(np.arange(len(race)), behind)
+    first = np.repeat(np.cumsum(behind) - behind, behind)
+    losers = winners + 1 + (np.arange(len(winners)) - first)
+
+    progs = df["prog_id"].to_numpy(dtype=np.int64)
+    ids = df["athlete_id"].to_numpy(dtype=np.int64)
+    secs = df["secs"].to_numpy(dtype=np.int64)
+    margins = secs[losers] - secs[winners]
+    keep = margins > 0
+    return progs[winners][keep], ids[winners][keep], ids[losers][keep], margins[keep]
+
+class HeadToHead:
+    """Win-count and margin matrices, the prog_ids counted and the pairs each one contributed."""
+
+    def __init__(self, wins=None, margins=None, programs=(), pairs=None):
+        self.wins = wins if wins is not None else sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.margins = margins if margins is not None else sparse.csr_matrix((0, 0), dtype=np.int64)
+        self.programs = set(int(p) for p in programs)
+        empty = np.empty(0, dtype=np.int64)
+        # (prog_ids, winners, losers, margins) of every counted pair
+        self.pairs = pairs if pairs is not None else (empty, empty, empty, empty)
+
+    @property
+    def size(self) -> int:
+        return self.wins.shape[0]
+
+    def _apply(self, winners, losers, margins, sign: int):
+        n = max(self.size, int(max(winners.max(), losers.max())) + 1)
+        if n > self.size:
+            self.wins.resize((n, n))
+            self.margins.resize((n, n))
+        self.wins = self.wins + sparse.csr_matrix(
+            (np.full(len(winners), sign, dtype=np.int32), (winners, losers)), shape=(n, n))
+        self.margins = self.margins + sparse.csr_matrix((sign * margins, (winners, losers)), shape=(n, n))
+
+    def remove(self, prog_ids) -> int:
+        """Subtract the pairs of counted programs in prog_ids. Returns the number of pairs removed."""
+        prog_ids = self.programs & set(int(p) for p in prog_ids)
+        self.programs -= prog_ids
+        mask = np.isin(self.pairs[0], list(prog_ids))
+        if not mask.any():
+            return 0
+        progs, winners, losers, margins = (a[mask] for a in self.pairs)
+        self._apply(winners, losers, margins, -1)
+        self.wins.eliminate_zeros()
+        self.margins.eliminate_zeros()
+        self.pairs = tuple(a[~mask] for a in self.pairs)
+        return len(winners)
+
+    def add(self, results: pd.DataFrame) -> int:
+        """Count the races in results whose prog_id is not counted yet. Returns the number of new pairs."""
+        results = results[~results["prog_id"].isin(self.programs)]
+        progs, winners, losers, margins = race_pairs(results)
+        self.programs.update(int(p) for p in results["prog_id"].dropna().unique())
+        if len(winners) == 0:
+            return 0
+        self._apply(winners, losers, margins, 1)
+        self.pairs = tuple(np.concatenate([old, new]) for old, new in zip(self.pairs, (progs, winners, losers, margins)))
+        return len(winners)
+
+    def _get(self, matrix, a: int, b: int):
+        return matrix[a, b] if a < self.size and b < self.size else 0
+
+    def record(self, a: int, b: int) -> dict:
+        """a's record against b: wins, losses and mean winning/losing margin in seconds."""
+        wins, losses = int(self._get(self.wins, a, b)), int(self._get(self.wins, b, a))
+        margin_for, margin_against = int(self._get(self.margins, a, b)), int(self._get(self.margins, b, a))
+        return {
+            "athlete_id": a, "opponent_id": b, "races": wins + losses, "wins": wins, "losses": losses,
+            "mean_win_margin_s": round(margin_for / wins, 1) if wins else None,
+            "mean_loss_margin_s": round(margin_against / losses, 1) if losses else None,
+        }
+
+    def save(self, path: str = HEAD_TO_HEAD_PATH):
+        """Write the matrices, counted programs and pairs to one compressed .npz (atomically)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        wins, margins = self.wins.tocsr(), self.margins.tocsr()
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(
+                f, shape=np.array(wins.shape),
+                wins_data=wins.data, wins_indices=wins.indices, wins_indptr=wins.indptr,
+                margins_data=margins.data, margins_indices=margins.indices, margins_indptr=margins.indptr,
+                programs=np.array(sorted(self.programs), dtype=np.int64),
+                pair_progs=self.pairs[0], pair_winners=self.pairs[1].astype(np.int32),
+                pair_losers=self.pairs[2].astype(np.int32), pair_margins=self.pairs[3].astype(np.int32),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = HEAD_TO_HEAD_PATH) -> "HeadToHead":
+        """The saved matrices, or an empty HeadToHead if path does not exist."""
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as npz:
+            shape = tuple(npz["shape"])
+            wins = sparse.csr_matrix((npz["wins_data"], npz["wins_indices"], npz["wins_indptr"]), shape=shape)
+            margins = sparse.csr_matrix((npz["margins_data"], npz["margins_indices"], npz["margins_indptr"]),
+                                        shape=shape)
+            pairs = tuple(npz[k].astype(np.int64) for k in ("pair_progs", "pair_winners", "pair_losers", "pair_margins"))
+            return cls(wins, margins, npz["programs"].tolist(), pairs)
+
+def _read_programs(conn, prog_ids: list) -> pd.DataFrame:
+    query = text(
+        "SELECT event_id, prog_id, athlete_id, position, total_time FROM race_results WHERE prog_id IN :prog_ids"
+    ).bindparams(bindparam("prog_ids", expanding=True))
+    return pd.concat([
+        pd.read_sql(query, conn, params={"prog_ids": prog_ids[i:i + READ_CHUNK]})
+        for i in range(0, len(prog_ids), READ_CHUNK)
+    ], ignore_index=True)
+
+def update_head_to_head(engine=None, path: str = HEAD_TO_HEAD_PATH, full: bool = False, prog_ids=()) -> int:
+    """
+    Count the programs in race_results that the saved matrices do not count yet, then save.
+    prog_ids are programs whose results were rewritten: their old pairs are subtracted and they
+    are counted again. With full=True the matrices are rebuilt from every program.
+    Returns the number of pairs added.
+    """
+    engine = engine or get_engine()
+    h2h = HeadToHead() if full else HeadToHead.load(path)
+    rewritten = set(int(p) for p in prog_ids)
+    removed = h2h.remove(rewritten)
+    with engine.connect() as conn:
+        stored = conn.execute(text("SELECT DISTINCT prog_id FROM race_results")).scalars().all()
+        new_ids = sorted(set(int(p) for p in stored if p is not None) - h2h.programs)
+        results = _read_programs(conn, new_ids) if new_ids else pd.DataFrame()
+    if not new_ids:
+        if removed:
+            h2h.save(path)
+        print("No new programs for head-to-head.")
+        return 0
+    pairs = h2h.add(results)
+    h2h.save(path)
+    print(f"Added {pairs} head-to-head pairs from {len(new_ids)} programs "
+          f"({removed} replaced pairs removed, {h2h.wins.nnz} athlete pairs).")
+    return pairs
+
+def head_to_head_record(a: int, b: int, path: str = HEAD_TO_HEAD_PATH) -> dict:
+    """a's record against b from the saved matrices."""
+    return HeadToHead.load(path).record(a, b)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Update the head-to-head matrices from race_results.")
+    parser.add_argument("--full", action="store_true", help="rebuild from every program")
+    args = parser.parse_args()
+    update_head_to_head(full=args.full)
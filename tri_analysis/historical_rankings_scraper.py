@@ -1,4 +1,4 @@
-# Data_Import/historical_rankings_scraper.py
+# tri_analysis/historical_rankings_scraper.py
 # Add project root to path for package imports
 
 import sys
@@ -6,14 +6,30 @@ import os
 import requests
 import time
 import logging
+import concurrent.futures
 import pandas as pd
-from bs4 import BeautifulSoup
 from datetime import datetime, date
 from typing import List, Dict, Tuple, Optional
 from sqlalchemy import text
-from Data_Import.database import get_engine
-from config.config import HEADERS
+from database import get_engine
+from config import HEADERS
 from dotenv import load_dotenv
+from tri_analysis.throttle import HostThrottle
+from tri_analysis.ranking_tables import extract_ranking_table, columns_to_records
+from tri_analysis.ranking_archive import RankingArchive
+from tri_analysis.fuzzy_matching import resolve_staged_names
+from tri_analysis.dtypes import apply_dtypes
+from tri_analysis.instrumentation import METRICS, stage, set_gauge, export_run_report
+from tri_analysis.profiling import add_profile_arguments, profiled
+from tri_analysis.upsert_tables import (
+    copy_dataframe, promote_rankings, upsert_athlete, upsert_athlete_rankings, upsert_race_results
+)
+from tri_analysis.api_handling import (
+    fetch_athlete_id_search,
+    fetch_athlete_info,
+    fetch_race_results,
+    athlete_results_to_frame,
+)
 
 load_dotenv()
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -27,14 +43,32 @@ logging.getLogger("urllib3").setLevel(logging.WARNING)
 logging.getLogger("requests").setLevel(logging.WARNING)
 
 # URL patterns for historical rankings
+ITU_WTCS_URL_PATTERN = "https://old.triathlon.org/rankings/itu_world_triathlon_series_{year}/{gender}"
 WTCS_URL_PATTERN = "https://old.triathlon.org/rankings/world_triathlon_championship_series_{year}/{gender}"
 WTR_URL_PATTERN = "https://old.triathlon.org/rankings/world_rankings_{year}/{gender}"
 
-# Rate limiting configuration
-RATE_LIMIT_DELAY = 1.0  # seconds between requests
+# Crawl frontier: (series, URL pattern, first year, last year) the pattern was published for.
+# ITU WTCS covers 2016-2019 (no 2020 season), WTCS from 2021. World Rankings pages are
+# currently broken, so they are only crawled when asked for explicitly.
+SERIES_URL_PATTERNS = [
+    ("world_triathlon_championship_series", ITU_WTCS_URL_PATTERN, None, 2019),
+    ("world_triathlon_championship_series", WTCS_URL_PATTERN, 2021, None),
+    ("world_rankings", WTR_URL_PATTERN, None, None),
+]
+DEFAULT_SERIES = ("world_triathlon_championship_series",)
+DEFAULT_YEARS = range(2016, 2025)
+GENDERS = ("male", "female")
 
-# Table name for race results
-RACE_RESULTS_TABLE_NAME = "race_results"
+# Rate limiting configuration: a shared budget for all crawler threads instead of fixed sleeps
+REQUESTS_PER_SECOND = 1.0  # per-host budget, no more than the old sequential 1 s sleep
+MAX_CONCURRENCY_PER_HOST = 4
+
+# World Triathlon API lookups while resolving athletes, and rows per write transaction
+API_WORKERS = 8
+WRITE_BATCH_SIZE = 200
+
+# Final rankings of past seasons never change: archived pages before this season are not refetched
+CURRENT_SEASON = date.today().year
 
 # Historical ranking category mappings
 RANKING_CATEGORIES = {
@@ -49,7 +83,7 @@ class HistoricalRankingsScraper:
     Scraper for historical triathlon rankings from old.triathlon.org
     """
     
-    def __init__(self):
+    def __init__(self, archive: Optional[RankingArchive] = None):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -59,62 +93,65 @@ class HistoricalRankingsScraper:
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
         })
+        # Shared per-host request budget for all crawler threads
+        self.throttle = HostThrottle(REQUESTS_PER_SECOND, MAX_CONCURRENCY_PER_HOST)
+        # Local archive of fetched pages and what has been staged from them
+        self.archive = archive or RankingArchive()
         # Athlete ID matching utility
-        from Data_Import.athlete_matching import match_athlete_id
+        from tri_analysis.athlete_matching import match_athlete_id, get_name_index
         self.match_athlete_id = match_athlete_id
+        # Names are matched in bulk against an in-memory index of the athlete table
+        self.name_index = get_name_index()
         
-    def discover_available_rankings(self) -> List[Dict]:
-        # Discover available historical ranking pages. Return list of dictionaries with metadata.
+    @staticmethod
+    def build_frontier(years=DEFAULT_YEARS, series=DEFAULT_SERIES) -> List[Tuple[str, str, int, str]]:
+        """
+        Build the URL frontier of (url, series, year, gender) for every series pattern published
+        in the given year range.
+        """
+        frontier = []
+        for series_name, pattern, first, last in SERIES_URL_PATTERNS:
+            if series_name not in series:
+                continue
+            for year in years:
+                if (first is not None and year < first) or (last is not None and year > last):
+                    continue
+                for gender in GENDERS:
+                    frontier.append((pattern.format(year=year, gender=gender), series_name, year, gender))
+        return frontier
+
+    def discover_available_rankings(self, years=DEFAULT_YEARS, series=DEFAULT_SERIES,
+                                    max_workers: int = MAX_CONCURRENCY_PER_HOST) -> List[Dict]:
+        """
+        Crawl the ranking frontier concurrently and return metadata for every available page.
 
-        logger.info("Starting discovery of available historical rankings...")
+        Workers share the per-host throttle, so at most MAX_CONCURRENCY_PER_HOST requests are in
+        flight and REQUESTS_PER_SECOND is never exceeded, however many workers run.
+        """
+        frontier = self.build_frontier(years, series)
+        logger.info(f"Starting discovery of available historical rankings ({len(frontier)} pages)...")
+        started = time.monotonic()
         available_rankings = []
-        
-        # ITU WTCS rankings (2016-2019, no data for 2020) use a different URL pattern
-        ITU_WTCS_URL_PATTERN = "https://old.triathlon.org/rankings/itu_world_triathlon_series_{year}/{gender}"
-        for year in range(2016, 2020):
-            for gender in ["male", "female"]:
-                url = ITU_WTCS_URL_PATTERN.format(year=year, gender=gender)
-                ranking_info = self._check_ranking_availability(
-                    url,
-                    "world_triathlon_championship_series",
-                    year,
-                    gender
-                )
-                if ranking_info:
-                    available_rankings.append(ranking_info)
-                time.sleep(RATE_LIMIT_DELAY)
-
-        # WTCS rankings (2021-2024) use the standard pattern
-        for year in range(2021, 2025):
-            for gender in ["male", "female"]:
-                url = WTCS_URL_PATTERN.format(year=year, gender=gender)
-                ranking_info = self._check_ranking_availability(
-                    url,
-                    "world_triathlon_championship_series",
-                    year,
-                    gender
-                )
+        with stage("rankings_discovery") as st, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for done, ranking_info in enumerate(
+                executor.map(lambda page: self._check_ranking_availability(*page), frontier), 1
+            ):
+                set_gauge("rankings_frontier", len(frontier) - done)
                 if ranking_info:
                     available_rankings.append(ranking_info)
-                time.sleep(RATE_LIMIT_DELAY)
-
-        # World Rankings (2022-2024) - currently broken, skip for now
-        # for year in range(2022, 2025):
-        #     for gender in ["male", "female"]:
-        #         url = WTR_URL_PATTERN.format(year=year, gender=gender)
-        #         ranking_info = self._check_ranking_availability(
-        #             url,
-        #             "world_rankings",
-        #             year,
-        #             gender
-        #         )
-        #         if ranking_info:
-        #             available_rankings.append(ranking_info)
-        #         time.sleep(RATE_LIMIT_DELAY)
-        
-        logger.info(f"Discovery complete. Found {len(available_rankings)} available ranking pages.")
+            st.rows = len(frontier)
+
+        # Keep one page per (series, year, gender) in frontier order
+        seen = set()
+        available_rankings = [
+            r for r in available_rankings
+            if (r['series'], r['year'], r['gender']) not in seen and not seen.add((r['series'], r['year'], r['gender']))
+        ]
+        logger.info(f"Discovery complete. Found {len(available_rankings)} available ranking pages "
+                    f"in {time.monotonic() - started:.1f}s.")
         return available_rankings
-    
+
     def _check_ranking_availability(self, url: str, series: str, year: int, gender: str) -> Optional[Dict]:
         """
         Check if a ranking page is available and extract basic metadata.
@@ -129,74 +166,32 @@ class HistoricalRankingsScraper:
             Dictionary with ranking metadata if available, None otherwise
         """
         try:
-            response = self.session.get(url, timeout=10)
-            
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Locate the ranking table by matching ITU or WTCS header patterns
-                ranking_table = None
-                itu_pattern = {'rank', 'first name', 'last name', 'yob', 'country', 'points'}
-                wtcs_pattern = {'rank', 'given name', 'family name', 'noc', 'events', 'totalpoints'}
-                for tbl in soup.find_all('table'):
-                    header_row = tbl.find('tr')
-                    if not header_row:
-                        continue
-                    cols = [cell.get_text().strip().lower() for cell in header_row.find_all(['th', 'td'])]
-                    # match full ITU schema or WTCS schema
-                    if itu_pattern.issubset(set(cols)) or wtcs_pattern.issubset(set(cols)):
-                        ranking_table = tbl
-                        break
-                if not ranking_table:
-                    tables = soup.find_all('table')
-                    # Log header of the largest table for debugging
-                    if tables:
-                        largest = max(tables, key=lambda t: len(t.find_all('tr')))
-                        hdr = largest.find('tr')
-                        cols = [cell.get_text().strip() for cell in hdr.find_all(['th','td'])]
-                        logger.debug(f"Largest table headers at {url}: {cols}")
-                
-                if ranking_table:
-                    # Determine schema by inspecting header row
-                    header_row = ranking_table.find('tr')
-                    header_cols = [cell.get_text().strip().lower() for cell in header_row.find_all(['th', 'td'])]
-                    records = []
-                    # ITU schema: ['rank','first name','last name','yob','country','points']
-                    itu_headers = {'rank', 'first name', 'last name', 'country', 'points'}
-                    if itu_headers.issubset(set(header_cols)):
-                        for row in ranking_table.find_all('tr')[1:]:
-                            cells = row.find_all('td')
-                            if len(cells) >= 6 and cells[0].get_text().strip().isdigit():
-                                try:
-                                    rec = {
-                                        'rank': int(cells[0].get_text().strip()),
-                                        'given_name': cells[1].get_text().strip(),
-                                        'family_name': cells[2].get_text().strip(),
-                                        'yob': cells[3].get_text().strip(),
-                                        'noc': cells[4].get_text().strip(),
-                                        'total_points': float(cells[5].get_text().strip())
-                                    }
-                                    records.append(rec)
-                                except ValueError:
-                                    continue
-                    else:
-                        # Default WTCS schema: require at least 8 columns
-                        for row in ranking_table.find_all('tr')[1:]:
-                            cells = row.find_all('td')
-                            if len(cells) >= 8 and cells[1].get_text().strip().isdigit():
-                                try:
-                                    rec = {
-                                        'rank': int(cells[1].get_text().strip()),
-                                        'given_name': cells[2].get_text().strip(),
-                                        'family_name': cells[3].get_text().strip(),
-                                        'yob': cells[4].get_text().strip(),
-                                        'noc': cells[5].get_text().strip(),
-                                        'events': int(cells[6].get_text().strip()),
-                                        'total_points': float(cells[7].get_text().strip())
-                                    }
-                                    records.append(rec)
-                                except ValueError:
-                                    continue
+            # Past seasons that are already archived are read locally, without a request
+            archived = self.archive.get(series, year, gender)
+            if archived and year < CURRENT_SEASON:
+                if archived['status'] == 'missing':
+                    return None
+                content, status_code, from_archive = self.archive.read(archived['sha256']), 200, True
+            else:
+                with self.throttle.slot(url):
+                    started = time.perf_counter()
+                    try:
+                        response = self.session.get(url, timeout=10)
+                    except requests.exceptions.RequestException:
+                        METRICS.observe_request("old_triathlon_rankings", time.perf_counter() - started, error=True)
+                        raise
+                    METRICS.observe_request("old_triathlon_rankings", time.perf_counter() - started,
+                                            response.status_code, error=response.status_code >= 400)
+                content, status_code, from_archive = response.content, response.status_code, False
+
+            if status_code == 200:
+                # Stream the page only up to the end of the ranking table, straight into typed columns
+                table = extract_ranking_table(content)
+                if table:
+                    records = columns_to_records(table['columns'])
+                    content_hash = archived['sha256'] if from_archive else self.archive.put(
+                        series, year, gender, url, content, len(records)
+                    )
                     athlete_count = len(records)
                     ranking_info = {
                         'url': url,
@@ -208,14 +203,19 @@ class HistoricalRankingsScraper:
                         'ranking_cat_id': RANKING_CATEGORIES.get(f"{series}_{gender}"),
                         'ranking_cat_name': self._build_category_name(series),
                         'status': 'available',
+                        'content_hash': content_hash,
+                        'from_archive': from_archive,
                         'athletes': records
                     }
-                    logger.info(f"✓ Found rankings: {series} {year} {gender} ({athlete_count} athletes)")
+                    source = "archive" if from_archive else "web"
+                    logger.info(f"✓ Found rankings: {series} {year} {gender} ({athlete_count} athletes, {source})")
                     return ranking_info
                 else:
                     logger.warning(f"✗ No ranking table found: {url}")
             else:
-                logger.warning(f"✗ HTTP {response.status_code}: {url}")
+                if status_code == 404 and year < CURRENT_SEASON:
+                    self.archive.put_missing(series, year, gender, url, status_code)
+                logger.warning(f"✗ HTTP {status_code}: {url}")
                 
         except requests.exceptions.RequestException as e:
             logger.error(f"✗ Request failed for {url}: {str(e)}")
@@ -232,102 +232,106 @@ class HistoricalRankingsScraper:
         gender_names = {"male": "Male", "female": "Female"}
         return f"{series_names.get(series, series)}"
     
-    def upsert_rankings(self, rankings: List[Dict]):
+    @staticmethod
+    def rankings_to_frame(rankings: List[Dict], retrieved_at: date) -> pd.DataFrame:
+        """
+        Flatten scraped rankings into one columnar batch shaped like staging_rankings.
+        """
+        columns = ['athlete_id', 'athlete_name', 'ranking_cat_name', 'ranking_cat_id',
+                   'rank_position', 'total_points', 'year', 'retrieved_at', 'noc', 'yob']
+        frames = [
+            pd.DataFrame(r['athletes']).assign(
+                ranking_cat_name=r['ranking_cat_name'], ranking_cat_id=r['ranking_cat_id'], year=r['year']
+            )
+            for r in rankings if r.get('athletes')
+        ]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat(frames, ignore_index=True)
+        df['athlete_name'] = df['given_name'] + ' ' + df['family_name']
+        df['athlete_id'] = pd.Series(pd.NA, index=df.index, dtype='Int64')
+        df['retrieved_at'] = retrieved_at
+        # Country and year of birth block the fuzzy name matcher's candidates
+        df['noc'] = df['noc'].replace('', None) if 'noc' in df else None
+        df['yob'] = pd.to_numeric(df['yob'], errors='coerce').astype('Int64') if 'yob' in df else pd.NA
+        df = df.rename(columns={'rank': 'rank_position'})
+        return df[columns]
+
+    def upsert_rankings(self, rankings):
         """
-        Upsert scraped rankings into the existing athlete_rankings table.
+        Upsert rankings into the existing athlete_rankings table.
+
+        Accepts scraped rankings (list of dicts) or a staging-shaped frame such as the one
+        returned by get_staged_rankings. Missing athlete_ids are matched against the name index
+        in memory, then the batch is COPY-loaded into a temporary table and promoted with a
+        single set-based upsert.
         """
         engine = get_engine()
-        today = date.today()
-        upsert_sql = text(
-            """
-            INSERT INTO athlete_rankings
-              (athlete_id, athlete_name, ranking_cat_name, ranking_cat_id,
-               rank_position, total_points, year, retrieved_at)
-            VALUES (:athlete_id, :athlete_name, :ranking_cat_name, :ranking_cat_id,
-                    :rank_position, :total_points, :year, :retrieved_at)
-            ON CONFLICT (athlete_name, ranking_cat_name, year, retrieved_at)
-            DO UPDATE SET
-              rank_position = EXCLUDED.rank_position,
-              total_points = EXCLUDED.total_points,
-              year = EXCLUDED.year
-            """
-        )
-        inserted = 0
-        for r in rankings:
-            cat_name = r['ranking_cat_name']
-            cat_id = r['ranking_cat_id']
-            year = r['year']
-            with engine.begin() as conn:
-                for athlete in r['athletes']:
-                    full_name = f"{athlete['given_name']} {athlete['family_name']}"
-                    aid = self.match_athlete_id(full_name)
-                    params = {
-                        'athlete_id': aid,
-                        'athlete_name': full_name,
-                        'ranking_cat_name': cat_name,
-                        'ranking_cat_id': cat_id,
-                        'rank_position': athlete['rank'],
-                        'total_points': athlete['total_points'],
-                        'year': year,
-                        'retrieved_at': today
-                    }
-                    conn.execute(upsert_sql, params)
-                    inserted += 1
-        logger.info(f"Upsert of athlete rankings complete. {inserted} records processed.")
+        if isinstance(rankings, pd.DataFrame):
+            df = rankings.copy()
+        else:
+            df = self.rankings_to_frame(rankings, date.today())
+        if df.empty:
+            logger.info("Upsert of athlete rankings complete. 0 records processed.")
+            return
+        missing = df['athlete_id'].isna()
+        df['athlete_id'] = df['athlete_id'].astype('Int64')
+        df.loc[missing, 'athlete_id'] = self.name_index.match_many(df.loc[missing, 'athlete_name']).to_numpy()
+        written = upsert_athlete_rankings(df, engine)
+        logger.info(f"Upsert of athlete rankings complete. {written} records processed.")
 
     def stage_rankings(self, rankings: List[Dict]):
         """
         Stage raw scraped rankings into the staging_rankings table.
+        All rankings are loaded as one batch with COPY.
         """
         engine = get_engine()
-        today = date.today()
-        insert_sql = text(
-            """
-            INSERT INTO staging_rankings
-              (athlete_id, athlete_name, ranking_cat_name, ranking_cat_id,
-               rank_position, total_points, year, retrieved_at)
-            VALUES (:athlete_id, :athlete_name, :ranking_cat_name, :ranking_cat_id,
-                    :rank_position, :total_points, :year, :retrieved_at)
-            """
-        )
-        inserted = 0
+        df = self.rankings_to_frame(rankings, date.today())
+        seasons = df[['ranking_cat_id', 'year']].drop_duplicates()
         with engine.begin() as conn:
-            # Clear existing staging data for today's run
-            conn.execute(text("DELETE FROM staging_rankings WHERE retrieved_at = :today"), {"today": today})
-            for r in rankings:
-                for athlete in r.get('athletes', []):
-                    full_name = f"{athlete['given_name']} {athlete['family_name']}"
-                    params = {
-                        'athlete_id': None,
-                        'athlete_name': full_name,
-                        'ranking_cat_name': r['ranking_cat_name'],
-                        'ranking_cat_id': r['ranking_cat_id'],
-                        'rank_position': athlete['rank'],
-                        'total_points': athlete['total_points'],
-                        'year': r['year'],
-                        'retrieved_at': today
-                    }
-                    conn.execute(insert_sql, params)
-                    inserted += 1
+            # Replace the staged rows of each season being restaged, so reruns never duplicate them
+            if not seasons.empty:
+                conn.execute(
+                    text("DELETE FROM staging_rankings WHERE ranking_cat_id = :cat_id AND year = :year"),
+                    [{"cat_id": int(c), "year": int(y)} for c, y in seasons.itertuples(index=False)]
+                )
+            inserted = copy_dataframe(df, 'staging_rankings', conn)
         logger.info(f"Staged {inserted} ranking records into staging_rankings.")
 
-    def resolve_athlete_ids(self):
+    def promote_staged_rankings(self):
+        """
+        Upsert today's staged rankings into athlete_rankings in one statement, keeping the
+        athlete_ids resolved in staging and filling the rest by exact name.
+        """
+        engine = get_engine()
+        with engine.begin() as conn:
+            written = promote_rankings(conn, retrieved_at=date.today())
+        logger.info(f"Promoted {written} staged ranking records into athlete_rankings.")
+        return written
+
+    def _lookup_athlete(self, name: str) -> Tuple[int, pd.DataFrame]:
+        """Search the API for a scraped name and fetch that athlete's profile (runs in a worker)."""
+        aid = fetch_athlete_id_search(name)
+        return aid, fetch_athlete_info(aid)
+
+    def _fetch_athlete_results(self, athlete_id: int, full_name: str) -> pd.DataFrame:
+        """Fetch all race results of one athlete as race_results rows (runs in a worker)."""
+        return athlete_results_to_frame(athlete_id, full_name, fetch_race_results(athlete_id))
+
+    def resolve_athlete_ids(self, max_workers: int = API_WORKERS):
         """
         Resolve missing athlete_id in staging_rankings by matching existing or calling external API,
         upsert new athlete records into athlete table, and fetch/store race results for new athletes.
+
+        All API calls run concurrently in a worker pool with no transaction open; the database is
+        written afterwards in batches of WRITE_BATCH_SIZE rows, one short transaction per batch.
         """
         engine = get_engine()
         today = date.today()
-        # Load resolving utilities
-        from Data_Upload.search_id import get_athlete_id as api_get_athlete_id
-        from Data_Import.athlete_data import get_athlete_info_df, get_athlete_results_df
-        from Data_Upload.update_race_results import upsert_race_results, calculate_position_metrics
-        from config.config import ATHLETE_TABLE_NAME
-        
-        # Track newly discovered athletes for race results fetching
-        new_athletes = []
-        
-        # Statements
+        # Confident fuzzy matches (blocked by NOC and year of birth) are resolved locally,
+        # so only the remaining names go to the search API
+        resolve_staged_names(engine)
+
         select_names = text(
             """
             SELECT DISTINCT athlete_name
@@ -342,207 +346,177 @@ class HistoricalRankingsScraper:
             WHERE athlete_name = :name AND retrieved_at = :today
             """
         )
-        upsert_athlete = text(f"""
-            INSERT INTO {ATHLETE_TABLE_NAME}
-              (athlete_id, full_name, gender, country, age,
-               category_to, category_coach, category_athlete,
-               category_medical, category_paratriathlete)
-            VALUES (:athlete_id, :full_name, :gender, :country, :age,
-                    :category_to, :category_coach, :category_athlete,
-                    :category_medical, :category_paratriathlete)
-            ON CONFLICT (athlete_id) DO UPDATE SET
-              full_name = EXCLUDED.full_name,
-              gender = EXCLUDED.gender,
-              country = EXCLUDED.country,
-              age = EXCLUDED.age,
-              category_to = EXCLUDED.category_to,
-              category_coach = EXCLUDED.category_coach,
-              category_athlete = EXCLUDED.category_athlete,
-              category_medical = EXCLUDED.category_medical,
-              category_paratriathlete = EXCLUDED.category_paratriathlete
-        """
-        )
-        
-        with engine.begin() as conn:
-            rows = conn.execute(select_names, {"today": today}).fetchall()
-            for (name,) in rows:
-                # Try existing athlete match
-                aid = self.match_athlete_id(name)
-                if not aid:
-                    try:
-                        aid = api_get_athlete_id(name)
-                        info_df = get_athlete_info_df(aid)
-                        if not info_df.empty:
-                            rec = info_df.to_dict(orient='records')[0]
-                            conn.execute(upsert_athlete, rec)
-                            # Track this as a newly discovered athlete
-                            new_athletes.append((aid, name))
-                            logger.info(f"Created new athlete record for '{name}' (ID: {aid})")
-                    except Exception as e:
-                        logger.error(f"Failed to fetch/create athlete record for '{name}': {e}")
-                        continue
-                # Update staging_rankings with resolved id
-                conn.execute(update_stage, {"aid": aid, "name": name, "today": today})
-                #logger.debug(f"Resolved athlete '{name}' to ID {aid}")
-        
-        logger.info(f"Athlete ID resolution complete. Found {len(new_athletes)} new athletes.")
-        
+        with engine.connect() as conn:
+            names = [name for (name,) in conn.execute(select_names, {"today": today})]
+
+        # Exact and normalized matches against the in-memory index
+        matched = self.name_index.match_many(names)
+        resolved = {name: int(aid) for name, aid in zip(names, matched) if pd.notna(aid)}
+        pending = [name for name in names if name not in resolved]
+
+        # Search + profile lookups for the rest, concurrently
+        started = time.perf_counter()
+        api_resolved, profiles = {}, []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self._lookup_athlete, name): name for name in pending}
+            for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                set_gauge("athlete_lookup_queue", len(futures) - done)
+                name = futures[future]
+                try:
+                    aid, info_df = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to fetch/create athlete record for '{name}': {e}")
+                    continue
+                api_resolved[name] = aid
+                if not info_df.empty:
+                    profiles.append(info_df)
+        elapsed = time.perf_counter() - started
+        METRICS.record_stage("athlete_lookup", len(pending), elapsed)
+        if pending:
+            logger.info(f"API lookups: {len(api_resolved)}/{len(pending)} names resolved in {elapsed:.1f}s "
+                        f"({len(pending) / max(elapsed, 1e-9):.1f} names/s, {max_workers} workers)")
+
+        # Short batched writes once the network work is done
+        new_athletes = pd.concat(profiles, ignore_index=True) if profiles else pd.DataFrame()
+        for start in range(0, len(new_athletes), WRITE_BATCH_SIZE):
+            upsert_athlete(new_athletes.iloc[start:start + WRITE_BATCH_SIZE], engine)
+        for name, aid in api_resolved.items():
+            self.name_index.add(aid, name)
+        resolved.update(api_resolved)
+        updates = [{"aid": aid, "name": name, "today": today} for name, aid in resolved.items()]
+        for start in range(0, len(updates), WRITE_BATCH_SIZE):
+            with engine.begin() as conn:
+                conn.execute(update_stage, updates[start:start + WRITE_BATCH_SIZE])
+
+        logger.info(f"Athlete ID resolution complete. Resolved {len(resolved)}/{len(names)} names, "
+                    f"found {len(new_athletes)} new athletes.")
+        if new_athletes.empty:
+            return
+
         # Fetch and store race results for newly discovered athletes
-        if new_athletes:
-            logger.info(f"Fetching race results for {len(new_athletes)} newly discovered athletes...")
-            for athlete_id, athlete_name in new_athletes:
+        logger.info(f"Fetching race results for {len(new_athletes)} newly discovered athletes...")
+        started = time.perf_counter()
+        frames = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._fetch_athlete_results, int(aid), full_name): (aid, full_name)
+                for aid, full_name in zip(new_athletes['athlete_id'], new_athletes['full_name'])
+            }
+            for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                set_gauge("athlete_results_queue", len(futures) - done)
+                aid, full_name = futures[future]
                 try:
-                    # Fetch race results for this athlete
-                    results_df = get_athlete_results_df(athlete_id)
-                    if not results_df.empty:
-                        # Calculate position metrics (rankings, position changes, etc.)
-                        #results_df = calculate_position_metrics(results_df)
-                        # Upsert race results into database
-                        #upsert_race_results(results_df, engine)
-
-                        results_df = results_df.dropna(subset=["athlete_id", "EventID", "TotalTime"])
-                        results_df = results_df.drop_duplicates(subset=["athlete_id", "EventID", "TotalTime"])
-
-                        records = results_df.to_dict(orient="records")
-                        with engine.begin() as conn:
-                            for record in records:
-                                conn.execute(text(f"""                INSERT INTO "{RACE_RESULTS_TABLE_NAME}" (
-                                        athlete_id, "EventID", "ProgID", "Program", "CategoryName", "EventSpecifications",
-                                        "Position", "TotalTime", "SwimTime", "T1", "BikeTime", "T2", "RunTime"
-                                    )
-                                    VALUES (
-                                        :athlete_id, :EventID, :ProgID, :Program, :CategoryName, :EventSpecifications,
-                                        :Position, :TotalTime, :SwimTime, :T1, :BikeTime, :T2, :RunTime
-                                    )
-                                    ON CONFLICT (athlete_id, "EventID", "TotalTime") DO UPDATE SET
-                                        "ProgID" = EXCLUDED."ProgID",
-                                        "Program" = EXCLUDED."Program",
-                                        "CategoryName" = EXCLUDED."CategoryName",
-                                        "EventSpecifications" = EXCLUDED."EventSpecifications",
-                                        "Position" = EXCLUDED."Position",
-                                        "SwimTime" = EXCLUDED."SwimTime",
-                                        "T1" = EXCLUDED."T1",
-                                        "BikeTime" = EXCLUDED."BikeTime",
-                                        "T2" = EXCLUDED."T2",
-                                        "RunTime" = EXCLUDED."RunTime"
-                                """), record)
-                        print(f"Upserted {len(records)} race results.")
+                    results_df = future.result()
                 except Exception as e:
-                    logger.error(f"Failed to upsert race results for '{athlete_name}' (ID: {athlete_id}): {e}")
+                    logger.error(f"Failed to fetch race results for '{full_name}' (ID: {aid}): {e}")
+                    continue
+                if not results_df.empty:
+                    frames.append(results_df)
+        results = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        elapsed = time.perf_counter() - started
+        METRICS.record_stage("athlete_results_fetch", len(results), elapsed)
+        logger.info(f"Fetched {len(results)} race results for {len(new_athletes)} athletes in {elapsed:.1f}s "
+                    f"({len(new_athletes) / max(elapsed, 1e-9):.1f} athletes/s)")
+        for start in range(0, len(results), WRITE_BATCH_SIZE):
+            upsert_race_results(results.iloc[start:start + WRITE_BATCH_SIZE], engine)
+        if not results.empty:
+            print(f"Upserted {len(results)} race results.")
 
-    def get_staged_rankings(self):
+    def get_staged_rankings(self, retrieved_at: Optional[date] = None) -> pd.DataFrame:
         """
-        Retrieve processed rankings from the staging table to feed into upsert_rankings.
-        Returns data in the format expected by upsert_rankings method.
-        Note: The staging table doesn't have athlete details like given_name, family_name, country.
-        The upsert_rankings method only needs athlete_name, so we'll extract name components.
+        Retrieve staged rankings in one ordered query, as a columnar frame shaped like
+        staging_rankings that upsert_rankings accepts directly.
+
+        Args:
+            retrieved_at: Only return rows staged on this date (all staged rows when None)
         """
         engine = get_engine()
-        
-        # Query staging table grouped by category
-        query = text("""
-            SELECT DISTINCT 
-                ranking_cat_name,
-                ranking_cat_id,
-                year
+        where = "WHERE retrieved_at = :retrieved_at" if retrieved_at is not None else ""
+        query = text(f"""
+            SELECT athlete_id, athlete_name, ranking_cat_name, ranking_cat_id,
+                   rank_position, total_points, year, retrieved_at, noc, yob
             FROM staging_rankings
-            ORDER BY year, ranking_cat_name
+            {where}
+            ORDER BY year, ranking_cat_name, rank_position
         """)
-        
-        rankings = []
-        
         with engine.connect() as conn:
-            categories = conn.execute(query).fetchall()
-            
-            for cat in categories:
-                # Get all athletes for this category
-                athletes_query = text("""
-                    SELECT 
-                        athlete_name,
-                        rank_position as rank,
-                        total_points
-                    FROM staging_rankings
-                    WHERE ranking_cat_name = :cat_name
-                        AND ranking_cat_id = :cat_id
-                        AND year = :year
-                    ORDER BY rank_position
-                """)
-                
-                athletes_result = conn.execute(athletes_query, {
-                    'cat_name': cat.ranking_cat_name,
-                    'cat_id': cat.ranking_cat_id,
-                    'year': cat.year
-                })
-                
-                athletes = []
-                for athlete in athletes_result:
-                    # Split athlete_name into given_name and family_name
-                    name_parts = athlete.athlete_name.split(' ', 1)
-                    given_name = name_parts[0] if len(name_parts) > 0 else ''
-                    family_name = name_parts[1] if len(name_parts) > 1 else ''
-                    
-                    athletes.append({
-                        'given_name': given_name,
-                        'family_name': family_name,
-                        'rank': athlete.rank,
-                        'total_points': athlete.total_points
-                    })
-                
-                if athletes:  # Only add if we have athletes
-                    rankings.append({
-                        'ranking_cat_name': cat.ranking_cat_name,
-                        'ranking_cat_id': cat.ranking_cat_id,
-                        'year': cat.year,
-                        'athletes': athletes
-                    })
-        
-        logger.info(f"Retrieved {len(rankings)} ranking categories from staging table")
-        return rankings
+            df = pd.read_sql(query, conn, params={"retrieved_at": retrieved_at})
+        df = apply_dtypes(df, 'staging_rankings')
+        n_categories = len(df[['ranking_cat_name', 'year']].drop_duplicates())
+        logger.info(f"Retrieved {n_categories} ranking categories ({len(df)} rows) from staging table")
+        return df
     
-    def run_full_pipeline(self, limit_rankings=None):
+    def run_full_pipeline(self, limit_rankings=None, years=DEFAULT_YEARS, series=DEFAULT_SERIES):
         """
         Run the complete enhanced pipeline: discovery -> staging -> athlete resolution -> race results.
         
         Args:
             limit_rankings (int, optional): Limit number of rankings processed for testing
+            years (iterable, optional): Seasons to crawl
+            series (tuple, optional): Series names from SERIES_URL_PATTERNS to crawl
         """
         logger.info("=== STARTING FULL ENHANCED PIPELINE ===")
         
         # Step 1: Discovery
         logger.info("Step 1: Discovering available rankings...")
-        available_rankings = self.discover_available_rankings()
+        available_rankings = self.discover_available_rankings(years=years, series=series)
         
         if limit_rankings:
             available_rankings = available_rankings[:limit_rankings]
             logger.info(f"Limited to {len(available_rankings)} rankings for testing")
         
         logger.info(f"Found {len(available_rankings)} rankings to process")
+
+        # Seasons whose archived page was already staged unchanged need no database work
+        available_rankings = [
+            r for r in available_rankings
+            if self.archive.needs_staging(r['series'], r['year'], r['gender'])
+        ]
+        if not available_rankings:
+            logger.info("All rankings are archived and unchanged since the last run; nothing to stage")
+            logger.info("=== ENHANCED PIPELINE COMPLETE ===")
+            return available_rankings
+        logger.info(f"{len(available_rankings)} rankings are new or changed since the last run")
         
         # Step 2: Staging
         logger.info("Step 2: Staging rankings data...")
-        self.stage_rankings(available_rankings)
+        with stage("rankings_staging") as st:
+            self.stage_rankings(available_rankings)
+            st.rows = sum(r['athlete_count'] for r in available_rankings)
         
         # Step 3: Enhanced athlete resolution (includes race results fetching)
         logger.info("Step 3: Resolving athlete IDs and fetching race results...")
         self.resolve_athlete_ids()
-          # Step 4: Retrieve staged rankings and upsert to athlete_rankings
-        logger.info("Step 4: Retrieving staged rankings and upserting to athlete_rankings...")
-        staged_rankings = self.get_staged_rankings()
-        self.upsert_rankings(staged_rankings)
+        # Step 4: Promote staged rankings (with their resolved IDs) to athlete_rankings
+        logger.info("Step 4: Promoting staged rankings to athlete_rankings...")
+        with stage("rankings_promote") as st:
+            st.rows = self.promote_staged_rankings()
+        for r in available_rankings:
+            self.archive.mark_staged(r['series'], r['year'], r['gender'])
         
         logger.info("=== ENHANCED PIPELINE COMPLETE ===")
         return available_rankings
 
 def main():
     """Main function to run the enhanced historical rankings pipeline."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Scrape historical rankings from old.triathlon.org")
+    parser.add_argument("--start-year", type=int, default=DEFAULT_YEARS.start)
+    parser.add_argument("--end-year", type=int, default=DEFAULT_YEARS.stop - 1)
+    parser.add_argument("--series", nargs="+", default=list(DEFAULT_SERIES),
+                        choices=sorted({s for s, *_ in SERIES_URL_PATTERNS}))
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    years = range(args.start_year, args.end_year + 1)
+
     # Ensure database and staging table exist
-    from Data_Import.database import initialize_database
+    from database import initialize_database
     initialize_database()
     scraper = HistoricalRankingsScraper()
     
     print("=== ENHANCED HISTORICAL RANKINGS PIPELINE ===")
     print("This pipeline will:")
-    print("1. Discover available historical rankings (2016-2024)")
+    print(f"1. Discover available historical rankings ({args.start_year}-{args.end_year})")
     print("2. Stage raw ranking data")
     print("3. Resolve athlete IDs (creating new athlete records as needed)")
     print("4. Fetch and store race results for newly discovered athletes")
@@ -550,7 +524,8 @@ def main():
     print()
     
     # Run the full enhanced pipeline
-    available_rankings = scraper.run_full_pipeline()
+    with profiled(args, "historical_rankings"):
+        available_rankings = scraper.run_full_pipeline(years=years, series=tuple(args.series))
     
     print(f"\n=== FINAL SUMMARY ===")
     print(f"Total rankings processed: {len(available_rankings)}")
@@ -571,6 +546,7 @@ def main():
     
     print(f"\nTotal athletes in historical rankings: {total_athletes}")
     print("Enhanced pipeline complete!")
+    export_run_report("historical_rankings")
 
 if __name__ == "__main__":
     main()
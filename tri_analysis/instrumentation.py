@@ -0,0 +1,217 @@
+"""
+Lightweight run instrumentation: API latency histograms with error/retry counts per endpoint,
+rows/sec per pipeline stage, queue depth gauges and database statement timings.
+
+Everything is recorded into one process-wide registry (METRICS). At the end of a run,
+export_run_report() writes a JSON run report (one file per run, for comparing runs over time)
+and a Prometheus textfile (overwritten per job, for node_exporter's textfile collector).
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import RUN_REPORT_DIR
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation (max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total_s": round(self.total, 4),
+            "mean_s": round(self.total / self.count, 4) if self.count else 0.0,
+            "p50_s": self.quantile(0.5),
+            "p95_s": self.quantile(0.95),
+            "max_s": round(self.max, 4),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+class Instrumentation:
+    """Thread-safe registry of endpoint, stage, queue and database measurements."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = datetime.now()
+            self._t0 = time.perf_counter()
+            self.endpoints = {}   # endpoint -> {'latency': Histogram, 'errors': n, 'retries': n, 'status': {code: n}}
+            self.stages = {}      # stage -> {'rows': n, 'seconds': s, 'runs': n}
+            self.gauges = {}      # name -> {'last': v, 'max': v}
+            self.statements = {}  # statement -> {'latency': Histogram, 'rows': n}
+
+    def observe_request(self, endpoint: str, seconds: float, status=None, error: bool = False):
+        with self._lock:
+            ep = self.endpoints.setdefault(endpoint, {"latency": Histogram(), "errors": 0, "retries": 0, "status": {}})
+            ep["latency"].observe(seconds)
+            if status is not None:
+                ep["status"][str(status)] = ep["status"].get(str(status), 0) + 1
+            if error:
+                ep["errors"] += 1
+
+    def count_retry(self, endpoint: str):
+        with self._lock:
+            ep = self.endpoints.setdefault(endpoint, {"latency": Histogram(), "errors": 0, "retries": 0, "status": {}})
+            ep["retries"] += 1
+
+    def record_stage(self, stage: str, rows: int, seconds: float):
+        with self._lock:
+            st = self.stages.setdefault(stage, {"rows": 0, "seconds": 0.0, "runs": 0})
+            st["rows"] += rows
+            st["seconds"] += seconds
+            st["runs"] += 1
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            g = self.gauges.setdefault(name, {"last": value, "max": value})
+            g["last"] = value
+            g["max"] = max(g["max"], value)
+
+    def observe_statement(self, statement: str, seconds: float, rows: int = 0):
+        with self._lock:
+            st = self.statements.setdefault(statement, {"latency": Histogram(), "rows": 0})
+            st["latency"].observe(seconds)
+            st["rows"] += rows
+
+    def report(self, run_name: str) -> dict:
+        with self._lock:
+            return {
+                "run": run_name,
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "wall_s": round(time.perf_counter() - self._t0, 3),
+                "endpoints": {
+                    name: {**ep["latency"].summary(), "errors": ep["errors"], "retries": ep["retries"],
+                           "status": dict(ep["status"])}
+                    for name, ep in self.endpoints.items()
+                },
+                "stages": {
+                    name: {**st, "seconds": round(st["seconds"], 4),
+                           "rows_per_s": round(st["rows"] / st["seconds"], 1) if st["seconds"] else None}
+                    for name, st in self.stages.items()
+                },
+                "queues": {name: dict(g) for name, g in self.gauges.items()},
+                "db_statements": {
+                    name: {**st["latency"].summary(), "rows": st["rows"]}
+                    for name, st in self.statements.items()
+                },
+            }
+
+    def prometheus_text(self, run_name: str) -> str:
+        """Render the registry in the Prometheus text exposition format."""
+        lines = []
+        def metric(name, kind, help_text):
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+        def histogram(name, labels, hist):
+            cumulative = 0
+            for bound, n in zip([str(b) for b in hist.buckets] + ["+Inf"], hist.counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {hist.total:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+        run = f'run="{run_name}"'
+        with self._lock:
+            metric("tri_api_request_seconds", "histogram", "World Triathlon API request latency")
+            for name, ep in self.endpoints.items():
+                histogram("tri_api_request_seconds", f'{run},endpoint="{name}"', ep["latency"])
+            metric("tri_api_errors_total", "counter", "Failed API requests")
+            lines += [f'tri_api_errors_total{{{run},endpoint="{n}"}} {ep["errors"]}' for n, ep in self.endpoints.items()]
+            metric("tri_api_retries_total", "counter", "Retried API requests")
+            lines += [f'tri_api_retries_total{{{run},endpoint="{n}"}} {ep["retries"]}' for n, ep in self.endpoints.items()]
+            metric("tri_stage_rows_total", "counter", "Rows processed per pipeline stage")
+            lines += [f'tri_stage_rows_total{{{run},stage="{n}"}} {st["rows"]}' for n, st in self.stages.items()]
+            metric("tri_stage_seconds_total", "counter", "Time spent per pipeline stage")
+            lines += [f'tri_stage_seconds_total{{{run},stage="{n}"}} {st["seconds"]:.6f}' for n, st in self.stages.items()]
+            metric("tri_queue_depth_max", "gauge", "Maximum observed queue depth")
+            lines += [f'tri_queue_depth_max{{{run},queue="{n}"}} {g["max"]}' for n, g in self.gauges.items()]
+            metric("tri_db_statement_seconds", "histogram", "Database statement latency")
+            for name, st in self.statements.items():
+                histogram("tri_db_statement_seconds", f'{run},statement="{name}"', st["latency"])
+            metric("tri_run_wall_seconds", "gauge", "Wall time of the run")
+            lines.append(f"tri_run_wall_seconds{{{run}}} {time.perf_counter() - self._t0:.3f}")
+            metric("tri_run_timestamp_seconds", "gauge", "Unix time the run report was written")
+            lines.append(f"tri_run_timestamp_seconds{{{run}}} {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Instrumentation()
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a pipeline stage. Set `.rows` on the yielded object to report rows/sec:
+
+        with stage("position_metrics") as s:
+            s.rows = len(df)
+    """
+    class _Stage:
+        rows = 0
+    handle = _Stage()
+    started = time.perf_counter()
+    try:
+        yield handle
+    finally:
+        METRICS.record_stage(name, handle.rows, time.perf_counter() - started)
+
+@contextmanager
+def db_statement(name: str, rows: int = 0):
+    """Time a database statement (or a batch of them) under a short, stable name."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICS.observe_statement(name, time.perf_counter() - started, rows)
+
+def set_gauge(name: str, value: float):
+    """Record the current depth of a queue (last and max values are kept)."""
+    METRICS.set_gauge(name, value)
+
+def _atomic_write(path: str, content: str):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+def export_run_report(run_name: str, directory: str = RUN_REPORT_DIR) -> str:
+    """
+    Write <run>_<timestamp>.json and <run>.prom into directory. Returns the JSON path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = METRICS.started_at.strftime("%Y%m%dT%H%M%S")
+    json_path = os.path.join(directory, f"{run_name}_{stamp}.json")
+    _atomic_write(json_path, json.dumps(METRICS.report(run_name), indent=2))
+    _atomic_write(os.path.join(directory, f"{run_name}.prom"), METRICS.prometheus_text(run_name))
+    print(f"Run report written to {json_path}")
+    return json_path
@@ -1,59 +1,64 @@
-from database import get_engine
+from database import get_engine, create_query_indexes
+import numpy as np
 import pandas as pd
+from sqlalchemy import bindparam, text
+from tri_analysis.dtypes import apply_dtypes, read_table
+from tri_analysis.packs import update_pack_metrics
+from tri_analysis.outliers import flag_splits, flags_to_table
+from tri_analysis.instrumentation import stage, db_statement, export_run_report
+from tri_analysis.profiling import add_profile_arguments, profiled
+from tri_analysis.queries import invalidate_tables
+
+def parse_time_to_secs(t):
+    # Convert an "HH:MM:SS" or "MM:SS" split string to seconds; missing or malformed values are 0.
+    if pd.isna(t) or t == "":
+        return 0
+    parts = str(t).split(":")
+    try:
+        if len(parts) == 3:
+            h, m, s = parts
+            return int(h) * 3600 + int(m) * 60 + int(s)
+        elif len(parts) == 2:
+            m, s = parts
+            return int(m) * 60 + int(s)
+    except ValueError:
+        return 0
+    return 0
 
-def adjust_outlier(series, threshold=2):
-    # For a given series of split times, if the minimum positive value is more than
-    # 200% lower than the second smallest, mark it as an outlier (set to NA).
-    valid = series[series > 0]
-    if len(valid) < 2:
-        return series
-    sorted_vals = valid.sort_values()
-    if sorted_vals.iloc[0] * threshold < sorted_vals.iloc[1]:
-        return series.mask(series == sorted_vals.iloc[0], pd.NA)
-    return series
+def parse_times_to_secs(series):
+    # Vectorized parse_time_to_secs over a whole column of split strings. Split times repeat a
+    # lot, so only the distinct values are parsed and the result is broadcast back by code.
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    parts = pd.Series(uniques, dtype=object).astype(str).str.extract(r'^\s*(?:(\d+):)?(\d+):(\d+)\s*$')
+    parts = parts.astype('float64').fillna(0).astype('int64')
+    secs = np.append((parts[0] * 3600 + parts[1] * 60 + parts[2]).to_numpy(), 0)
+    return pd.Series(secs[codes], index=series.index)
 
 # Load in all race results and calculate position metrics. Save to the position_metrics table.
-def calculate_position_metrics():
-
-    df = pd.read_sql_table('race_results', get_engine(), schema='public')
-    
-    def parse_time_to_secs(t):
-        if pd.isna(t) or t == "":
-            return 0
-        parts = str(t).split(":")
-        try:
-            if len(parts) == 3:
-                h, m, s = parts
-                return int(h) * 3600 + int(m) * 60 + int(s)
-            elif len(parts) == 2:
-                m, s = parts
-                return int(m) * 60 + int(s)
-        except ValueError:
-            return 0
-        return 0
+def calculate_position_metrics(df=None, return_flags=False):
 
-    # Calculate elapsed times at each checkpoint (cumulative)
-    df['elapsedswim'] = df['swimtime'].apply(parse_time_to_secs)
-    df['elapsedt1'] = df['elapsedswim'] + df['t1time'].apply(parse_time_to_secs)
-    df['elapsedbike'] = df['elapsedt1'] + df['biketime'].apply(parse_time_to_secs)
-    df['elapsedt2'] = df['elapsedbike'] + df['t2time'].apply(parse_time_to_secs)
-    df['elapsedrun'] = df['elapsedt2'] + df['runtime'].apply(parse_time_to_secs)
-
-    # Ensure all elapsed columns are int64 and no NaN/inf
-    for col in ['elapsedswim','elapsedt1','elapsedbike','elapsedt2','elapsedrun']:
-        if col in df:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('int64')
+    if df is None:
+        df = read_table('race_results')
+    else:
+        df = apply_dtypes(df.copy(), 'race_results')
 
-    # Parse individual split seconds for filtering
-    df['swimsecs'] = df['swimtime'].apply(parse_time_to_secs)
-    df['t1secs'] = df['t1time'].apply(parse_time_to_secs)
-    df['bikesecs'] = df['biketime'].apply(parse_time_to_secs)
-    df['t2secs'] = df['t2time'].apply(parse_time_to_secs)
-    df['runsecs'] = df['runtime'].apply(parse_time_to_secs)
-    
-    # Apply outlier check per group for each split segment
-    for col in ['swimsecs', 't1secs', 'bikesecs', 't2secs', 'runsecs']:
-        df[col] = df.groupby(['event_id','prog_id'])[col].transform(lambda s: adjust_outlier(s, 2))
+    # Parse individual split seconds once; 0 means missing
+    for seg, col in [('swim', 'swimtime'), ('t1', 't1time'), ('bike', 'biketime'), ('t2', 't2time'), ('run', 'runtime')]:
+        df[f'{seg}secs'] = parse_times_to_secs(df[col])
+
+    # Calculate elapsed times at each checkpoint (cumulative)
+    df['elapsedswim'] = df['swimsecs']
+    df['elapsedt1'] = df['elapsedswim'] + df['t1secs']
+    df['elapsedbike'] = df['elapsedt1'] + df['bikesecs']
+    df['elapsedt2'] = df['elapsedbike'] + df['t2secs']
+    df['elapsedrun'] = df['elapsedt2'] + df['runsecs']
+
+    # Flag impossible, mis-timed and swapped splits across all races in one pass and drop them
+    # from the split-based filters and rankings below
+    split_cols = ['swimsecs', 't1secs', 'bikesecs', 't2secs', 'runsecs']
+    flags, robust_z = flag_splits(df)
+    split_flags = flags_to_table(df, flags, robust_z)
+    df[split_cols] = df[split_cols].mask(flags.notna())
 
     # Compute seconds behind leader per event_id + prog_id
     min_swim = df[df['swimsecs'] > 0].groupby(['event_id','prog_id'])['elapsedswim'].transform('min').fillna(0)
@@ -99,15 +104,6 @@ def calculate_position_metrics():
     mask_run_rank = df['runsecs'] > 0
     df.loc[mask_run_rank, 'runrank'] = df.loc[mask_run_rank].groupby(['event_id', 'prog_id'])['runsecs'].rank(method='min')
 
-    position_cols = [
-        'position_at_swim', 'position_at_t1', 'position_at_bike', 'position_at_t2', 'position_at_run',
-        'swim_to_t1_pos_change', 't1_to_bike_pos_change', 'bike_to_t2_pos_change', 't2_to_run_pos_change',
-        'swimrank', 't1rank', 'bikerank', 't2rank', 'runrank'
-    ]
-
-    for col in position_cols:
-        df[col] = df[col].astype('Int64')  # Nullable integer type
-
     for col in ['behindswim','behindt1','behindbike','behindt2','behindrun']:
         if col in df:
             df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('int64')
@@ -123,18 +119,66 @@ def calculate_position_metrics():
         errors='ignore',
         inplace=True
     )
+    # Positions and ranks are nullable int16, elapsed and behind seconds int32
+    df = apply_dtypes(df, 'position_metrics')
+    if return_flags:
+        return df, split_flags
     return df
 
 # Save the calculated metrics to a database or file
 def main():
-    df = calculate_position_metrics()
+    with stage("position_metrics") as st:
+        df, split_flags = calculate_position_metrics(return_flags=True)
+        st.rows = len(df)
     if df.empty:
         print("No valid data available for metrics calculation.")
         return
 
     engine = get_engine()
-    df.to_sql('position_metrics', engine, if_exists='replace', index=False, method='multi')
+    with db_statement("replace_position_metrics", rows=len(df)):
+        df.to_sql('position_metrics', engine, if_exists='replace', index=False, method='multi')
+    with db_statement("replace_split_flags", rows=len(split_flags)):
+        split_flags.to_sql('split_flags', engine, if_exists='replace', index=False, method='multi')
+    create_query_indexes(engine)
+    invalidate_tables('position_metrics', 'split_flags')
+    print(f"Flagged {len(split_flags)} splits: {split_flags['flag'].value_counts().to_dict()}")
+    # position_metrics was just replaced, so every race's packs are rebuilt, not only new races
+    with stage("pack_metrics") as st:
+        st.rows = update_pack_metrics(engine, full=True)
+
+def update_race_metrics(prog_ids, engine=None):
+    """
+    Recompute position, split-flag, pack and pace metrics for the given programs only:
+    their rows are deleted from the metric tables and rebuilt from race_results.
+    Returns the number of position_metrics rows written.
+    """
+    from tri_analysis.pace import update_pace_metrics
+    prog_ids = sorted({int(p) for p in prog_ids})
+    if not prog_ids:
+        return 0
+    engine = engine or get_engine()
+    in_progs = bindparam("prog_ids", expanding=True)
+    with engine.connect() as conn:
+        results = pd.read_sql(text("SELECT * FROM race_results WHERE prog_id IN :prog_ids").bindparams(in_progs),
+                              conn, params={"prog_ids": prog_ids})
+    df, split_flags = calculate_position_metrics(results, return_flags=True)
+    with db_statement("replace_race_metrics", rows=len(df)), engine.begin() as conn:
+        for table in ("position_metrics", "split_flags", "pack_metrics", "pace_metrics"):
+            conn.execute(text(f"DELETE FROM {table} WHERE prog_id IN :prog_ids").bindparams(in_progs),
+                         {"prog_ids": prog_ids})
+        df.to_sql('position_metrics', conn, if_exists='append', index=False, method='multi')
+        split_flags.to_sql('split_flags', conn, if_exists='append', index=False, method='multi')
+    invalidate_tables('position_metrics', 'split_flags', 'pack_metrics', 'pace_metrics')
+    # Both are incremental, so they only pick up the races just cleared
+    update_pack_metrics(engine)
+    update_pace_metrics(engine)
+    return len(df)
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = add_profile_arguments(argparse.ArgumentParser(description="Rebuild position, split-flag and pack metrics."))
+    args = parser.parse_args()
+    with profiled(args, "metrics"):
+        main()
+    export_run_report("metrics")
 
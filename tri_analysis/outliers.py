@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+from tri_analysis.dtypes import apply_dtypes
+
+SEGMENTS = ['swim', 't1', 'bike', 't2', 'run']
+
+# Physically plausible split range in seconds for any distance fetched (api_handling.fetch_program_ids),
+# from Mixed Relay legs (about 300 m / 5-7 km / 1.5-2 km) to standard. Floors sit below the fastest
+# relay leg; anything that is merely slow for a longer race is left to the race-median check.
+PLAUSIBLE_SECS = {
+    'swim': (120, 5400),
+    't1':   (10, 600),
+    'bike': (300, 14400),
+    't2':   (5, 600),
+    'run':  (150, 9000),
+}
+
+# A split is an outlier when it is this far from the race median, both in robust z-score
+# (median/MAD) and as a ratio, so a very tight field can't flag normal variation
+ROBUST_Z = 6.0
+FAST_RATIO = 0.6
+SLOW_RATIO = 2.5
+MAD_SCALE = 1.4826
+
+def flag_splits(df):
+    """
+    Flag bad split times across all races in one vectorized pass.
+
+    df needs event_id, prog_id and the per-segment seconds columns swimsecs..runsecs (0 = missing).
+    Per (race, segment) median and MAD are computed once with grouped transforms. Returns
+    (flags, robust_z): two frames aligned with df, one column per seconds column. flags holds None or:
+      impossible - outside the plausible range for the segment
+      outlier    - far from the race median (mis-timed chip)
+      swapped    - this split and an adjacent one each look like the other's segment
+    """
+    keys = [df['event_id'], df['prog_id']]
+    cols = [f'{s}secs' for s in SEGMENTS]
+    secs = df[cols].astype('float64').where(df[cols].fillna(0) > 0)
+    med = secs.groupby(keys).transform('median')
+    mad = (secs - med).abs().groupby(keys).transform('median') * MAD_SCALE
+    # Guard against a zero MAD (identical splits) with a one-second floor
+    z = (secs - med) / mad.clip(lower=1.0)
+    ratio = secs / med
+    off = (ratio < FAST_RATIO) | (ratio > SLOW_RATIO)
+
+    flags = pd.DataFrame(None, index=df.index, columns=cols, dtype=object)
+    for col in cols:
+        flags.loc[(z[col].abs() > ROBUST_Z) & off[col], col] = 'outlier'
+
+    for seg, col in zip(SEGMENTS, cols):
+        low, high = PLAUSIBLE_SECS[seg]
+        flags.loc[(secs[col] < low) | (secs[col] > high), col] = 'impossible'
+
+    # Swapped fields: adjacent splits that are both off and each closer to the other segment's median
+    for a, b in zip(cols, cols[1:]):
+        swapped = (
+            off[a] & off[b]
+            & ((secs[a] - med[b]).abs() < (secs[a] - med[a]).abs())
+            & ((secs[b] - med[a]).abs() < (secs[b] - med[b]).abs())
+        )
+        flags.loc[swapped, [a, b]] = 'swapped'
+    return flags, z
+
+def flags_to_table(df, flags, z):
+    """Turn the wide frames from flag_splits into split_flags rows, one per flagged split."""
+    cols = [f'{s}secs' for s in SEGMENTS]
+    rows, col_pos = np.nonzero(flags[cols].notna().to_numpy())
+    out = pd.DataFrame({
+        'athlete_id': df['athlete_id'].to_numpy()[rows],
+        'event_id': df['event_id'].to_numpy()[rows],
+        'prog_id': df['prog_id'].to_numpy()[rows],
+        'segment': np.array(SEGMENTS, dtype=object)[col_pos],
+        'seconds': df[cols].to_numpy(dtype='float64', na_value=np.nan)[rows, col_pos],
+        'flag': flags[cols].to_numpy()[rows, col_pos],
+        'robust_z': z[cols].to_numpy(dtype='float64')[rows, col_pos].round(2),
+    })
+    return apply_dtypes(out, 'split_flags')
+
+def detect_split_outliers(df):
+    """Flag bad splits in df and return them in split_flags table form."""
+    return flags_to_table(df, *flag_splits(df))
@@ -0,0 +1,93 @@
+from database import get_engine
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+from tri_analysis.dtypes import apply_dtypes
+from tri_analysis.metrics import parse_times_to_secs
+from tri_analysis.outliers import flag_splits
+from tri_analysis.queries import invalidate_tables
+
+DELETE_CHUNK = 5000   # prog_ids per IN (...) when clearing rewritten programs
+
+PACE_COLS = ['swim_sec_per_100m', 'bike_kmh', 'run_sec_per_km', 'swim_pct', 'bike_pct', 'run_pct']
+
+def _to_km(distance, max_km):
+    # Program distances are in km; anything above max_km must have been entered in metres
+    distance = pd.to_numeric(distance, errors='coerce')
+    distance = distance.where(distance <= max_km, distance / 1000)
+    return distance.where(distance > 0)
+
+def compute_paces(results, events):
+    """
+    Normalize splits by program distance.
+
+    results needs event_id, prog_id, athlete_id, swimtime, t1time, biketime, t2time and runtime;
+    events needs event_id, prog_id and swim/bike/run_distance. Flagged splits (see outliers.py)
+    and missing distances give null paces. Percentiles are within the race, 1.0 = fastest.
+    """
+    df = results[['event_id', 'prog_id', 'athlete_id']].copy()
+    for seg in ['swim', 't1', 'bike', 't2', 'run']:
+        df[f'{seg}secs'] = parse_times_to_secs(results[f'{seg}time'])
+    flags, _ = flag_splits(df)
+    secs = df[['swimsecs', 'bikesecs', 'runsecs']].astype('float64')
+    secs = secs.where((secs > 0) & flags[['swimsecs', 'bikesecs', 'runsecs']].isna())
+
+    dist = df[['event_id', 'prog_id']].merge(
+        events[['event_id', 'prog_id', 'swim_distance', 'bike_distance', 'run_distance']],
+        on=['event_id', 'prog_id'], how='left'
+    )
+    swim_km = _to_km(dist['swim_distance'], 10).to_numpy()
+    bike_km = _to_km(dist['bike_distance'], 300).to_numpy()
+    run_km = _to_km(dist['run_distance'], 50).to_numpy()
+
+    df['swim_sec_per_100m'] = secs['swimsecs'].to_numpy() / (swim_km * 10)
+    df['bike_kmh'] = bike_km / (secs['bikesecs'].to_numpy() / 3600)
+    df['run_sec_per_km'] = secs['runsecs'].to_numpy() / run_km
+
+    race = df.groupby(['event_id', 'prog_id'])
+    df['swim_pct'] = race['swim_sec_per_100m'].rank(ascending=False, pct=True)
+    df['bike_pct'] = race['bike_kmh'].rank(ascending=True, pct=True)
+    df['run_pct'] = race['run_sec_per_km'].rank(ascending=False, pct=True)
+    df[PACE_COLS] = df[PACE_COLS].replace([np.inf, -np.inf], np.nan).round(3)
+    return apply_dtypes(df[['athlete_id', 'event_id', 'prog_id'] + PACE_COLS].copy(), 'pace_metrics')
+
+def update_pace_metrics(engine=None, full=False, prog_ids=()):
+    """
+    Compute paces for programs in race_results that are not yet in pace_metrics and append them.
+    prog_ids are programs whose results were rewritten: their paces are deleted and computed
+    again. With full=True the table is rebuilt from every program.
+    """
+    engine = engine or get_engine()
+    prog_ids = sorted(set(int(p) for p in prog_ids))
+    with engine.begin() as conn:
+        if full:
+            conn.execute(text("DELETE FROM pace_metrics"))
+            invalidate_tables('pace_metrics')
+        elif prog_ids:
+            delete = text("DELETE FROM pace_metrics WHERE prog_id IN :prog_ids").bindparams(
+                bindparam("prog_ids", expanding=True))
+            for i in range(0, len(prog_ids), DELETE_CHUNK):
+                conn.execute(delete, {"prog_ids": prog_ids[i:i + DELETE_CHUNK]})
+            invalidate_tables('pace_metrics')
+        results = pd.read_sql(text("""
+            SELECT r.event_id, r.prog_id, r.athlete_id, r.swimtime, r.t1time, r.biketime, r.t2time, r.runtime
+            FROM race_results r
+            WHERE NOT EXISTS (
+                SELECT 1 FROM pace_metrics p
+                WHERE p.event_id = r.event_id AND p.prog_id = r.prog_id
+            )
+        """), conn)
+        if results.empty:
+            print("No new programs for pace metrics.")
+            return 0
+        events = pd.read_sql(text("""
+            SELECT event_id, prog_id, swim_distance, bike_distance, run_distance FROM events
+        """), conn)
+    paces = compute_paces(results, events)
+    paces.to_sql('pace_metrics', engine, if_exists='append', index=False, method='multi', chunksize=10000)
+    invalidate_tables('pace_metrics')
+    print(f"Wrote {len(paces)} pace rows for {results[['event_id', 'prog_id']].drop_duplicates().shape[0]} new or rewritten programs.")
+    return len(paces)
+
+if __name__ == "__main__":
+    update_pace_metrics()
@@ -0,0 +1,87 @@
+from database import get_engine
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from tri_analysis.dtypes import apply_dtypes
+from tri_analysis.queries import invalidate_tables
+
+CHECKPOINTS = ['swim', 't1', 'bike', 't2', 'run']
+
+# A gap larger than this (seconds) between consecutive athletes at a checkpoint starts a new pack
+PACK_GAP_SECONDS = {'swim': 3, 't1': 5, 'bike': 10, 't2': 10, 'run': 5}
+
+def detect_packs(df, gap_seconds=PACK_GAP_SECONDS):
+    """
+    Group athletes into packs at every checkpoint of every race.
+
+    df needs athlete_id, event_id, prog_id and the elapsed<checkpoint>/position_at_<checkpoint>
+    columns from position_metrics; athletes without a position at a checkpoint are skipped there.
+    All races are handled in one sort of (race, checkpoint, elapsed), so the cost is O(n log n)
+    overall. Returns one row per athlete and checkpoint with pack_id (1 = front pack), pack_size
+    and gap_to_pack_ahead in seconds (null for the front pack).
+    """
+    keys = ['event_id', 'prog_id', 'athlete_id']
+    frames = []
+    for cp in CHECKPOINTS:
+        valid = df[f'position_at_{cp}'].notna() & (df[f'elapsed{cp}'] > 0)
+        part = df.loc[valid, keys].copy()
+        part['checkpoint'] = cp
+        part['elapsed'] = df.loc[valid, f'elapsed{cp}'].to_numpy(dtype=np.int64)
+        part['threshold'] = gap_seconds[cp]
+        frames.append(part)
+    long = pd.concat(frames, ignore_index=True)
+    if long.empty:
+        return pd.DataFrame(columns=keys + ['checkpoint', 'pack_id', 'pack_size', 'gap_to_pack_ahead'])
+
+    long = long.sort_values(['event_id', 'prog_id', 'checkpoint', 'elapsed'], kind='stable', ignore_index=True)
+    ev, pr, cp = (long[c].to_numpy() for c in ('event_id', 'prog_id', 'checkpoint'))
+    elapsed = long['elapsed'].to_numpy()
+
+    # A new group starts wherever the race or checkpoint changes; a new pack wherever the gap is too big
+    new_group = np.ones(len(long), dtype=bool)
+    new_group[1:] = (ev[1:] != ev[:-1]) | (pr[1:] != pr[:-1]) | (cp[1:] != cp[:-1])
+    gap = np.zeros(len(long), dtype=np.int64)
+    gap[1:] = elapsed[1:] - elapsed[:-1]
+    new_pack = new_group | (gap > long['threshold'].to_numpy())
+
+    pack_seq = np.cumsum(new_pack)
+    group_start_pack = pack_seq[np.flatnonzero(new_group)]
+    group_seq = np.cumsum(new_group) - 1
+    long['pack_id'] = pack_seq - group_start_pack[group_seq] + 1
+    long['pack_size'] = np.bincount(pack_seq)[pack_seq]
+    # Gap to the pack ahead is the gap at the first athlete of each pack, shared by the whole pack
+    lead_gap = np.where(new_pack & ~new_group, gap, -1)
+    long['gap_to_pack_ahead'] = pd.Series(lead_gap[np.flatnonzero(new_pack)][pack_seq - 1]).replace(-1, pd.NA)
+
+    out = long[keys + ['checkpoint', 'pack_id', 'pack_size', 'gap_to_pack_ahead']].copy()
+    return apply_dtypes(out, 'pack_metrics')
+
+def update_pack_metrics(engine=None, full=False):
+    """
+    Compute packs for races in position_metrics that are not yet in pack_metrics and append them.
+    With full=True the table is rebuilt from every race.
+    """
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        if full:
+            conn.execute(text("DELETE FROM pack_metrics"))
+        df = pd.read_sql(text("""
+            SELECT pm.* FROM position_metrics pm
+            WHERE NOT EXISTS (
+                SELECT 1 FROM pack_metrics pk
+                WHERE pk.event_id = pm.event_id AND pk.prog_id = pm.prog_id
+            )
+        """), conn)
+    if full:
+        invalidate_tables('pack_metrics')
+    if df.empty:
+        print("No new races for pack metrics.")
+        return 0
+    packs = detect_packs(df)
+    packs.to_sql('pack_metrics', engine, if_exists='append', index=False, method='multi', chunksize=10000)
+    invalidate_tables('pack_metrics')
+    print(f"Wrote {len(packs)} pack rows for {df[['event_id', 'prog_id']].drop_duplicates().shape[0]} new races.")
+    return len(packs)
+
+if __name__ == "__main__":
+    update_pack_metrics()
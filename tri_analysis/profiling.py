@@ -0,0 +1,155 @@
+"""
+On-demand profiling of pipeline stages, switched on with --profile.
+
+profile_stage() wraps one stage with either cProfile (deterministic, exact call counts) or a
+sampling profiler (low overhead, walks every thread's stack every PROFILE_SAMPLE_INTERVAL
+seconds), and optionally tracemalloc. Each profiled stage gets its own run directory with:
+  - hotpaths.txt     functions sorted by cumulative and own time (or sample counts)
+  - profile.pstats   raw cProfile stats (snakeviz, speedscope, flameprof) - cProfile mode
+  - stacks.folded    collapsed stacks for flamegraph.pl / speedscope - sampling mode
+  - allocations.txt  top allocation sites and growth over the stage - with --profile-memory
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from config import PROFILE_DIR
+
+PROFILE_MODES = ("cprofile", "sample")
+PROFILE_SAMPLE_INTERVAL = 0.005   # seconds between stack samples
+TOP_N = 50
+
+class StackSampler:
+    """Background thread that samples the stacks of all other threads into collapsed-stack counts."""
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            names.update({t.ident: t.name for t in threading.enumerate()})
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def hotpaths(self) -> str:
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if frames:
+                own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+        total = sum(self.stacks.values()) or 1
+        lines = [f"{self.samples} samples every {self.interval * 1000:.1f} ms\n", "\nBy own samples:"]
+        lines += [f"{n:8d} {n / total:6.1%}  {frame}" for frame, n in own.most_common(TOP_N)]
+        lines.append("\nBy inclusive samples:")
+        lines += [f"{n:8d} {n / total:6.1%}  {frame}" for frame, n in inclusive.most_common(TOP_N)]
+        return "\n".join(lines) + "\n"
+
+def _pstats_report(profiler: cProfile.Profile) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    out.write("=== By cumulative time ===\n")
+    stats.sort_stats("cumulative").print_stats(TOP_N)
+    out.write("\n=== By own time ===\n")
+    stats.sort_stats("tottime").print_stats(TOP_N)
+    return out.getvalue()
+
+def _allocations_report(before, after) -> str:
+    lines = ["=== Largest live allocations at end of stage ==="]
+    lines += [str(stat) for stat in after.statistics("lineno")[:TOP_N]]
+    lines.append("\n=== Growth over the stage ===")
+    lines += [str(stat) for stat in after.compare_to(before, "lineno")[:TOP_N]]
+    current, peak = tracemalloc.get_traced_memory()
+    lines.append(f"\nTraced memory: current {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB")
+    return "\n".join(lines) + "\n"
+
+@contextmanager
+def profile_stage(name: str, mode: str = "cprofile", memory: bool = False, directory: str = PROFILE_DIR):
+    """Profile the enclosed block and write its reports to <directory>/<name>_<timestamp>/."""
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+    run_dir = os.path.join(directory, f"{name}_{datetime.now():%Y%m%dT%H%M%S}")
+    os.makedirs(run_dir, exist_ok=True)
+
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(25)
+    before = tracemalloc.take_snapshot() if memory else None
+    profiler = cProfile.Profile() if mode == "cprofile" else None
+    sampler = StackSampler() if mode == "sample" else None
+    started = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    else:
+        sampler.start()
+    try:
+        yield run_dir
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(run_dir, "profile.pstats"))
+            report = _pstats_report(profiler)
+        else:
+            sampler.stop()
+            with open(os.path.join(run_dir, "stacks.folded"), "w") as f:
+                f.write(sampler.folded())
+            report = sampler.hotpaths()
+        with open(os.path.join(run_dir, "hotpaths.txt"), "w") as f:
+            f.write(f"Stage '{name}' ({mode}) took {time.perf_counter() - started:.2f}s\n\n{report}")
+        if memory:
+            with open(os.path.join(run_dir, "allocations.txt"), "w") as f:
+                f.write(_allocations_report(before, tracemalloc.take_snapshot()))
+            if started_tracing:
+                tracemalloc.stop()
+        print(f"Profile for '{name}' written to {run_dir}")
+
+def add_profile_arguments(parser):
+    """Add --profile, --profile-mode, --profile-memory and --profile-dir to an argparse parser."""
+    # A plain flag, so `main.py --profile sync` does not read the subcommand as the mode
+    parser.add_argument("--profile", action="store_true", help="profile the run")
+    parser.add_argument("--profile-mode", choices=PROFILE_MODES, default="cprofile",
+                        help="cProfile (default) or the sampling profiler")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="also track allocations with tracemalloc")
+    parser.add_argument("--profile-dir", default=PROFILE_DIR, help="where profile run directories go")
+    return parser
+
+def profiled(args, name: str):
+    """profile_stage() configured from parsed --profile arguments, or a no-op without --profile."""
+    if not getattr(args, "profile", False):
+        return nullcontext()
+    return profile_stage(name, args.profile_mode, args.profile_memory, args.profile_dir)
@@ -0,0 +1,194 @@
+"""
+Read-side query API over the warehouse, for notebooks, reports and ad-hoc scripts.
+
+Each query is a typed function that returns a DataFrame with the dtype policy applied. Results
+are kept in an in-process LRU with a TTL (QUERY_CACHE_SIZE entries, QUERY_CACHE_TTL seconds).
+Every entry is tagged with the tables it reads. The ETL write paths (upsert_tables, metrics,
+packs, pace) call invalidate_tables() after writing, which drops the entries that depend on
+those tables. Writes made by another process are picked up once the TTL expires. Cached frames
+are shared between callers, so treat them as read-only.
+"""
+import datetime
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+from config import QUERY_CACHE_SIZE, QUERY_CACHE_TTL
+from database import get_engine
+from tri_analysis.dtypes import apply_dtypes
+
+class QueryCache:
+    """Thread-safe LRU of query results with a TTL, invalidated per table."""
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, tables, value)
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, tables, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, frozenset(tables), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tables) -> int:
+        tables = set(tables)
+        with self._lock:
+            stale = [key for key, (_, deps, _) in self._entries.items() if deps & tables]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+CACHE = QueryCache()
+
+def invalidate_tables(*tables: str) -> int:
+    """Write hook: drop cached results that read any of the given tables. Returns how many."""
+    return CACHE.invalidate(tables)
+
+def cached_query(*tables: str):
+    """Cache a query function's result per (arguments, engine URL), tagged with the tables it reads."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, engine=None, **kwargs):
+            key = (func.__name__, args, tuple(sorted(kwargs.items())), str(engine.url) if engine is not None else None)
+            result = CACHE.get(key)
+            if result is None:
+                result = func(*args, engine=engine or get_engine(), **kwargs)
+                CACHE.put(key, tables, result)
+            return result
+        return wrapper
+    return decorator
+
+def _read(engine, sql: str, params: dict, table: Optional[str] = None) -> pd.DataFrame:
+    with engine.connect() as conn:
+        df = pd.read_sql(text(sql), conn, params=params)
+    return apply_dtypes(df, table) if table else df
+
+def _finish_position(position: pd.Series) -> pd.Series:
+    # Positions are stored as text; DNF/DSQ and the like become NA
+    return pd.to_numeric(position.astype("object"), errors="coerce").astype("Int16")
+
+@cached_query("race_results", "event", "program", "position_metrics")
+def athlete_history(athlete_id: int, engine=None) -> pd.DataFrame:
+    """Every race of one athlete, oldest first, with splits, finish and checkpoint positions."""
+    df = _read(engine, """
+        SELECT e.event_date, e.event_name, e.event_country, p.prog_name, p.prog_distance_category,
+               r.event_id, r.prog_id, r.position, r.total_time,
+               r.swimtime, r.t1time, r.biketime, r.t2time, r.runtime,
+               pm.position_at_swim, pm.position_at_bike, pm.position_at_run
+        FROM race_results r
+        JOIN program p ON p.event_id = r.event_id AND p.prog_id = r.prog_id
+        JOIN event e ON e.event_id = r.event_id
+        LEFT JOIN position_metrics pm
+               ON pm.athlete_id = r.athlete_id AND pm.event_id = r.event_id AND pm.prog_id = r.prog_id
+        WHERE r.athlete_id = :athlete_id
+        ORDER BY e.event_date, r.prog_id
+    """, {"athlete_id": athlete_id}, "race_results")
+    df["finish"] = _finish_position(df["position"])
+    return apply_dtypes(df, "position_metrics")
+
+@cached_query("race_results", "athlete", "position_metrics")
+def program_results(event_id: int, prog_id: int, engine=None) -> pd.DataFrame:
+    """Result list of one program in finishing order (non-finishers last)."""
+    df = _read(engine, """
+        SELECT r.athlete_id, r.athlete_full_name, a.noc, r.position, r.total_time,
+               r.swimtime, r.t1time, r.biketime, r.t2time, r.runtime,
+               pm.position_at_swim, pm.position_at_t1, pm.position_at_bike, pm.position_at_t2,
+               pm.behindswim, pm.behindbike, pm.behindrun
+        FROM race_results r
+        LEFT JOIN athlete a ON a.athlete_id = r.athlete_id
+        LEFT JOIN position_metrics pm
+               ON pm.athlete_id = r.athlete_id AND pm.event_id = r.event_id AND pm.prog_id = r.prog_id
+        WHERE r.event_id = :event_id AND r.prog_id = :prog_id
+    """, {"event_id": event_id, "prog_id": prog_id}, "race_results")
+    df["finish"] = _finish_position(df["position"])
+    df = df.sort_values(["finish", "total_time"], na_position="last", kind="stable").reset_index(drop=True)
+    return apply_dtypes(df, "position_metrics")
+
+@cached_query("race_results", "event", "program")
+def head_to_head(athlete_a: int, athlete_b: int, engine=None) -> pd.DataFrame:
+    """
+    Races both athletes started, oldest first, with both finishing positions and the winner's id.
+    The winner is decided like the head-to-head matrix: only when both finished
+    (head_to_head.finish_seconds), by the faster total time; otherwise, or on equal times, NA.
+    """
+    from tri_analysis.head_to_head import finish_seconds   # head_to_head -> metrics imports this module
+    df = _read(engine, """
+        SELECT e.event_date, e.event_name, p.prog_name, a.event_id, a.prog_id,
+               a.position AS position_a, b.position AS position_b,
+               a.total_time AS total_time_a, b.total_time AS total_time_b
+        FROM race_results a
+        JOIN race_results b ON b.prog_id = a.prog_id AND b.event_id = a.event_id AND b.athlete_id = :b
+        JOIN program p ON p.event_id = a.event_id AND p.prog_id = a.prog_id
+        JOIN event e ON e.event_id = a.event_id
+        WHERE a.athlete_id = :a
+        ORDER BY e.event_date, a.prog_id
+    """, {"a": athlete_a, "b": athlete_b})
+    secs_a = finish_seconds(df["position_a"], df["total_time_a"])
+    secs_b = finish_seconds(df["position_b"], df["total_time_b"])
+    winner = pd.Series(pd.NA, index=df.index, dtype="Int32")
+    winner[(secs_a < secs_b).fillna(False)] = athlete_a
+    winner[(secs_b < secs_a).fillna(False)] = athlete_b
+    df["winner"] = winner
+    return df
+
+# Pace column per segment and whether higher is better
+LEADERBOARD_SEGMENTS = {
+    "swim": ("swim_sec_per_100m", True),
+    "bike": ("bike_kmh", False),
+    "run": ("run_sec_per_km", True),
+}
+
+@cached_query("pace_metrics", "program", "event", "athlete")
+def leaderboard(distance: str, segment: str, limit: int = 20, year: Optional[int] = None, engine=None) -> pd.DataFrame:
+    """
+    Best distance-normalized pace per athlete for one segment ('swim', 'bike' or 'run') over
+    programs of one distance category (e.g. 'standard', 'sprint'), optionally within one year.
+    Categories are stored lower-case (upsert_tables.split_events), so the lookup uses
+    idx_program_distance; the year becomes an event_date range on idx_event_date.
+    """
+    if segment not in LEADERBOARD_SEGMENTS:
+        raise ValueError(f"Unknown segment '{segment}', expected one of {sorted(LEADERBOARD_SEGMENTS)}")
+    column, ascending = LEADERBOARD_SEGMENTS[segment]
+    params = {"distance": distance.strip().lower()}
+    in_year = ""
+    if year is not None:
+        in_year = "AND e.event_date >= :year_start AND e.event_date < :year_end"
+        params.update(year_start=datetime.date(year, 1, 1), year_end=datetime.date(year + 1, 1, 1))
+    df = _read(engine, f"""
+        SELECT pc.athlete_id, a.full_name, a.noc, pc.{column} AS pace, pc.event_id, pc.prog_id,
+               e.event_name, e.event_date
+        FROM program p
+        JOIN pace_metrics pc ON pc.prog_id = p.prog_id AND pc.event_id = p.event_id
+        JOIN event e ON e.event_id = p.event_id
+        LEFT JOIN athlete a ON a.athlete_id = pc.athlete_id
+        WHERE p.prog_distance_category = :distance AND pc.{column} IS NOT NULL {in_year}
+    """, params)
+    df = df.sort_values("pace", ascending=ascending, kind="stable").drop_duplicates("athlete_id")
+    df = df.head(limit).reset_index(drop=True)
+    df.insert(0, "rank", range(1, len(df) + 1))
+    return df
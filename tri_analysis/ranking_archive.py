@@ -0,0 +1,94 @@
+"""
+Immutable local archive of fetched historical ranking pages.
+
+Pages are stored gzip-compressed under their SHA-256 (pages/<sha>.html.gz), so identical content
+is stored once and never rewritten. manifest.json maps each "series/year/gender" to the current
+page hash and to the hash that was last staged into the database, which lets the pipeline skip
+seasons that are archived and unchanged.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+from config import RANKINGS_ARCHIVE_DIR
+
+class RankingArchive:
+    """Content-hashed page store plus a per-(series, year, gender) manifest."""
+
+    def __init__(self, root: str = RANKINGS_ARCHIVE_DIR):
+        self.root = root
+        self.pages_dir = os.path.join(root, 'pages')
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self._lock = threading.Lock()
+        os.makedirs(self.pages_dir, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {}
+
+    @staticmethod
+    def key(series: str, year: int, gender: str) -> str:
+        return f"{series}/{year}/{gender}"
+
+    def get(self, series: str, year: int, gender: str):
+        """Return the manifest entry for a season page, or None if it was never archived."""
+        return self.manifest.get(self.key(series, year, gender))
+
+    def read(self, sha256: str) -> bytes:
+        with gzip.open(os.path.join(self.pages_dir, f"{sha256}.html.gz"), 'rb') as f:
+            return f.read()
+
+    def put(self, series: str, year: int, gender: str, url: str, content: bytes, athlete_count: int) -> str:
+        """Store a fetched page (once per distinct content) and point the manifest at it."""
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = os.path.join(self.pages_dir, f"{sha256}.html.gz")
+        if not os.path.exists(path):
+            tmp = f"{path}.tmp"
+            with gzip.open(tmp, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, path)
+        with self._lock:
+            entry = self.manifest.setdefault(self.key(series, year, gender), {})
+            entry.update({
+                'status': 'available',
+                'url': url,
+                'sha256': sha256,
+                'athlete_count': athlete_count,
+                'fetched_at': datetime.now().isoformat(timespec='seconds'),
+            })
+            self._save()
+        return sha256
+
+    def put_missing(self, series: str, year: int, gender: str, url: str, status_code: int):
+        """Remember that a season page does not exist, so past seasons aren't requested again."""
+        with self._lock:
+            self.manifest[self.key(series, year, gender)] = {
+                'status': 'missing',
+                'url': url,
+                'http_status': status_code,
+                'fetched_at': datetime.now().isoformat(timespec='seconds'),
+            }
+            self._save()
+
+    def needs_staging(self, series: str, year: int, gender: str) -> bool:
+        """True unless the archived page for this season was already staged with the same content."""
+        entry = self.get(series, year, gender)
+        return not entry or entry.get('staged_sha256') != entry.get('sha256')
+
+    def mark_staged(self, series: str, year: int, gender: str):
+        with self._lock:
+            entry = self.manifest.get(self.key(series, year, gender))
+            if entry:
+                entry['staged_sha256'] = entry.get('sha256')
+                entry['staged_at'] = datetime.now().isoformat(timespec='seconds')
+                self._save()
+
+    def _save(self):
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
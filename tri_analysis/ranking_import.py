@@ -1,82 +1,126 @@
-# --- New script: Data_Import/rankings_import.py ---
+# --- Live rankings import from the World Triathlon API ---
 import sys
 import os
+import concurrent.futures
+import datetime
 import requests
 import pandas as pd
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from config.config import HEADERS, BASE_URL, DB_URI
-from Data_Import.database import get_engine
+from sqlalchemy import text
+from database import get_engine
+from config import BASE_URL, RANKING_CATEGORY_IDS, RANKING_PAGE_SIZE
+from tri_analysis.api_handling import _get, api_run
+from tri_analysis.upsert_tables import upsert_athlete_rankings, upsert_ranking_snapshots
+from tri_analysis.instrumentation import stage, export_run_report
 
 load_dotenv()
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-def fetch_rankings(ranking_cat_id: int, limit: int = 200) -> pd.DataFrame:
+def fetch_ranking_page(ranking_cat_id: int, offset: int = 0, limit: int = RANKING_PAGE_SIZE) -> dict:
     """
-    Pulls the ranking snapshot for a given category, returns a normalized DataFrame.
+    Fetch one page of a ranking category. Returns the API's 'data' object
+    (ranking_cat_name, ranking_id, published, rankings).
     """
     url = f"{BASE_URL}/rankings/{ranking_cat_id}"
-    resp = requests.get(url, headers=HEADERS, params={'limit': limit})
+    resp = _get("ranking_page", url, params={'limit': limit, 'offset': offset})
     resp.raise_for_status()
-    js = resp.json()['data']
+    return resp.json()['data']
 
-    # build records list
-    records = []
-    for r in js.get('rankings', []):
-        records.append({
-            'athlete_id':     r['athlete_id'],
-            'athlete_name':   r['athlete_full_name'],
-            'ranking_cat_name': js['ranking_cat_name'],
-            'ranking_cat_id': js['ranking_id'],
-            'rank_position':  r['rank'],
-            'total_points':   r['total'],
-            'year':           2025,  # Assuming all rankings are for the year 2025
-            'retrieved_at':   pd.to_datetime(js['published']).date()
-        })
-    return pd.DataFrame(records)
-
-
-def upsert_rankings(df: pd.DataFrame, engine):
+def rankings_to_frame(js: dict, rankings: list) -> pd.DataFrame:
     """
-    Batch upsert into athlete_rankings with ON CONFLICT on (athlete_name, ranking_cat_name, year, retrieved_at).
+    Normalize ranking entries into staging_rankings-shaped rows. The snapshot is keyed by its
+    publish date (retrieved_at) and the season is the publish date's year.
+    """
+    published = pd.to_datetime(js['published']).date()
+    return pd.DataFrame({
+        'athlete_id':       [r['athlete_id'] for r in rankings],
+        'athlete_name':     [r['athlete_full_name'] for r in rankings],
+        'ranking_cat_name': js['ranking_cat_name'],
+        'ranking_cat_id':   js['ranking_id'],
+        'rank_position':    [r['rank'] for r in rankings],
+        'total_points':     [r['total'] for r in rankings],
+        'year':             published.year,
+        'retrieved_at':     published,
+    })
+
+def fetch_rankings(ranking_cat_id: int, known_published=None, page_size: int = RANKING_PAGE_SIZE):
     """
-    if df.empty:
-        return
+    Fetch the full ranking list of a category, paging until a short page.
 
-    insert_sql = text(
-        """
-        INSERT INTO athlete_rankings (
-            athlete_id, athlete_name, ranking_cat_name, ranking_cat_id, rank_position, total_points, year, retrieved_at
-        ) VALUES (
-            :athlete_id, :athlete_name, :ranking_cat_name, :ranking_cat_id, :rank_position, :total_points, :year, :retrieved_at
-        )
-        ON CONFLICT (athlete_name, ranking_cat_name, year, retrieved_at) DO UPDATE SET
-            rank_position = EXCLUDED.rank_position,
-            total_points  = EXCLUDED.total_points;
-        """
-    )
-    with engine.begin() as conn:
-        conn.execute(insert_sql, df.to_dict(orient='records'))
+    If the first page's publish date is not newer than known_published, the snapshot is
+    already stored and None is returned without fetching further pages.
+    """
+    js = fetch_ranking_page(ranking_cat_id, 0, page_size)
+    published = pd.to_datetime(js['published']).date()
+    if known_published is not None and published <= known_published:
+        return None
+    rankings = list(js.get('rankings', []))
+    page = rankings
+    while len(page) == page_size:
+        page = fetch_ranking_page(ranking_cat_id, len(rankings), page_size).get('rankings', [])
+        # Stop if the endpoint ignores the offset and repeats the first page
+        if page and rankings and page[0] == rankings[0]:
+            break
+        rankings.extend(page)
+    df = rankings_to_frame(js, rankings)
+    return df.drop_duplicates(subset=['athlete_name', 'ranking_cat_name', 'year', 'retrieved_at'])
 
+def latest_snapshots(engine, ranking_ids) -> dict:
+    """
+    Latest imported live publish date per ranking category. Read from ranking_snapshots, not
+    athlete_rankings, whose rows from the historical scraper carry the scrape date.
+    """
+    query = text("""
+        SELECT ranking_cat_id, MAX(published) AS published
+        FROM ranking_snapshots
+        GROUP BY ranking_cat_id
+    """)
+    with engine.connect() as conn:
+        rows = conn.execute(query).fetchall()
+    latest = {cat: pd.to_datetime(published).date() for cat, published in rows if published is not None}
+    return {cat: latest.get(cat) for cat in ranking_ids}
 
-def import_rankings():
+def import_rankings(ranking_ids=RANKING_CATEGORY_IDS, max_workers=None):
     """
     Fetch and persist rankings for each desired ranking category.
+
+    Categories are fetched concurrently; only snapshots with a publish date newer than the
+    latest stored one are paged through and written.
     """
+    if not ranking_ids:
+        print("No ranking categories to import.")
+        return 0
     engine = get_engine()
-    # list of ranking_cat_ids to import (e.g. 13 for Elite Men, 14 for Elite Women)
-    ranking_ids = [13, 14, 15, 16]
-    all_dfs = []
-    for cat in ranking_ids:
-        df = fetch_rankings(cat)
-        all_dfs.append(df)
+    known = latest_snapshots(engine, ranking_ids)
+    with api_run():
+        all_dfs = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or len(ranking_ids)) as executor:
+            futures = {executor.submit(fetch_rankings, cat, known[cat]): cat for cat in ranking_ids}
+            for future in concurrent.futures.as_completed(futures):
+                cat = futures[future]
+                try:
+                    df = future.result()
+                except requests.exceptions.RequestException as e:
+                    print(f"Failed to fetch ranking category {cat}: {e}")
+                    continue
+                if df is None:
+                    print(f"Ranking category {cat}: snapshot {known[cat]} already stored")
+                elif not df.empty:
+                    print(f"Ranking category {cat}: new snapshot {df['retrieved_at'].iloc[0]} ({len(df)} athletes)")
+                    all_dfs.append(df)
 
     if not all_dfs:
-        print("No ranking data fetched.")
-        return
+        print("No new ranking snapshots.")
+        return 0
     full = pd.concat(all_dfs, ignore_index=True)
-    upsert_rankings(full, engine)
+    with stage("rankings_upsert") as st:
+        st.rows = upsert_athlete_rankings(full, engine)
+    snapshots = full.groupby(['ranking_cat_id', 'retrieved_at']).size().reset_index(name='athletes')
+    snapshots = snapshots.rename(columns={'retrieved_at': 'published'}).assign(imported_at=datetime.datetime.now())
+    upsert_ranking_snapshots(snapshots, engine)
     print(f"Imported {len(full)} ranking records.")
+    return len(full)
 
 if __name__ == '__main__':
     import_rankings()
+    export_run_report("ranking_import")
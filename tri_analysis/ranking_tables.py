@@ -0,0 +1,182 @@
+"""
+Table-only extraction of ranking tables from old.triathlon.org pages.
+
+Instead of building a full BeautifulSoup tree, the page is tokenized as a stream and parsing
+stops as soon as the ranking table closes. Rows are converted straight into typed column lists.
+lxml's C parser is used when it is installed; otherwise the standard library's HTMLParser
+tokenizer is fed in chunks.
+"""
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional; the stdlib tokenizer handles the same layouts
+    etree = None
+
+# Header sets that identify the ranking table. The ITU layout has rank in the first column,
+# the WTCS layout has a leading column before rank and per-event columns after the total.
+ITU_HEADERS = {'rank', 'first name', 'last name', 'yob', 'country', 'points'}
+WTCS_HEADERS = {'rank', 'given name', 'family name', 'noc', 'events', 'totalpoints'}
+
+# (column, cell index, type) per layout, plus the minimum number of cells for a data row
+SCHEMAS = {
+    'itu': (6, [('rank', 0, int), ('given_name', 1, str), ('family_name', 2, str),
+                ('yob', 3, str), ('noc', 4, str), ('total_points', 5, float)]),
+    'wtcs': (8, [('rank', 1, int), ('given_name', 2, str), ('family_name', 3, str),
+                 ('yob', 4, str), ('noc', 5, str), ('events', 6, int), ('total_points', 7, float)]),
+}
+CHUNK_SIZE = 16384
+
+def detect_schema(header_cells):
+    """Return 'itu' or 'wtcs' when the header row matches a ranking layout, else None."""
+    cols = {c.strip().lower() for c in header_cells}
+    if ITU_HEADERS.issubset(cols):
+        return 'itu'
+    if WTCS_HEADERS.issubset(cols):
+        return 'wtcs'
+    return None
+
+class RankingTableBuilder:
+    """
+    Receives tables row by row and keeps typed columns for the first ranking table seen.
+    Rows whose rank cell isn't a number, or whose values don't convert, are skipped.
+    """
+
+    def __init__(self):
+        self.schema = None
+        self.columns = None
+        self.done = False
+
+    def header(self, cells):
+        schema = detect_schema(cells)
+        if schema:
+            self.schema = schema
+            self.columns = {name: [] for name, _, _ in SCHEMAS[schema][1]}
+        return schema is not None
+
+    def row(self, cells):
+        min_cells, fields = SCHEMAS[self.schema]
+        if len(cells) < min_cells or not cells[fields[0][1]].strip().isdigit():
+            return
+        try:
+            values = [(name, kind(cells[idx].strip())) for name, idx, kind in fields]
+        except ValueError:
+            return
+        for name, value in values:
+            self.columns[name].append(value)
+
+    def result(self):
+        if not self.schema:
+            return None
+        return {'schema': self.schema, 'columns': self.columns}
+
+class _StreamingTableParser(HTMLParser):
+    """Tokenizer that only tracks <table>/<tr>/<td>/<th> text and stops after the ranking table."""
+
+    def __init__(self, builder):
+        super().__init__(convert_charrefs=True)
+        self.builder = builder
+        self.depth = 0            # current table nesting depth
+        self.active_depth = None  # depth of the ranking table once found
+        self.first_row = {}       # depth -> True until that table's first row is seen
+        self.row = None
+        self.row_depth = None
+        self.cell = None
+        self.cell_is_th = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self.depth += 1
+            self.first_row[self.depth] = True
+        elif tag == 'tr' and self.depth:
+            self._close_row()
+            self.row, self.row_depth = [], self.depth
+        elif tag in ('td', 'th') and self.row is not None and self.depth == self.row_depth:
+            self._close_cell()
+            self.cell, self.cell_is_th = [], tag == 'th'
+
+    def handle_endtag(self, tag):
+        if tag in ('td', 'th'):
+            self._close_cell()
+        elif tag == 'tr':
+            self._close_row()
+        elif tag == 'table' and self.depth:
+            self._close_row()
+            if self.active_depth == self.depth:
+                self.builder.done = True
+            self.first_row.pop(self.depth, None)
+            self.depth -= 1
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+    def _close_cell(self):
+        if self.cell is not None:
+            self.row.append((''.join(self.cell), self.cell_is_th))
+            self.cell = None
+
+    def _close_row(self):
+        self._close_cell()
+        if self.row is None or self.builder.done:
+            self.row = None
+            return
+        depth, row = self.row_depth, self.row
+        self.row = None
+        if self.first_row.get(depth):
+            self.first_row[depth] = False
+            if self.active_depth is None and self.builder.header([text for text, _ in row]):
+                self.active_depth = depth
+        elif depth == self.active_depth:
+            # Data rows only count <td> cells, as in the original BeautifulSoup scraper
+            self.builder.row([text for text, is_th in row if not is_th])
+
+def _extract_stdlib(content):
+    builder = RankingTableBuilder()
+    parser = _StreamingTableParser(builder)
+    for start in range(0, len(content), CHUNK_SIZE):
+        parser.feed(content[start:start + CHUNK_SIZE])
+        if builder.done:
+            break
+    else:
+        parser.close()
+    return builder.result()
+
+def _cell_text(el):
+    return ''.join(el.itertext())
+
+def _extract_lxml(content):
+    builder = RankingTableBuilder()
+    parser = etree.HTMLPullParser(events=('end',), tag='table')
+    for start in range(0, len(content), CHUNK_SIZE):
+        parser.feed(content[start:start + CHUNK_SIZE])
+        for _, table in parser.read_events():
+            # Ranking tables are not nested, so only rows owned by this table are inspected
+            rows = [tr for tr in table.iter('tr') if next(tr.iterancestors('table')) is table]
+            if not rows:
+                continue
+            if builder.header([_cell_text(c) for c in rows[0] if c.tag in ('th', 'td')]):
+                for tr in rows[1:]:
+                    builder.row([_cell_text(c) for c in tr if c.tag == 'td'])
+                return builder.result()
+    parser.close()
+    return builder.result()
+
+def extract_ranking_table(content, backend=None):
+    """
+    Extract the ranking table from a page.
+
+    content is the page as bytes or str. backend is 'lxml', 'stdlib' or None (lxml if installed).
+    Returns {'schema': 'itu'|'wtcs', 'columns': {name: list}} or None if no ranking table exists.
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', errors='replace')
+    backend = backend or ('lxml' if etree is not None else 'stdlib')
+    if backend == 'lxml':
+        return _extract_lxml(content)
+    return _extract_stdlib(content)
+
+def columns_to_records(columns):
+    """Convert typed column lists back to the list-of-dicts shape used by the scraper."""
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*(columns[n] for n in names))]
@@ -0,0 +1,182 @@
+"""
+Deterministic synthetic data generator for events, programs and race results.
+
+Frames mirror the shapes of the events, athlete and race_results tables so they can be fed
+straight into metrics.py, upsert_tables.py and the benchmark runner without touching the API.
+The same seed and row count always produce identical frames.
+"""
+import numpy as np
+import pandas as pd
+
+# Typical elite split times in seconds (swim, t1, bike, t2, run) by distance category
+SEGMENT_MEANS = {
+    "sprint":   (570, 40, 1680, 25, 900),
+    "standard": (1110, 45, 3360, 28, 1860),
+}
+DISTANCES = {
+    # swim km, bike km, run km, swim laps, bike laps, run laps
+    "sprint":   (0.75, 20.0, 5.0, 1, 4, 2),
+    "standard": (1.5, 40.0, 10.0, 2, 8, 4),
+}
+PROGRAM_NAMES = ["Elite Men", "Elite Women", "U23 Men", "U23 Women", "Junior Men", "Junior Women"]
+COUNTRIES = ["Australia", "France", "Great Britain", "Germany", "Japan", "Spain", "United States", "New Zealand"]
+
+DNF_RATE = 0.08
+OUTLIER_RATE = 0.005
+MAX_SECONDS = 6 * 3600
+
+# Lookup table of pre-formatted "HH:MM:SS" strings, indexed by whole seconds
+_TIME_STRINGS = np.array(
+    [f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}" for s in range(MAX_SECONDS + 1)],
+    dtype=object,
+)
+
+def format_seconds(secs) -> np.ndarray:
+    """Vectorized conversion of whole seconds to "HH:MM:SS" strings (clipped to six hours)."""
+    secs = np.clip(np.asarray(secs, dtype=np.int64), 0, MAX_SECONDS)
+    return _TIME_STRINGS[secs]
+
+def generate_events(n_programs: int, seed: int = 0, programs_per_event: int = 4) -> pd.DataFrame:
+    """
+    Generate program rows in the shape of the events table.
+    Each event carries up to programs_per_event programs sharing event-level fields.
+    """
+    rng = np.random.default_rng(seed)
+    n_events = max(1, -(-n_programs // programs_per_event))
+    event_ids = 100000 + np.arange(n_events)
+    event_of_prog = np.repeat(event_ids, programs_per_event)[:n_programs]
+    distance = np.where(rng.random(n_events) < 0.6, "sprint", "standard")[event_of_prog - 100000]
+    dist = np.array([DISTANCES[d] for d in distance]).reshape(-1, 6)
+    event_dates = pd.Timestamp("2009-01-01") + pd.to_timedelta(rng.integers(0, 16 * 365, n_events), unit="D")
+    country = rng.choice(COUNTRIES, n_events)[event_of_prog - 100000]
+
+    return pd.DataFrame({
+        "prog_id": 500000 + np.arange(n_programs),
+        "event_id": event_of_prog,
+        "prog_name": np.array(PROGRAM_NAMES)[np.arange(n_programs) % len(PROGRAM_NAMES)],
+        "prog_distance_category": distance,
+        "swim_laps": dist[:, 3].astype(int),
+        "swim_distance": dist[:, 0],
+        "bike_laps": dist[:, 4].astype(int),
+        "bike_distance": dist[:, 1],
+        "run_laps": dist[:, 5].astype(int),
+        "run_distance": dist[:, 2],
+        "event_name": [f"Synthetic Triathlon {e}" for e in event_of_prog],
+        "event_venue": [f"Venue {e % 97}" for e in event_of_prog],
+        "event_date": event_dates[event_of_prog - 100000].date,
+        "event_country": country,
+        "event_latitude": rng.uniform(-45, 60, n_events)[event_of_prog - 100000].round(4),
+        "event_longitude": rng.uniform(-120, 150, n_events)[event_of_prog - 100000].round(4),
+        "cat_name": "World Cup",
+        "temperature_water": rng.uniform(15, 28, n_programs).round(1),
+        "temperature_air": rng.uniform(12, 35, n_programs).round(1),
+        "humidity": rng.uniform(30, 90, n_programs).round(0),
+        "wbgt": rng.uniform(10, 30, n_programs).round(1),
+        "wind": rng.uniform(0, 25, n_programs).round(1),
+        "weather": rng.choice(["Sunny", "Cloudy", "Rain"], n_programs),
+        "wetsuit": rng.choice(["Yes", "No"], n_programs),
+    })
+
+def generate_athletes(n_athletes: int, seed: int = 0) -> pd.DataFrame:
+    """Generate athlete rows in the shape of the athlete table."""
+    rng = np.random.default_rng(seed + 1)
+    ids = 10000 + np.arange(n_athletes)
+    return pd.DataFrame({
+        "athlete_id": ids,
+        "full_name": [f"Athlete{i} Synthetic{i % 1013}" for i in ids],
+        "gender": np.where(ids % 2 == 0, "male", "female"),
+        "country": rng.choice(COUNTRIES, n_athletes),
+        "age": rng.integers(17, 40, n_athletes),
+        "category_to": False,
+        "category_coach": False,
+        "category_athlete": True,
+        "category_medical": False,
+        "category_paratriathlete": False,
+    })
+
+def generate_race_results(events: pd.DataFrame, n_athletes: int, seed: int = 0,
+                          min_field: int = 25, max_field: int = 75, n_rows: int = None) -> pd.DataFrame:
+    """
+    Generate race results for every program in events.
+
+    Splits are drawn around the distance category means with per-athlete ability, per-race
+    conditions and bike packs. About 8% of starters DNF (later splits and total zeroed) and a
+    small fraction of rows carry mis-timed chips or swapped split fields.
+    If n_rows is given, the result is trimmed to exactly that many rows.
+    """
+    rng = np.random.default_rng(seed + 2)
+    n_progs = len(events)
+    field = rng.integers(min_field, max_field + 1, n_progs)
+    prog_idx = np.repeat(np.arange(n_progs), field)
+    n = len(prog_idx)
+
+    # Athletes: a per-athlete ability factor shared across all their races
+    ability = rng.normal(1.0, 0.035, n_athletes)
+    athlete_idx = rng.integers(0, n_athletes, n)
+    means = np.array([SEGMENT_MEANS[d] for d in events["prog_distance_category"]], dtype=float)[prog_idx]
+    conditions = rng.normal(1.0, 0.03, n_progs)[prog_idx]
+    factor = (ability[athlete_idx] * conditions)[:, None]
+    splits = means * factor * rng.normal(1.0, 0.015, (n, 5))
+
+    # Bike packs: athletes in the same pack share (almost) the same bike split
+    pack = np.minimum((rng.random(n) ** 2 * 4).astype(int), 3)
+    pack_time = means[:, 2] * conditions * (1.0 + 0.02 * pack)
+    splits[:, 2] = pack_time + rng.normal(0, 4, n)
+    secs = np.rint(splits).astype(np.int64)
+
+    # DNFs: zero everything after a random segment
+    dnf = rng.random(n) < DNF_RATE
+    dnf_from = rng.integers(1, 5, n)
+    seg = np.arange(5)[None, :]
+    secs[dnf[:, None] & (seg >= dnf_from[:, None])] = 0
+
+    # Outliers: mis-timed chips (implausibly short) and swapped t1/bike fields
+    outlier = (rng.random(n) < OUTLIER_RATE) & ~dnf
+    swapped = outlier & (rng.random(n) < 0.5)
+    short = outlier & ~swapped
+    secs[short, 0] = rng.integers(20, 120, short.sum())
+    secs[swapped, 1], secs[swapped, 2] = secs[swapped, 2], secs[swapped, 1].copy()
+
+    total = secs.sum(axis=1)
+    df = pd.DataFrame({
+        "event_id": events["event_id"].to_numpy()[prog_idx],
+        "prog_id": events["prog_id"].to_numpy()[prog_idx],
+        "athlete_id": 10000 + athlete_idx,
+        "athlete_full_name": [f"Athlete{i} Synthetic{i % 1013}" for i in 10000 + athlete_idx],
+        "swimtime": format_seconds(secs[:, 0]),
+        "t1time": format_seconds(secs[:, 1]),
+        "biketime": format_seconds(secs[:, 2]),
+        "t2time": format_seconds(secs[:, 3]),
+        "runtime": format_seconds(secs[:, 4]),
+        "total_time": format_seconds(np.where(dnf, 0, total)),
+        "start_num": (np.arange(n) - np.repeat(np.cumsum(field) - field, field) + 1).astype(str),
+        "_total": np.where(dnf, np.iinfo(np.int64).max, total),
+    })
+    # An athlete drawn twice into one program keeps only their first entry, as in the ETL
+    df = df.drop_duplicates(subset=["athlete_id", "prog_id"])
+
+    # Finishing positions by total time; DNFs get the API's status string instead
+    rank = df.groupby("prog_id")["_total"].rank(method="first").astype(int).astype(str)
+    df["position"] = rank.where(df["_total"] != np.iinfo(np.int64).max, "DNF")
+    df = df.drop(columns="_total")
+    if n_rows is not None:
+        df = df.iloc[:n_rows]
+    return df.reset_index(drop=True)
+
+def generate_warehouse(n_rows: int, seed: int = 0) -> dict:
+    """
+    Generate a consistent set of events, athlete and race_results frames with about n_rows results.
+    Scales from the real warehouse size (~65K rows) up to tens of millions.
+    """
+    # Over-generate programs by 20% so random field sizes never fall short, then trim to n_rows
+    avg_field = 50
+    n_programs = max(1, int(n_rows / avg_field * 1.2) + 1)
+    n_athletes = max(200, n_rows // 30)
+    events = generate_events(n_programs, seed=seed)
+    results = generate_race_results(events, n_athletes, seed=seed, n_rows=n_rows)
+    events = events[events["prog_id"].isin(results["prog_id"].unique())].reset_index(drop=True)
+    return {
+        "events": events,
+        "athlete": generate_athletes(n_athletes, seed=seed),
+        "race_results": results,
+    }
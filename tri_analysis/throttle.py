@@ -0,0 +1,85 @@
+"""
+Shared request budgets for crawlers and API fan-outs.
+
+RateLimiter is a thread-safe token bucket: callers block in acquire() until a token is free,
+so any number of workers together never exceed `rate` requests per second (after an initial
+burst). SharedRateLimiter enforces the same kind of budget across worker processes.
+HostThrottle combines one bucket and a bounded number of concurrent slots per host.
+"""
+import multiprocessing
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class SharedRateLimiter:
+    """
+    Rate limit shared by several processes: `rate` acquisitions per second in total, with bursts
+    of up to `burst`. State is one shared timestamp, so pass the instance to worker processes at
+    creation (Process args or a pool initializer).
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        # Earliest time the next token may be taken, shared between processes
+        self._next = multiprocessing.Value("d", 0.0)
+
+    def acquire(self):
+        """Reserve the next free slot and sleep until it comes round."""
+        interval = 1.0 / self.rate
+        with self._next.get_lock():
+            now = time.time()
+            slot = max(self._next.value, now - (self.burst - 1) * interval)
+            self._next.value = slot + interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class HostThrottle:
+    """Per-host rate budget plus a cap on concurrent requests to the same host."""
+
+    def __init__(self, rate_per_host: float, concurrency_per_host: int, burst: int = 1):
+        self.rate_per_host = rate_per_host
+        self.concurrency_per_host = concurrency_per_host
+        self.burst = burst
+        self._limiters = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def _for_host(self, host):
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = RateLimiter(self.rate_per_host, self.burst)
+                self._slots[host] = threading.BoundedSemaphore(self.concurrency_per_host)
+            return self._limiters[host], self._slots[host]
+
+    @contextmanager
+    def slot(self, url: str):
+        """Hold one of the host's concurrent slots and spend one token of its rate budget."""
+        limiter, slots = self._for_host(urlsplit(url).netloc)
+        with slots:
+            limiter.acquire()
+            yield
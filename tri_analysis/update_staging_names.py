@@ -7,91 +7,102 @@ import os
 # Add project root to path for package imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-import csv
 import pandas as pd
 from sqlalchemy import text
-from Data_Import.database import get_engine
+from database import get_engine
+from tri_analysis.upsert_tables import copy_dataframe
 
-def update_staging_rankings_from_csv(csv_file_path='Data_Import/names_mapping.csv'):
+DEFAULT_MAPPING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'names_mapping.csv')
+
+def load_name_mappings(csv_file_path=DEFAULT_MAPPING_PATH):
+    """
+    Read and validate a mapping file with columns old_name, athlete_name, athlete_id.
+
+    Names are stripped, rows with a missing name or a non-integer athlete_id are rejected,
+    exact duplicates are dropped, and old_names mapped to more than one target are rejected
+    as ambiguous. Returns (mappings, rejected) DataFrames; rejected has a 'reason' column.
+    """
+    df = pd.read_csv(csv_file_path, dtype=str, skipinitialspace=True)
+    # Clean up any whitespace in column names
+    df.columns = df.columns.str.strip()
+    df = df[['old_name', 'athlete_name', 'athlete_id']]
+    for col in df.columns:
+        df[col] = df[col].str.strip().replace('', None)
+
+    ids = pd.to_numeric(df['athlete_id'], errors='coerce')
+    reason = pd.Series(None, index=df.index, dtype=object)
+    reason[ids.isna() | (ids % 1 != 0)] = 'invalid athlete_id'
+    reason[df['athlete_id'].isna()] = 'missing athlete_id'
+    reason[df['old_name'].isna() | df['athlete_name'].isna()] = 'missing name'
+
+    valid = df[reason.isna()].assign(athlete_id=ids[reason.isna()].astype('int64'))
+    valid = valid.drop_duplicates()
+    conflicting = valid['old_name'].duplicated(keep=False)
+
+    rejected = pd.concat([
+        df[reason.notna()].assign(reason=reason[reason.notna()]),
+        valid[conflicting].assign(reason='old_name mapped to several targets'),
+    ])
+    return valid[~conflicting].reset_index(drop=True), rejected
+
+def apply_name_mappings(mappings, engine=None):
+    """
+    Apply validated mappings to unresolved staging_rankings rows in one UPDATE ... FROM join.
+    Returns per-mapping affected row counts (old_name, athlete_name, athlete_id, rows_updated).
+    """
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TEMP TABLE tmp_name_mappings (
+                old_name TEXT PRIMARY KEY, athlete_name TEXT NOT NULL, athlete_id INTEGER NOT NULL
+            ) ON COMMIT DROP
+        """))
+        copy_dataframe(mappings, 'tmp_name_mappings', conn)
+        counts = pd.read_sql(text("""
+            WITH upd AS (
+                UPDATE staging_rankings s
+                SET athlete_name = m.athlete_name,
+                    athlete_id = m.athlete_id
+                FROM tmp_name_mappings m
+                WHERE s.athlete_name = m.old_name
+                  AND s.athlete_id IS NULL
+                RETURNING m.old_name, m.athlete_name, m.athlete_id
+            )
+            SELECT old_name, athlete_name, athlete_id, COUNT(*) AS rows_updated
+            FROM upd
+            GROUP BY old_name, athlete_name, athlete_id
+        """), conn)
+    counts = mappings.merge(counts, on=['old_name', 'athlete_name', 'athlete_id'], how='left')
+    counts['rows_updated'] = counts['rows_updated'].fillna(0).astype('int64')
+    return counts
+
+def update_staging_rankings_from_csv(csv_file_path=DEFAULT_MAPPING_PATH):
     """
     Update staging_rankings table using mappings from CSV file.
-    
+
     Args:
         csv_file_path: Path to CSV file with columns: old_name, athlete_name, athlete_id
     """
-    engine = get_engine()
-    
-    # Read the CSV file
     try:
-        df = pd.read_csv(csv_file_path)
-        # Clean up any whitespace in column names
-        df.columns = df.columns.str.strip()
-        print(f"Loaded {len(df)} name mappings from {csv_file_path}")
-        print(df)
+        mappings, rejected = load_name_mappings(csv_file_path)
+        print(f"Loaded {len(mappings)} name mappings from {csv_file_path}")
     except Exception as e:
         print(f"Error reading CSV file: {e}")
         return
-    
-    updated_count = 0
-    
-    with engine.begin() as conn:
-        for _, row in df.iterrows():
-            old_name = str(row['old_name']).strip()
-            athlete_name = str(row['athlete_name']).strip()
-            
-            # Skip rows with missing athlete_id
-            if pd.isna(row['athlete_id']) or str(row['athlete_id']).strip() == '':
-                print(f"⚠ Skipping '{old_name}' - missing athlete_id")
-                continue
-                
-            try:
-                athlete_id = int(row['athlete_id'])
-            except (ValueError, TypeError):
-                print(f"⚠ Skipping '{old_name}' - invalid athlete_id: {row['athlete_id']}")
-                continue
-            
-            # Update query
-            update_sql = text("""
-                UPDATE staging_rankings 
-                SET athlete_name = :new_name, 
-                    athlete_id = :athlete_id
-                WHERE athlete_name = :old_name 
-                  AND athlete_id IS NULL
-            """)
-            
-            result = conn.execute(update_sql, {
-                'new_name': athlete_name,
-                'athlete_id': athlete_id,
-                'old_name': old_name
-            })
-            
-            rows_affected = result.rowcount
-            updated_count += rows_affected
-            
-            if rows_affected > 0:
-                print(f"✓ Updated {rows_affected} records: '{old_name}' -> '{athlete_name}' (ID: {athlete_id})")
-            else:
-                print(f"⚠ No records found for '{old_name}' or already updated")
-    
-    print(f"\nTotal records updated: {updated_count}")
-    
-    # Show final results
-    check_sql = text("""
-        SELECT athlete_name, athlete_id, COUNT(*) as record_count
-        FROM staging_rankings 
-        WHERE athlete_name IN :names
-        GROUP BY athlete_name, athlete_id
-        ORDER BY athlete_name
-    """)
-    
-    updated_names = tuple(df['athlete_name'].str.strip().tolist())
-    with engine.connect() as conn:
-        results = conn.execute(check_sql, {'names': updated_names}).fetchall()
-        
-    if results:
-        print("\nFinal state of updated records:")
-        for row in results:
-            print(f"  {row.athlete_name}: ID {row.athlete_id} ({row.record_count} records)")
+    for row in rejected.itertuples(index=False):
+        print(f"⚠ Skipping '{row.old_name}' - {row.reason}")
+    if mappings.empty:
+        return
+
+    counts = apply_name_mappings(mappings)
+    for row in counts[counts['rows_updated'] > 0].itertuples(index=False):
+        print(f"✓ Updated {row.rows_updated} records: '{row.old_name}' -> '{row.athlete_name}' (ID: {row.athlete_id})")
+    unmatched = (counts['rows_updated'] == 0).sum()
+    if unmatched:
+        print(f"⚠ {unmatched} mappings found no unresolved records")
+
+    print(f"\nTotal records updated: {counts['rows_updated'].sum()}")
+    return counts
 
 if __name__ == "__main__":
     update_staging_rankings_from_csv()
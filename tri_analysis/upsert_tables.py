@@ -1,6 +1,9 @@
+import io
 from sqlalchemy import text
 import pandas as pd
-from database import get_engine
+from database import get_engine, EVENTS_VIEW_COLUMNS
+from tri_analysis.instrumentation import db_statement
+from tri_analysis.queries import invalidate_tables
 
 def upsert_dataframe(df, table_name, conflict_cols, update_cols, engine=None):
     """
@@ -32,61 +35,66 @@ def upsert_dataframe(df, table_name, conflict_cols, update_cols, engine=None):
         ON CONFLICT ({conflict_target}) DO UPDATE SET
             {update_stmt}
     """
-    with engine.begin() as conn:
-        conn.execute(text(sql), df.to_dict(orient="records"))
+    # Nullable, categorical and pyarrow columns hold pd.NA/NaN for missing values; drivers need None.
+    # Timestamps become plain datetimes, which every driver can bind.
+    values = df.astype(object).where(df.notna(), None)
+    for col in df.select_dtypes(include="datetime").columns:
+        values[col] = pd.Series([None if v is None else v.to_pydatetime() for v in values[col]],
+                                index=values.index, dtype=object)
+    records = values.to_dict(orient="records")
+    with db_statement(f"upsert_{table_name}", rows=len(records)), engine.begin() as conn:
+        conn.execute(text(sql), records)
+    invalidate_tables(table_name)
 
 def upsert_athlete(df, engine):
-    """Upsert athlete information into the database."""
+    """Upsert athlete information into the database (only the columns present in df are updated)."""
+    update_cols = [
+        "full_name",
+        "gender",
+        "country",
+        "age",
+        "category_to",
+        "category_coach",
+        "category_athlete",
+        "category_medical",
+        "category_paratriathlete",
+        "noc",
+        "yob",
+        "last_fetched_at"
+    ]
+    upsert_dataframe(df, "athlete", ["athlete_id"], [c for c in update_cols if c in df.columns], engine)
+
+EVENT_COLUMNS = ["event_id"] + [c for t, c in EVENTS_VIEW_COLUMNS if t == "e"]
+PROGRAM_COLUMNS = [c for t, c in EVENTS_VIEW_COLUMNS if t == "p"]
+
+def split_events(df):
+    """Split an events-shaped frame (one row per program) into event and program frames."""
+    event_df = df[[c for c in EVENT_COLUMNS if c in df.columns]].drop_duplicates(subset=["event_id"])
+    program_df = df[[c for c in PROGRAM_COLUMNS if c in df.columns]]
+    if "prog_distance_category" in program_df.columns:
+        # Stored lower-case so lookups compare directly and can use idx_program_distance
+        categories = program_df["prog_distance_category"].astype("object").str.strip().str.lower()
+        program_df = program_df.assign(prog_distance_category=categories)
+    return event_df, program_df
+
+def upsert_event(df, engine):
+    """Upsert event-level information (one row per event) into the database."""
+    upsert_dataframe(df, "event", ["event_id"], [c for c in df.columns if c != "event_id"], engine)
+
+def upsert_program(df, engine):
+    """Upsert program information (distances, conditions) into the database."""
     upsert_dataframe(
-        df,
-        "athlete",
-        ["athlete_id"],
-        [
-            "full_name",
-            "gender",
-            "country",
-            "age",
-            "category_to",
-            "category_coach",
-            "category_athlete",
-            "category_medical",
-            "category_paratriathlete"
-        ],
-        engine
+        df, "program", ["event_id", "prog_id"], [c for c in df.columns if c not in ("event_id", "prog_id")], engine
     )
 
 def upsert_events(df, engine):
-    """Upsert event information into the database."""
-    upsert_dataframe(
-        df,
-        "events",
-        ["event_id", "prog_id"],
-        [
-            "prog_name",
-            "prog_distance_category",
-            "swim_laps",
-            "swim_distance",
-            "bike_laps",
-            "bike_distance",
-            "run_laps",
-            "run_distance",
-            "event_name",
-            "event_venue",
-            "event_date",
-            "event_country",
-            "event_latitude",
-            "event_longitude",
-            "cat_name",
-            "temperature_water",
-            "temperature_air",
-            "humidity",
-            "wbgt",
-            "wind",
-            "weather",
-            "wetsuit"
-        ],
-        engine
-    )
+    """
+    Upsert an events-shaped frame (as built by process_program_data): event fields are written
+    once per event to `event`, the rest once per program to `program`.
+    """
+    event_df, program_df = split_events(df)
+    upsert_event(event_df, engine)
+    upsert_program(program_df, engine)
 
 def upsert_race_results(df, engine):
     """Upsert race results information into the database."""
@@ -105,4 +113,89 @@ def upsert_race_results(df, engine):
             "start_num"
         ],
         engine
-    )
\ No newline at end of file
+    )
+
+def copy_dataframe(df, table_name, conn):
+    """
+    Bulk-load a DataFrame into an existing table within the caller's transaction.
+    On PostgreSQL this is a single COPY ... FROM STDIN (CSV) through psycopg2's copy_expert;
+    other dialects fall back to multi-row INSERTs. Returns the number of rows loaded.
+    """
+    if df.empty:
+        return 0
+    with db_statement(f"copy_{table_name}", rows=len(df)):
+        if conn.dialect.name == "postgresql":
+            buf = io.StringIO()
+            df.to_csv(buf, index=False, header=False, na_rep="\\N")
+            buf.seek(0)
+            cols = ", ".join(f'"{c}"' for c in df.columns)
+            cursor = conn.connection.cursor()
+            try:
+                cursor.copy_expert(f"COPY \"{table_name}\" ({cols}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+            finally:
+                cursor.close()
+        else:
+            df.to_sql(table_name, conn, if_exists="append", index=False, method="multi", chunksize=10000)
+    invalidate_tables(table_name)
+    return len(df)
+
+def promote_rankings(conn, source_table="staging_rankings", retrieved_at=None):
+    """
+    Upsert ranking rows from source_table into athlete_rankings with one INSERT ... SELECT.
+    Rows without an athlete_id pick it up from athlete by exact full_name (names shared by
+    several athletes stay NULL). Only rows retrieved on retrieved_at are promoted when given.
+    Returns the number of rows written.
+    """
+    where = "WHERE s.retrieved_at = :retrieved_at" if retrieved_at is not None else ""
+    sql = f"""
+        INSERT INTO athlete_rankings
+          (athlete_id, athlete_name, ranking_cat_name, ranking_cat_id,
+           rank_position, total_points, year, retrieved_at)
+        SELECT athlete_id, athlete_name, ranking_cat_name, ranking_cat_id,
+               rank_position, total_points, year, retrieved_at
+        FROM (
+            SELECT COALESCE(s.athlete_id, a.athlete_id) AS athlete_id,
+                   s.athlete_name, s.ranking_cat_name, s.ranking_cat_id,
+                   s.rank_position, s.total_points, s.year, s.retrieved_at,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY s.athlete_name, s.ranking_cat_name, s.year, s.retrieved_at
+                       ORDER BY s.rank_position
+                   ) AS rn
+            FROM {source_table} s
+            LEFT JOIN (
+                SELECT full_name, MIN(athlete_id) AS athlete_id
+                FROM athlete
+                GROUP BY full_name
+                HAVING COUNT(*) = 1
+            ) a ON a.full_name = s.athlete_name
+            {where}
+        ) ranked
+        WHERE rn = 1
+        ON CONFLICT (athlete_name, ranking_cat_name, year, retrieved_at) DO UPDATE SET
+            athlete_id = COALESCE(EXCLUDED.athlete_id, athlete_rankings.athlete_id),
+            rank_position = EXCLUDED.rank_position,
+            total_points = EXCLUDED.total_points
+    """
+    with db_statement("promote_rankings"):
+        rows = conn.execute(text(sql), {"retrieved_at": retrieved_at}).rowcount
+    invalidate_tables("athlete_rankings")
+    return rows
+
+def upsert_ranking_snapshots(df, engine):
+    """Record imported live ranking snapshots (ranking_cat_id, published, athletes, imported_at)."""
+    upsert_dataframe(df, "ranking_snapshots", ["ranking_cat_id", "published"], ["athletes", "imported_at"], engine)
+
+def upsert_athlete_rankings(df, engine):
+    """
+    Upsert a staging-shaped rankings frame into athlete_rankings: COPY into a temporary
+    table, then one promote_rankings statement. Returns the number of rows written.
+    """
+    if df.empty:
+        return 0
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS tmp_rankings"))
+        conn.execute(text("CREATE TEMP TABLE tmp_rankings AS SELECT * FROM staging_rankings WHERE 1 = 0"))
+        copy_dataframe(df, "tmp_rankings", conn)
+        written = promote_rankings(conn, source_table="tmp_rankings")
+        conn.execute(text("DROP TABLE tmp_rankings"))
+    return written